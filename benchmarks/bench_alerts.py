@@ -0,0 +1,125 @@
+"""
+Alert storm benchmark: every device over ALERT_MAX_POWER_W on every sweep.
+
+Creates --devices devices spread over --users users in a scratch SQLite
+database, delivers to an email pickup directory and to a local webhook
+stand-in, and reports the latency of submit() (what a sweep pays), the
+readings evaluated per second and the dispatcher counters. Sweeps are
+submitted back to back, faster than the dispatcher evaluates them, so some are
+dropped once the queue is full, as they would be in production.
+
+    python -m benchmarks.bench_alerts --devices 10000 --users 1000
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from sqlalchemy import insert, select
+
+from device_data_collector.db import db
+from device_data_collector.alerts import AlertDispatcher, EmailFileSink, WebhookSink
+from device_data_collector.migrations import migrate
+from device_data_collector.models import User, Profile, Room, Device
+
+
+def _add_devices(devices, users):
+    """Bulk-insert `users` users with one room each; returns the device ids."""
+    with db.get_session() as session:
+        session.execute(
+            insert(User),
+            [
+                {"user_name": f"user {n}", "email": f"user{n}@localhost", "password": "-"}
+                for n in range(users)
+            ],
+        )
+        user_ids = session.scalars(select(User.user_id)).all()
+        session.execute(
+            insert(Profile), [{"name": "home", "user_id": u} for u in user_ids]
+        )
+        profile_ids = session.scalars(select(Profile.profile_id)).all()
+        session.execute(
+            insert(Room), [{"name": "room", "profile_id": p} for p in profile_ids]
+        )
+        room_ids = session.scalars(select(Room.room_id)).all()
+        session.execute(
+            insert(Device),
+            [
+                {
+                    "name": f"plug {n}",
+                    "device_url": f"http://127.0.0.1:8099/{n}",
+                    "type": "plug",
+                    "room_id": room_ids[n % users],
+                }
+                for n in range(devices)
+            ],
+        )
+        return session.scalars(select(Device.device_id)).all()
+
+
+class _Webhook(BaseHTTPRequestHandler):
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.received.append(len(json.loads(body)))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def run(devices, users, sweeps):
+    """(submit latencies in seconds, readings/s, dispatcher, webhook posts)."""
+    _Webhook.received = []
+    server = HTTPServer(("127.0.0.1", 0), _Webhook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as directory:
+        db.configure(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        migrate()
+        device_ids = _add_devices(devices, users)
+        dispatcher = AlertDispatcher(
+            sinks=[
+                EmailFileSink(os.path.join(directory, "mail")),
+                WebhookSink(f"http://127.0.0.1:{server.server_port}/"),
+            ],
+            max_on_hours=1,
+            batch_seconds=0.5,
+        ).start()
+
+        start = datetime(2026, 10, 5, 8, 0)
+        latencies = []
+        started = time.perf_counter()
+        for number in range(sweeps):
+            readings = dict.fromkeys(device_ids, 3500.0)
+            before = time.perf_counter()
+            dispatcher.submit(start + timedelta(minutes=number), readings)
+            latencies.append(time.perf_counter() - before)
+        dispatcher.stop()
+        elapsed = time.perf_counter() - started
+        db.dispose()
+    server.shutdown()
+    rate = dispatcher.stats["sweeps"] * devices / elapsed
+    return sorted(latencies), rate, dispatcher, _Webhook.received
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alert storm benchmark")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sweeps", type=int, default=120)
+    args = parser.parse_args()
+
+    latencies, rate, dispatcher, posts = run(args.devices, args.users, args.sweeps)
+    print(
+        f"submit p50 {latencies[len(latencies) // 2] * 1e6:.0f} us, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us; "
+        f"{rate:,.0f} readings/s evaluated"
+    )
+    print(f"{len(posts)} webhook posts, {sum(posts)} alerts")
+    print(dispatcher)
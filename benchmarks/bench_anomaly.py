@@ -0,0 +1,56 @@
+"""
+Anomaly detector benchmark: cost of one sweep and memory per device.
+
+Warms a detector up with --warmup sweeps of --devices readings, then reports
+the average time of the following --sweeps sweeps (the budget is a small
+fraction of COLLECTOR_INTERVAL) and the bytes of statistics kept per device.
+
+    python -m benchmarks.bench_anomaly --devices 10000
+"""
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+from device_data_collector.anomaly import AnomalyDetector
+
+
+def run(devices, warmup, sweeps, seed=1):
+    """(milliseconds per sweep, bytes per device)."""
+    rng = random.Random(seed)
+    usual = {device_id: rng.uniform(0, 300) for device_id in range(1, devices + 1)}
+    batches = [
+        {device_id: power * rng.uniform(0.9, 1.1) for device_id, power in usual.items()}
+        for _ in range(8)
+    ]
+    when = datetime(2026, 9, 7)
+
+    tracemalloc.start()
+    detector = AnomalyDetector()
+    detector.record(when, batches[0])
+    per_device = tracemalloc.get_traced_memory()[0] / devices
+    tracemalloc.stop()
+
+    for number in range(warmup):
+        when += timedelta(minutes=1)
+        detector.record(when, batches[number % len(batches)])
+    started = time.perf_counter()
+    for number in range(sweeps):
+        when += timedelta(minutes=1)
+        detector.record(when, batches[number % len(batches)])
+    return (time.perf_counter() - started) / sweeps * 1000, per_device
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Anomaly detector benchmark")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--warmup", type=int, default=40)
+    parser.add_argument("--sweeps", type=int, default=20)
+    args = parser.parse_args()
+
+    per_sweep, per_device = run(args.devices, args.warmup, args.sweeps)
+    print(
+        f"{args.devices} devices: {per_sweep:.1f} ms per sweep, "
+        f"{per_device:,.0f} bytes per device"
+    )
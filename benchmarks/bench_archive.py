@@ -0,0 +1,180 @@
+"""
+History tier benchmark: a year of synthetic history for 1,000 devices.
+
+Archive: fills hourly and daily consumption for --devices devices over --days
+days, times one-device range reads of the oldest --months months from the
+database, archives everything older than ARCHIVE_AFTER_MONTHS to Parquet and
+times the same reads again (files + database), plus the archive step itself.
+
+Retention: keeps RAW_RETENTION_DAYS + 1 days of minutely readings for the
+same devices (all rolled up) and times the daily retention run that expires
+the oldest day: a range DELETE on SQLite and unpartitioned MySQL, a DROP
+PARTITION on MySQL after enable_partitioning (for each --url).
+
+    python -m benchmarks.bench_archive --devices 1000 --days 365
+    python -m benchmarks.bench_archive --devices 100 --url mysql+mysqlconnector://root:pw@localhost/
+"""
+import os
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from device_data_collector.db import db
+from device_data_collector.archive import archive_level, read_series
+from device_data_collector.partitions import (
+    RAW_RETENTION_DAYS,
+    apply_retention,
+    enable_partitioning,
+)
+from device_data_collector.watermarks import advance_watermarks
+from device_data_collector.models import (
+    HourlyConsumption,
+    DeviceDailyConsumption,
+    MinutelyConsumption,
+)
+
+from benchmarks.common import scratch_database, add_devices
+
+NOW = datetime(2026, 10, 1, 3, 0)
+CHUNK = 50000
+
+
+def _insert(model, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK:
+            with db.get_session() as session:
+                session.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        with db.get_session() as session:
+            session.execute(insert(model), chunk)
+
+
+def _fill_history(device_ids, days):
+    first_day = NOW.replace(hour=0) - timedelta(days=days)
+    _insert(
+        HourlyConsumption,
+        (
+            {"device_id": device_id, "power_consumption": 100.0, "time": when}
+            for hour in range(days * 24)
+            for when in [first_day + timedelta(hours=hour)]
+            for device_id in device_ids
+        ),
+    )
+    _insert(
+        DeviceDailyConsumption,
+        (
+            {"device_id": device_id, "daily_average": 100.0, "date": day.date()}
+            for number in range(days)
+            for day in [first_day + timedelta(days=number)]
+            for device_id in device_ids
+        ),
+    )
+    return first_day
+
+
+def _read_all(device_ids, start, end, root):
+    """Seconds per device to read the hourly and daily series of [start, end)."""
+    started = time.perf_counter()
+    with db.get_session() as session:
+        for device_id in device_ids:
+            read_series(session, "hourly", device_id, start, end, root)
+            read_series(session, "daily", device_id, start, end, root)
+    return (time.perf_counter() - started) / len(device_ids)
+
+
+def _size(root):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(root)
+        for name in names
+    )
+
+
+def run_archive(url, devices, days, months, sample):
+    """Dict of timings for the archive tier on the backend of `url`."""
+    with scratch_database(url) as backend, tempfile.TemporaryDirectory() as root:
+        device_ids = add_devices(devices)
+        started = time.perf_counter()
+        first_day = _fill_history(device_ids, days)
+        seeded = time.perf_counter() - started
+        start, end = first_day, first_day + timedelta(days=30 * months)
+        readers = device_ids[:: max(1, devices // sample)]
+
+        from_db = _read_all(readers, start, end, root)
+        started = time.perf_counter()
+        files = sum(archive_level(level, NOW, root) for level in ("hourly", "daily"))
+        archived = time.perf_counter() - started
+        from_files = _read_all(readers, start, end, root)
+        return {
+            "backend": backend,
+            "rows": devices * days * 25,
+            "seed": seeded,
+            "archive": archived,
+            "files": files,
+            "bytes": _size(root),
+            "read_db": from_db,
+            "read_archive": from_files,
+        }
+
+
+def run_retention(url, devices, partitioned):
+    """(backend, rows expired, seconds) of the daily retention run."""
+    with scratch_database(url) as backend:
+        device_ids = add_devices(devices)
+        days = RAW_RETENTION_DAYS + 1
+        first = NOW.replace(hour=0) - timedelta(days=days)
+        if partitioned:
+            enable_partitioning(today=first.date())
+        _insert(
+            MinutelyConsumption,
+            (
+                {"device_id": device_id, "power_consumption": 100.0, "time": when}
+                for minute in range(days * 24 * 60)
+                for when in [first + timedelta(minutes=minute)]
+                for device_id in device_ids
+            ),
+        )
+        with db.get_session() as session:
+            advance_watermarks(session, "hourly", NOW.replace(minute=0))
+        started = time.perf_counter()
+        apply_retention(NOW)
+        elapsed = time.perf_counter() - started
+    return backend, devices * 24 * 60, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and retention benchmark")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--months", type=int, default=6, help="range read per device")
+    parser.add_argument("--sample", type=int, default=50, help="devices read")
+    parser.add_argument(
+        "--url", action="append", default=[], help="MySQL server to run on as well"
+    )
+    args = parser.parse_args()
+
+    for url in [None] + args.url:
+        stats = run_archive(url, args.devices, args.days, args.months, args.sample)
+        print(
+            f"{stats['backend']}: {stats['rows']:,} hourly+daily rows seeded in "
+            f"{stats['seed']:.0f} s; archived {stats['files']:,} device-month files "
+            f"({stats['bytes'] / 2**20:.1f} MiB) in {stats['archive']:.1f} s"
+        )
+        print(
+            f"  {args.months}-month hourly+daily read per device: "
+            f"database {stats['read_db'] * 1000:.1f} ms, "
+            f"archive {stats['read_archive'] * 1000:.1f} ms"
+        )
+        for partitioned in (False, True) if url else (False,):
+            backend, expired, elapsed = run_retention(url, args.devices, partitioned)
+            how = "DROP PARTITION" if partitioned else "range DELETE"
+            print(
+                f"  retention ({how}): {expired:,} expired readings "
+                f"in {elapsed * 1000:.0f} ms"
+            )
@@ -0,0 +1,94 @@
+"""
+Backfill benchmark: NumPy re-aggregation of tens of millions of raw readings.
+
+Fills --days days of minutely readings for --devices devices (1,000 x 7 days
+is about 10M rows) into a scratch database, then times backfill_level for the
+hourly, daily and weekly levels and reports rows per second and the peak
+resident memory growth, which should depend on the window size, not on the
+length of the range. Runs on SQLite, and on MySQL for each --url.
+
+    python -m benchmarks.bench_backfill --devices 1000 --days 7
+    python -m benchmarks.bench_backfill --devices 2000 --days 14 --window-hours 3
+"""
+import time
+import resource
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from device_data_collector.db import db
+from device_data_collector.backfill import backfill_level
+from device_data_collector.models import MinutelyConsumption
+
+from benchmarks.common import scratch_database, add_devices
+
+START = datetime(2026, 9, 7)  # a Monday
+CHUNK = 50000
+
+
+def _peak_rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _add_minutes(device_ids, days):
+    chunk = []
+    for minute in range(days * 24 * 60):
+        when = START + timedelta(minutes=minute)
+        chunk.extend(
+            {
+                "device_id": device_id,
+                "power_consumption": 50.0 + (device_id + minute) % 100,
+                "time": when,
+            }
+            for device_id in device_ids
+        )
+        if len(chunk) >= CHUNK:
+            with db.get_session() as session:
+                session.execute(insert(MinutelyConsumption), chunk)
+            chunk = []
+    if chunk:
+        with db.get_session() as session:
+            session.execute(insert(MinutelyConsumption), chunk)
+
+
+def run(url, devices, days, window):
+    """Yields (backend, level, rows read, rows written, seconds, peak RSS growth MiB)."""
+    with scratch_database(url) as backend:
+        _add_minutes(add_devices(devices), days)
+        now = START + timedelta(days=days + 7)
+        for level in ("hourly", "daily", "weekly"):
+            before = _peak_rss_mib()
+            started = time.perf_counter()
+            read, written = backfill_level(
+                level,
+                START,
+                now=now,
+                window=window if level == "hourly" else None,
+            )
+            elapsed = time.perf_counter() - started
+            yield backend, level, read, written, elapsed, _peak_rss_mib() - before
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill benchmark")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument(
+        "--window-hours", type=int, default=6, help="hourly backfill window"
+    )
+    parser.add_argument(
+        "--url", action="append", default=[], help="MySQL server to run on as well"
+    )
+    args = parser.parse_args()
+
+    window = timedelta(hours=args.window_hours)
+    for url in [None] + args.url:
+        for backend, level, read, written, elapsed, grown in run(
+            url, args.devices, args.days, window
+        ):
+            print(
+                f"{backend:6} {level:6}: {read:,} rows -> {written:,} in "
+                f"{elapsed:.1f} s ({read / elapsed:,.0f} rows/s), "
+                f"peak RSS +{grown:.0f} MiB"
+            )
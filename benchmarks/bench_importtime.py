@@ -0,0 +1,76 @@
+"""
+Cold-start benchmark: import time of the web app and the collector.
+
+Imports each --module in a fresh interpreter under `python -X importtime`,
+--runs times, and reports the median cumulative import time and the
+heaviest of its direct imports, so a new import-time dependency
+(or an import-time connection) shows up as a jump here.
+
+    python -m benchmarks.bench_importtime
+    python -m benchmarks.bench_importtime --module main_web_app --runs 10 --top 15
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _import_times(module):
+    """(cumulative seconds, {direct import: cumulative seconds}) of one cold import."""
+    env = dict(os.environ, DB_HOST="db.invalid")  # an import-time connection fails loudly
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # children are listed before their parent, indented two spaces per level
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative) / 1e6
+        elif depth == 0 and name.strip() == module:
+            return int(cumulative) / 1e6, children
+        elif depth == 0:
+            children = {}
+    raise RuntimeError(f"{module} missing from the importtime report")
+
+
+def run(module, runs):
+    """(median seconds, {direct import: median seconds}) over `runs` cold imports."""
+    samples = [_import_times(module) for _ in range(runs)]
+    names = set().union(*(children for _, children in samples))
+    per_import = {
+        name: statistics.median(children.get(name, 0) for _, children in samples)
+        for name in names
+    }
+    return statistics.median(total for total, _ in samples), per_import
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time benchmark")
+    parser.add_argument(
+        "--module",
+        nargs="+",
+        default=["main_web_app", "device_data_collector.data_collector"],
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for module in args.module:
+        total, per_import = run(module, args.runs)
+        print(f"{module}: {total * 1000:.0f} ms")
+        heaviest = sorted(per_import.items(), key=lambda item: -item[1])
+        for name, seconds in heaviest[: args.top]:
+            print(f"  {seconds * 1000:7.1f} ms  {name}")
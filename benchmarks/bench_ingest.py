@@ -0,0 +1,108 @@
+"""
+Sweep write benchmark: bulk ingest path versus one commit per device.
+
+For each --devices count, writes --sweeps sweeps through ingest.write_sweep
+(every device ON, with half of them changing status each sweep) and reports
+statements (round-trips) and milliseconds per sweep; the per-device ORM path
+the collector used before is measured on the same database for comparison.
+Runs on a scratch SQLite file, and on MySQL too for each --url given.
+
+    python -m benchmarks.bench_ingest --devices 100 1000 10000
+    python -m benchmarks.bench_ingest --url mysql+mysqlconnector://root:pw@localhost/
+"""
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from device_data_collector.db import db
+from device_data_collector.ingest import write_sweep
+from device_data_collector.models import Device, MinutelyConsumption
+
+from benchmarks.common import scratch_database, add_devices, count_statements
+
+START = datetime(2026, 10, 5, 8, 0)
+
+
+def _sweep(device_ids, number):
+    when = START + timedelta(minutes=number)
+    rows = [
+        {"device_id": device_id, "power_consumption": 100.0, "time": when}
+        for device_id in device_ids
+    ]
+    status = "ON" if number % 2 == 0 else "OFF"
+    changes = {device_id: status for device_id in device_ids[::2]}
+    return rows, changes
+
+
+def bulk(device_ids, sweeps):
+    """(statements, seconds) per sweep through write_sweep."""
+    with count_statements() as sent:
+        started = time.perf_counter()
+        for number in range(sweeps):
+            rows, changes = _sweep(device_ids, number)
+            with db.get_session() as session:
+                write_sweep(session, rows, changes)
+        elapsed = time.perf_counter() - started
+    return sent[0] / sweeps, elapsed / sweeps
+
+
+def per_device(device_ids, sweeps, first):
+    """(statements, seconds) per sweep with an ORM add + commit per device."""
+    with count_statements() as sent:
+        started = time.perf_counter()
+        for number in range(first, first + sweeps):
+            rows, changes = _sweep(device_ids, number)
+            with db.get_session() as session:
+                devices = {device.device_id: device for device in session.query(Device)}
+                for row in rows:
+                    session.add(MinutelyConsumption(**row))
+                    if row["device_id"] in changes:
+                        devices[row["device_id"]].status = changes[row["device_id"]]
+                    session.commit()
+        elapsed = time.perf_counter() - started
+    return sent[0] / sweeps, elapsed / sweeps
+
+
+def run(url, devices, sweeps, compare_limit):
+    """Yields (backend, devices, bulk stats, per-device stats or None)."""
+    for count in devices:
+        with scratch_database(url) as backend:
+            device_ids = add_devices(count)
+            fast = bulk(device_ids, sweeps)
+            slow = (
+                per_device(device_ids, sweeps, first=sweeps)
+                if count <= compare_limit
+                else None
+            )
+        yield backend, count, fast, slow
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep write benchmark")
+    parser.add_argument("--devices", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--sweeps", type=int, default=5)
+    parser.add_argument(
+        "--compare-limit",
+        type=int,
+        default=1000,
+        help="largest device count also measured on the per-device path",
+    )
+    parser.add_argument(
+        "--url", action="append", default=[], help="MySQL server to run on as well"
+    )
+    args = parser.parse_args()
+
+    for url in [None] + args.url:
+        for backend, count, fast, slow in run(
+            url, args.devices, args.sweeps, args.compare_limit
+        ):
+            line = (
+                f"{backend:6} {count:6} devices: bulk {fast[0]:.0f} statements, "
+                f"{fast[1] * 1000:.1f} ms per sweep"
+            )
+            if slow:
+                line += (
+                    f"; per device {slow[0]:.0f} statements, "
+                    f"{slow[1] * 1000:.1f} ms per sweep"
+                )
+            print(line)
@@ -0,0 +1,133 @@
+"""
+Live-stream load harness: N EventSource clients on one PowerBroadcaster.
+
+Publishes --sweeps sweeps of --devices readings into an mmap latest-reading
+cache in a temporary directory, every --interval seconds, while --clients
+threads each consume the SSE body of their own connection (a dashboard of
+--per-client devices) the way a WSGI worker would send it, parsing the
+"data:" events like EventSource does. Reports the connections held, memory per
+connection (Python objects via tracemalloc; thread stacks, which depend on the
+WSGI worker, are excluded and shown as the process RSS growth instead) and the
+delay from publishing a sweep to each client receiving it.
+
+    python -m benchmarks.bench_live_stream --clients 1000
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import resource
+import threading
+import tracemalloc
+from datetime import datetime
+
+from device_data_collector.latest_cache import MmapLatestCache
+from device_data_collector.live_stream import PowerBroadcaster
+
+
+def _rss_kb():
+    """Peak resident set size of the process in KiB (Linux units)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _client(broadcaster, subscription, published, delays, stop):
+    """One EventSource: read the stream until stopped, time each sweep seen."""
+    body = broadcaster.stream(subscription, heartbeat=0.5)
+    try:
+        for chunk in body:
+            if chunk.startswith("data: "):
+                event = json.loads(chunk[len("data: "):])
+                received = time.perf_counter()
+                for reading in event["devices"].values():
+                    # the power published is the sweep number
+                    delays.append(received - published[int(reading["power"])])
+                    break
+            if stop.is_set():
+                break
+    finally:
+        body.close()  # unsubscribes, as a disconnecting client does
+
+
+def run(clients, devices, per_client, sweeps, interval, poll_interval, seed=1):
+    """(connections, bytes per connection, RSS KiB per connection, delays, expected)."""
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = MmapLatestCache(path=os.path.join(directory, "latest.bin"))
+        cache.publish({}, datetime.now())  # creates the file readers map
+        broadcaster = PowerBroadcaster(cache=cache, poll_interval=poll_interval)
+        published, delays, stop = {}, [], threading.Event()
+
+        rss_before = _rss_kb()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        subscriptions = [
+            broadcaster.subscribe(
+                {
+                    device_id: device_id // 10
+                    for device_id in rng.sample(range(1, devices + 1), per_client)
+                }
+            )
+            for _ in range(clients)
+        ]
+        per_connection = (tracemalloc.get_traced_memory()[0] - before) / clients
+        tracemalloc.stop()
+
+        threads = [
+            threading.Thread(
+                target=_client,
+                args=(broadcaster, subscription, published, delays, stop),
+                daemon=True,
+            )
+            for subscription in subscriptions
+        ]
+        for thread in threads:
+            thread.start()
+        connections = broadcaster.connections()
+        rss_per_connection = (_rss_kb() - rss_before) / clients
+
+        for number in range(1, sweeps + 1):
+            published[number] = time.perf_counter()
+            cache.publish(
+                dict.fromkeys(range(1, devices + 1), float(number)), datetime.now()
+            )
+            time.sleep(interval)
+
+        stop.set()
+        for thread in threads:
+            thread.join()
+        assert broadcaster.connections() == 0
+    return connections, per_connection, rss_per_connection, delays, clients * sweeps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live-stream load harness")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--per-client", type=int, default=10)
+    parser.add_argument("--sweeps", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--poll", type=float, default=0.1)
+    args = parser.parse_args()
+
+    connections, per_connection, rss_per_connection, delays, expected = run(
+        args.clients,
+        args.devices,
+        args.per_client,
+        args.sweeps,
+        args.interval,
+        args.poll,
+    )
+    delays.sort()
+    print(
+        f"{connections} concurrent connections: {per_connection:,.0f} bytes of "
+        f"Python objects and {rss_per_connection:,.1f} KiB RSS per connection"
+    )
+    if delays:
+        print(
+            f"{len(delays)}/{expected} sweep events received; publish to client "
+            f"p50 {delays[len(delays) // 2] * 1000:.1f} ms, "
+            f"p99 {delays[int(len(delays) * 0.99)] * 1000:.1f} ms, "
+            f"max {delays[-1] * 1000:.1f} ms"
+        )
@@ -0,0 +1,58 @@
+"""
+Recent-store memory benchmark: --devices devices over --hours of sweeps.
+
+Records one sweep per SAMPLE_INTERVAL for every device into a RecentStore of
+RECENT_HOURS, running past the ring size so every ring has wrapped, and
+reports the memory the store holds (tracemalloc, everything it allocated and
+kept) against the documented bound of 4 bytes per sample, bytes per
+device-day and the cost of one sweep's record() call.
+
+    python -m benchmarks.bench_recent_store --devices 10000 --hours 26
+"""
+import time
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+from device_data_collector.recent_store import RecentStore, RECENT_HOURS
+from device_data_collector.ingest import SAMPLE_INTERVAL
+
+START = datetime(2026, 10, 5)
+
+
+def run(devices, hours):
+    """(store, bytes held, documented bound, seconds per record call)."""
+    tracemalloc.start()
+    store = RecentStore()
+    interval = timedelta(seconds=SAMPLE_INTERVAL)
+    sweeps = int(hours * 3600 // SAMPLE_INTERVAL)
+    elapsed = 0.0
+    for number in range(sweeps):
+        readings = {device_id: 100.0 + number % 7 for device_id in range(devices)}
+        started = time.perf_counter()
+        store.record(START + number * interval, readings)
+        elapsed += time.perf_counter() - started
+        del readings
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    bound = devices * store.size * 4
+    return store, held, bound, elapsed / sweeps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recent store memory benchmark")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument(
+        "--hours", type=float, default=RECENT_HOURS + 2, help="of sweeps recorded"
+    )
+    args = parser.parse_args()
+
+    store, held, bound, per_sweep = run(args.devices, args.hours)
+    days = store.size * SAMPLE_INTERVAL / 86400
+    print(
+        f"{args.devices:,} devices, {store.size:,} samples each "
+        f"({RECENT_HOURS:g} h at {SAMPLE_INTERVAL:g} s): "
+        f"{held / 2**20:.1f} MiB held, {bound / 2**20:.1f} MiB of samples, "
+        f"{held / args.devices / days:,.0f} bytes per device-day"
+    )
+    print(f"record(): {per_sweep * 1000:.1f} ms per sweep")
@@ -0,0 +1,85 @@
+"""
+Rollup cost benchmark: an hourly rollup must cost the same whatever the size
+of the already-rolled history and grow only with the hour's own rows.
+
+For each --devices count and each --days of minutely history (already rolled
+up, as in a running system), inserts one more hour of readings and times the
+hourly, daily and weekly rollups that close it, reporting statements and
+milliseconds. Runs on a scratch SQLite file, and on MySQL for each --url.
+
+    python -m benchmarks.bench_rollups --devices 100 400 --days 1 4 16
+"""
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from device_data_collector.db import db
+from device_data_collector.data_processor import (
+    aggregate_hourly,
+    aggregate_daily,
+    aggregate_weekly,
+)
+from device_data_collector.models import MinutelyConsumption
+
+from benchmarks.common import scratch_database, add_devices, count_statements
+
+END = datetime(2026, 10, 5)  # a Monday: the last hour closes a day and a week
+
+
+def _add_minutes(device_ids, start, end):
+    rows, when = [], start
+    while when < end:
+        rows.extend(
+            {"device_id": device_id, "power_consumption": 100.0, "time": when}
+            for device_id in device_ids
+        )
+        if len(rows) >= 50000:
+            with db.get_session() as session:
+                session.execute(insert(MinutelyConsumption), rows)
+            rows = []
+        when += timedelta(minutes=1)
+    if rows:
+        with db.get_session() as session:
+            session.execute(insert(MinutelyConsumption), rows)
+
+
+def _roll_up(now):
+    aggregate_hourly(now)
+    aggregate_daily(now)
+    aggregate_weekly(now)
+
+
+def run(url, devices, days):
+    """(backend, raw rows stored, statements, seconds) of the rollups closing the last hour."""
+    with scratch_database(url) as backend:
+        device_ids = add_devices(devices)
+        last_hour = END - timedelta(hours=1)
+        _add_minutes(device_ids, last_hour - timedelta(days=days), last_hour)
+        _roll_up(last_hour)  # the history is already rolled up
+        _add_minutes(device_ids, last_hour, END)
+        with count_statements() as sent:
+            started = time.perf_counter()
+            _roll_up(END)
+            elapsed = time.perf_counter() - started
+    return backend, devices * (days * 24 + 1) * 60, sent[0], elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rollup cost benchmark")
+    parser.add_argument("--devices", type=int, nargs="+", default=[100, 400])
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 8])
+    parser.add_argument(
+        "--url", action="append", default=[], help="MySQL server to run on as well"
+    )
+    args = parser.parse_args()
+
+    for url in [None] + args.url:
+        for devices in args.devices:
+            for days in args.days:
+                backend, rows, statements, elapsed = run(url, devices, days)
+                print(
+                    f"{backend}: {devices} devices, {rows:,} raw rows: "
+                    f"{statements} statements, {elapsed * 1000:.0f} ms"
+                )
@@ -0,0 +1,95 @@
+"""
+Spool throughput benchmark: how fast sweeps are logged and drained.
+
+Appends --sweeps sweeps of --devices readings to a spool in a temporary
+directory (with and without fsync), then flushes them into a scratch SQLite
+database and reports sweeps/s for appending and readings/s for flushing.
+
+    python -m benchmarks.bench_spool --devices 10000 --sweeps 60
+"""
+import os
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from device_data_collector.db import db
+from device_data_collector.spool import Spool
+from device_data_collector.migrations import migrate
+from device_data_collector.models import User, Profile, Room, Device
+
+
+def _add_devices(devices):
+    with db.get_session() as session:
+        user = User(user_name="bench", email="bench@localhost", password="-")
+        session.add(user)
+        session.flush()
+        profile = Profile(name="bench", user_id=user.user_id)
+        session.add(profile)
+        session.flush()
+        room = Room(name="bench", profile_id=profile.profile_id)
+        session.add(room)
+        session.flush()
+        session.execute(
+            insert(Device),
+            [
+                {
+                    "device_id": device_id,
+                    "name": f"plug {device_id}",
+                    "device_url": f"http://127.0.0.1:8099/{device_id}",
+                    "type": "plug",
+                    "room_id": room.room_id,
+                }
+                for device_id in range(1, devices + 1)
+            ],
+        )
+
+
+def _sweeps(devices, sweeps, start):
+    for number in range(sweeps):
+        when = start + timedelta(minutes=number)
+        yield when, [
+            {"device_id": device_id, "power_consumption": 100.0, "time": when}
+            for device_id in range(1, devices + 1)
+        ]
+
+
+def run(devices, sweeps, fsync):
+    """(sweeps appended per second, readings flushed per second)."""
+    with tempfile.TemporaryDirectory() as directory:
+        db.configure(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        migrate()
+        _add_devices(devices)
+        spool = Spool(os.path.join(directory, "spool"), fsync=fsync)
+        batches = list(_sweeps(devices, sweeps, datetime(2026, 1, 5)))
+
+        started = time.perf_counter()
+        for when, rows in batches:
+            spool.append(when, rows, {})
+        appended = time.perf_counter() - started
+
+        started = time.perf_counter()
+        flushed = 0
+        while (written := spool.flush_once()) is not None:
+            flushed += written
+        drained = time.perf_counter() - started
+        spool.close()
+        db.dispose()
+    return sweeps / appended, flushed / drained
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spool throughput benchmark")
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--sweeps", type=int, default=60)
+    args = parser.parse_args()
+
+    for fsync in (True, False):
+        append_rate, flush_rate = run(args.devices, args.sweeps, fsync)
+        print(
+            f"fsync={'on' if fsync else 'off'}: append {append_rate:,.0f} sweeps/s "
+            f"({append_rate * args.devices:,.0f} readings/s), "
+            f"flush {flush_rate:,.0f} readings/s"
+        )
@@ -0,0 +1,40 @@
+"""
+Shared benchmark suite: the database benchmarks, small settings, once per
+storage backend, so SQLite and MySQL numbers come from the same run.
+
+Always runs on a scratch SQLite file; add a --url per MySQL server to compare.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --url mysql+mysqlconnector://root:pw@localhost/
+"""
+import argparse
+
+from benchmarks import bench_ingest, bench_rollups
+
+
+def run(url, devices):
+    """Yields one report line per benchmark on the backend of `url`."""
+    for backend, count, fast, _ in bench_ingest.run(url, [devices], 3, 0):
+        yield (
+            f"{backend:6} ingest  {count} devices: {fast[0]:.0f} statements, "
+            f"{fast[1] * 1000:.1f} ms per sweep"
+        )
+    for days in (1, 4):
+        backend, rows, statements, elapsed = bench_rollups.run(url, devices, days)
+        yield (
+            f"{backend:6} rollups {devices} devices, {rows:,} raw rows: "
+            f"{statements} statements, {elapsed * 1000:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database benchmarks per backend")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument(
+        "--url", action="append", default=[], help="MySQL server to run on as well"
+    )
+    args = parser.parse_args()
+
+    for url in [None] + args.url:
+        for line in run(url, args.devices):
+            print(line)
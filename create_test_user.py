@@ -1,13 +1,14 @@
-from device_data_collector.models import session, User
+from device_data_collector.db import db
+from device_data_collector.models import User
 
 # Create a test user
-test_user = User(
-    user_name="Test User", email="test@example.com", password="password123"
-)
+with db.get_session() as session:
+    test_user = User(
+        user_name="Test User", email="test@example.com", password="password123"
+    )
 
-# Add to database
-session.add(test_user)
-session.commit()
+    # Add to database
+    session.add(test_user)
 
 print("Test user created successfully!")
 print("Email: test@example.com")
@@ -0,0 +1,425 @@
+"""
+Alert rules and notification dispatch.
+
+The collector hands each sweep to AlertDispatcher.submit() (a sweep listener)
+and each batch of anomaly events to submit_anomalies(). Both only put a
+reference on a bounded queue and return; when the queue is full the item is
+dropped and counted, so alerting never adds latency to a sweep. One
+dispatcher thread does the rest:
+
+  - rules: "over_power" (reading above ALERT_MAX_POWER_W), "long_run" (ON
+    above ON_THRESHOLD_W for more than ALERT_MAX_ON_HOURS without a break;
+    unreachable sweeps do not end a run) and "anomaly" (events of the
+    anomaly detector);
+  - deduplication: a (device, rule) pair alerts at most once per
+    ALERT_DEDUP_SECONDS of sweep time;
+  - per-user rate limit: a token bucket of ALERT_USER_BURST alerts refilled
+    at ALERT_USER_RATE per hour; alerts above it are dropped and counted;
+  - batching: alerts are delivered to every sink once ALERT_BATCH_SIZE are
+    pending or the oldest has waited ALERT_BATCH_SECONDS.
+
+Device owners (user id, name, email) are resolved with one query per batch of
+unknown devices and cached like the web app's ownership lookups.
+
+Sinks (ALERT_SINKS, comma separated) implement deliver(alerts):
+    log      one log line per alert
+    email    one .eml file per user and batch in ALERT_EMAIL_DIR, for a mail
+             relay or pickup directory to send
+    webhook  POST of the batch as a JSON list to ALERT_WEBHOOK_URL
+A failing sink is logged and its batch counted as failed; the others still
+receive it.
+"""
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from email.message import EmailMessage
+import requests
+from sqlalchemy import select
+
+from device_data_collector.db import db
+from device_data_collector.ingest import ON_THRESHOLD_W, _chunks
+from device_data_collector.auth_cache import LRUCache
+from device_data_collector.models import User, Profile, Room, Device
+
+logger = logging.getLogger(__name__)
+
+ALERT_SINKS = os.getenv("ALERT_SINKS", "log")
+ALERT_MAX_POWER_W = float(os.getenv("ALERT_MAX_POWER_W", "3000"))
+ALERT_MAX_ON_HOURS = float(os.getenv("ALERT_MAX_ON_HOURS", "12"))
+ALERT_DEDUP_SECONDS = float(os.getenv("ALERT_DEDUP_SECONDS", "3600"))
+ALERT_USER_BURST = int(os.getenv("ALERT_USER_BURST", "5"))
+ALERT_USER_RATE = float(os.getenv("ALERT_USER_RATE", "20"))  # alerts per hour
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "100"))
+ALERT_BATCH_SECONDS = float(os.getenv("ALERT_BATCH_SECONDS", "5"))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "100"))  # sweeps
+ALERT_EMAIL_DIR = os.getenv("ALERT_EMAIL_DIR", "alerts")
+ALERT_EMAIL_FROM = os.getenv("ALERT_EMAIL_FROM", "alerts@localhost")
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+ALERT_WEBHOOK_TIMEOUT = float(os.getenv("ALERT_WEBHOOK_TIMEOUT", "5"))
+ALERT_OWNER_BATCH = 500
+
+_SWEEP = "sweep"
+_ANOMALIES = "anomalies"
+
+
+class LogSink:
+    def deliver(self, alerts):
+        for alert in alerts:
+            logger.warning(f"Alert for user {alert['user_id']}: {alert['message']}")
+
+
+class EmailFileSink:
+    """Writes one RFC 5322 message per user and batch into a directory."""
+
+    def __init__(self, directory=ALERT_EMAIL_DIR, sender=ALERT_EMAIL_FROM):
+        self.directory = directory
+        self.sender = sender
+        os.makedirs(directory, exist_ok=True)
+        self._sequence = 0
+
+    def deliver(self, alerts):
+        by_user = {}
+        for alert in alerts:
+            by_user.setdefault(alert["user_id"], []).append(alert)
+        for user_id, user_alerts in by_user.items():
+            message = EmailMessage()
+            message["From"] = self.sender
+            message["To"] = user_alerts[0]["email"]
+            count = len(user_alerts)
+            message["Subject"] = (
+                user_alerts[0]["message"] if count == 1 else f"{count} device alerts"
+            )
+            message.set_content(
+                f"Hello {user_alerts[0]['user_name']},\n\n"
+                + "".join(f"- {alert['message']}\n" for alert in user_alerts)
+            )
+            self._sequence += 1
+            name = f"{time.time_ns()}-{self._sequence}-user{user_id}.eml"
+            # written under a temporary name, so a pickup never reads half a file
+            path = os.path.join(self.directory, name)
+            with open(path + ".tmp", "wb") as file:
+                file.write(bytes(message))
+            os.replace(path + ".tmp", path)
+
+
+class WebhookSink:
+    def __init__(self, url=ALERT_WEBHOOK_URL, timeout=ALERT_WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def deliver(self, alerts):
+        response = self.session.post(
+            self.url,
+            data=json.dumps(alerts),
+            headers={"Content-Type": "application/json"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+
+
+SINKS = {
+    "log": LogSink,
+    "email": EmailFileSink,
+    "webhook": WebhookSink,
+}
+
+
+def build_sinks(spec=ALERT_SINKS):
+    """Sink instances for a comma-separated list of SINKS names."""
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SINKS]
+    if unknown:
+        raise ValueError(f"Unknown alert sinks: {', '.join(unknown)}")
+    return [SINKS[name]() for name in names]
+
+
+class AlertDispatcher:
+    def __init__(
+        self,
+        sinks=None,
+        max_power=ALERT_MAX_POWER_W,
+        max_on_hours=ALERT_MAX_ON_HOURS,
+        dedup_seconds=ALERT_DEDUP_SECONDS,
+        user_burst=ALERT_USER_BURST,
+        user_rate=ALERT_USER_RATE,
+        batch_size=ALERT_BATCH_SIZE,
+        batch_seconds=ALERT_BATCH_SECONDS,
+        queue_size=ALERT_QUEUE_SIZE,
+    ):
+        self.sinks = build_sinks() if sinks is None else sinks
+        self.max_power = max_power
+        self.max_on_seconds = max_on_hours * 3600
+        self.dedup_seconds = dedup_seconds
+        self.user_burst = user_burst
+        self.user_rate = user_rate / 3600.0
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.owners = LRUCache()
+        # alert counts; delivered and failed are counted once per sink
+        self.stats = dict.fromkeys(
+            (
+                "sweeps",
+                "dropped",
+                "raised",
+                "deduplicated",
+                "rate_limited",
+                "delivered",
+                "failed",
+            ),
+            0,
+        )
+        self._queue = queue.Queue(queue_size)
+        self._on_since = {}  # device_id -> start of the current ON run
+        self._last_sent = {}  # (device_id, rule) -> sweep time of the last alert
+        self._buckets = {}  # user_id -> (tokens, sweep time)
+        self._pending = []
+        self._pending_since = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def submit(self, sweep_time, readings):
+        """Sweep listener: queue the sweep for rule evaluation."""
+        self._put((_SWEEP, sweep_time, readings))
+
+    def submit_anomalies(self, events):
+        """Anomaly detector listener: queue its new events."""
+        self._put((_ANOMALIES, None, events))
+
+    def _evaluate_sweep(self, sweep_time, readings):
+        found = []
+        on_since = self._on_since
+        for device_id, power in readings.items():
+            if power is None:
+                continue
+            if power > self.max_power:
+                found.append(
+                    (
+                        device_id,
+                        "over_power",
+                        sweep_time,
+                        power,
+                        f"draws {power:.0f} W (limit {self.max_power:.0f} W)",
+                    )
+                )
+            if power <= ON_THRESHOLD_W:
+                on_since.pop(device_id, None)
+                continue
+            started = on_since.setdefault(device_id, sweep_time)
+            running = (sweep_time - started).total_seconds()
+            if running > self.max_on_seconds:
+                found.append(
+                    (
+                        device_id,
+                        "long_run",
+                        sweep_time,
+                        power,
+                        f"has been on for {running / 3600:.1f} h "
+                        f"(since {started:%Y-%m-%d %H:%M})",
+                    )
+                )
+        return found
+
+    def _evaluate_anomalies(self, events):
+        return [
+            (
+                event["device_id"],
+                "anomaly",
+                datetime.fromisoformat(event["time"]),
+                event["power"],
+                f"draws {event['power']:.0f} W, unusually {event['kind']} "
+                f"(expected about {event['expected']:.0f} W)",
+            )
+            for event in events
+        ]
+
+    def _owners(self, device_ids):
+        """{device_id: (name, user_id, user_name, email)}, querying misses in chunks."""
+        found, missing = {}, []
+        for device_id in device_ids:
+            owner = self.owners.get(device_id)
+            if owner is None:
+                missing.append(device_id)
+            else:
+                found[device_id] = owner
+        if not missing:
+            return found
+        query = (
+            select(
+                Device.device_id, Device.name, User.user_id, User.user_name, User.email
+            )
+            .join(Room, Room.room_id == Device.room_id)
+            .join(Profile, Profile.profile_id == Room.profile_id)
+            .join(User, User.user_id == Profile.user_id)
+        )
+        with db.get_session() as session:
+            for chunk in _chunks(missing, ALERT_OWNER_BATCH):
+                for device_id, *owner in session.execute(
+                    query.where(Device.device_id.in_(chunk))
+                ):
+                    found[device_id] = tuple(owner)
+                    self.owners.put(device_id, tuple(owner))
+        return found
+
+    def _take_token(self, user_id, when):
+        tokens, updated = self._buckets.get(user_id, (self.user_burst, when))
+        elapsed = max((when - updated).total_seconds(), 0.0)
+        tokens = min(self.user_burst, tokens + elapsed * self.user_rate)
+        if tokens < 1:
+            self._buckets[user_id] = (tokens, when)
+            return False
+        self._buckets[user_id] = (tokens - 1, when)
+        return True
+
+    def _admit(self, found):
+        """Deduplicate, resolve owners and rate-limit; queue what remains."""
+        self.stats["raised"] += len(found)
+        fresh = {}
+        for candidate in found:
+            key = candidate[:2]
+            last = self._last_sent.get(key)
+            if key in fresh or (
+                last is not None
+                and (candidate[2] - last).total_seconds() < self.dedup_seconds
+            ):
+                self.stats["deduplicated"] += 1
+                continue
+            fresh[key] = candidate
+        if not fresh:
+            return
+
+        # resolved before the dedup entries are taken, so a failed lookup
+        # (database down) does not suppress these alerts for dedup_seconds
+        owners = self._owners(sorted({device_id for device_id, _ in fresh}))
+        for device_id, rule, when, power, detail in fresh.values():
+            self._last_sent[device_id, rule] = when
+            owner = owners.get(device_id)
+            if owner is None:
+                continue  # device deleted since the sweep
+            name, user_id, user_name, email = owner
+            if not self._take_token(user_id, when):
+                self.stats["rate_limited"] += 1
+                continue
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append(
+                {
+                    "device_id": device_id,
+                    "device_name": name,
+                    "user_id": user_id,
+                    "user_name": user_name,
+                    "email": email,
+                    "rule": rule,
+                    "time": when.isoformat(),
+                    "power": power,
+                    "message": f"{name} {detail}",
+                }
+            )
+
+    def _prune(self, now):
+        """Forget dedup entries and full token buckets that no longer matter."""
+        self._last_sent = {
+            key: when
+            for key, when in self._last_sent.items()
+            if (now - when).total_seconds() < self.dedup_seconds
+        }
+        refill = self.user_burst / self.user_rate if self.user_rate else float("inf")
+        self._buckets = {
+            user_id: (tokens, when)
+            for user_id, (tokens, when) in self._buckets.items()
+            if (now - when).total_seconds() < refill
+        }
+
+    def flush(self):
+        """Deliver the pending alerts to every sink, in batches of batch_size."""
+        pending, self._pending = self._pending, []
+        self._pending_since = None
+        for offset in range(0, len(pending), self.batch_size):
+            batch = pending[offset : offset + self.batch_size]
+            for sink in self.sinks:
+                try:
+                    sink.deliver(batch)
+                    self.stats["delivered"] += len(batch)
+                except Exception as err:
+                    self.stats["failed"] += len(batch)
+                    logger.error(
+                        f"Alert sink {type(sink).__name__} failed: {str(err)}"
+                    )
+
+    def process(self, item):
+        """Evaluate one queued sweep or anomaly batch."""
+        kind, sweep_time, payload = item
+        if kind == _SWEEP:
+            self.stats["sweeps"] += 1
+            found = self._evaluate_sweep(sweep_time, payload)
+        else:
+            found = self._evaluate_anomalies(payload)
+        if found:
+            self._admit(found)
+        if kind == _SWEEP and self.stats["sweeps"] % 60 == 0:
+            self._prune(sweep_time)
+
+    def _run(self):
+        while True:
+            timeout = self.batch_seconds
+            if self._pending_since is not None:
+                timeout -= time.monotonic() - self._pending_since
+            try:
+                item = self._queue.get(timeout=max(timeout, 0.0))
+            except queue.Empty:
+                item = None
+            if item is not None:
+                try:
+                    self.process(item)
+                except Exception as err:
+                    logger.error(f"Alert evaluation failed: {str(err)}")
+            if self._pending and (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._pending_since >= self.batch_seconds
+            ):
+                self.flush()
+            if self._stop.is_set() and self._queue.empty():
+                break
+        self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="alert-dispatcher", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Evaluate what is queued, deliver what is pending and stop."""
+        self._stop.set()
+        if self._thread is not None:
+            self._queue.put(None)  # wake the thread up
+            self._thread.join()
+            self._thread = None
+
+    def __str__(self):
+        counts = ", ".join(f"{value} {key}" for key, value in self.stats.items())
+        return f"alerts: {counts}"
+
+
+_dispatcher = None
+
+
+def get_alert_dispatcher():
+    """Process-wide dispatcher of the collector."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = AlertDispatcher()
+    return _dispatcher
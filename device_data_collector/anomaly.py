@@ -0,0 +1,282 @@
+"""
+Abnormal-usage detection.
+
+Streaming stage (collector): AnomalyDetector is a sweep listener keeping
+constant-memory statistics per device:
+  - an hour-of-week baseline: Welford mean/variance of the readings in each of
+    the 168 hours of the week, with the count capped at ANOMALY_WINDOW so old
+    weeks fade out (float32 arrays, ~1.7 KB per device);
+  - an EWMA mean/variance of all readings, used while the hour's baseline
+    has fewer than ANOMALY_MIN_SAMPLES readings.
+A reading further than max(ANOMALY_Z standard deviations, ANOMALY_MIN_DELTA_W)
+from the expected value is an anomaly; an event is emitted when a device
+enters that state (not on every reading while it stays there). Events are kept
+in memory, passed to listeners, and served over the local socket
+("anomaly.recent"). State starts empty when the collector starts; the state
+of a device is dropped (forget) when a reload of the collector's device list
+no longer has it.
+
+Bucket stage (data processor): when daily/weekly buckets close, the new rows
+are compared with the median of the device's previous ANOMALY_DAILY_HISTORY
+days / ANOMALY_WEEKLY_HISTORY weeks, and their status set to "high" or "low"
+instead of "regular" when they deviate by more than ANOMALY_BUCKET_Z robust
+standard deviations (MAD based) and ANOMALY_MIN_DELTA_W.
+"""
+import os
+import math
+import logging
+import threading
+from array import array
+from collections import deque
+from statistics import median
+from datetime import timedelta
+from sqlalchemy import select, update
+
+from device_data_collector import local_ipc
+from device_data_collector.latest_cache import LATEST_CACHE_SOCKET
+from device_data_collector.models import DeviceDailyConsumption, DeviceWeeklyConsumption
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "5"))
+ANOMALY_MIN_DELTA_W = float(os.getenv("ANOMALY_MIN_DELTA_W", "20"))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "30"))
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "500"))
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.02"))
+ANOMALY_EVENTS_KEPT = int(os.getenv("ANOMALY_EVENTS_KEPT", "1000"))
+ANOMALY_BUCKET_Z = float(os.getenv("ANOMALY_BUCKET_Z", "3"))
+ANOMALY_DAILY_HISTORY = int(os.getenv("ANOMALY_DAILY_HISTORY", "28"))
+ANOMALY_WEEKLY_HISTORY = int(os.getenv("ANOMALY_WEEKLY_HISTORY", "12"))
+ANOMALY_MIN_HISTORY = 5
+
+HOURS_PER_WEEK = 168
+MAD_TO_STD = 1.4826  # median absolute deviation -> standard deviation (normal data)
+
+
+class DeviceStats:
+    """Online statistics of one device: hour-of-week Welford arrays plus an EWMA."""
+
+    __slots__ = (
+        "counts",
+        "means",
+        "m2s",
+        "ewma_mean",
+        "ewma_var",
+        "seen",
+        "anomalous",
+    )
+
+    def __init__(self):
+        self.counts = array("H", bytes(2 * HOURS_PER_WEEK))
+        self.means = array("f", bytes(4 * HOURS_PER_WEEK))
+        self.m2s = array("f", bytes(4 * HOURS_PER_WEEK))
+        self.ewma_mean = 0.0
+        self.ewma_var = 0.0
+        self.seen = 0
+        self.anomalous = False
+
+
+class AnomalyDetector:
+    def __init__(
+        self,
+        z=ANOMALY_Z,
+        min_delta=ANOMALY_MIN_DELTA_W,
+        min_samples=ANOMALY_MIN_SAMPLES,
+        window=ANOMALY_WINDOW,
+        alpha=ANOMALY_EWMA_ALPHA,
+        events_kept=ANOMALY_EVENTS_KEPT,
+    ):
+        self.z = z
+        self.min_delta = min_delta
+        self.min_samples = min_samples
+        self.window = min(window, 65535)
+        self.alpha = alpha
+        self.events = deque(maxlen=events_kept)
+        self._stats = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Register listener(events) called with each sweep's new anomaly events."""
+        self._listeners.append(listener)
+
+    def record(self, sweep_time, readings):
+        """Sweep listener: update every device's statistics, emit new anomalies."""
+        slot = sweep_time.weekday() * 24 + sweep_time.hour
+        z, min_delta, min_samples = self.z, self.min_delta, self.min_samples
+        window, alpha = self.window, self.alpha
+        found = []
+        with self._lock:
+            stats = self._stats
+            for device_id, power in readings.items():
+                if power is None:
+                    continue
+                state = stats.get(device_id)
+                if state is None:
+                    state = stats[device_id] = DeviceStats()
+
+                count = state.counts[slot]
+                if count >= min_samples:
+                    expected = state.means[slot]
+                    spread = math.sqrt(state.m2s[slot] / (count - 1))
+                    source = "hour_of_week"
+                elif state.seen >= min_samples:
+                    expected = state.ewma_mean
+                    spread = math.sqrt(state.ewma_var)
+                    source = "ewma"
+                else:
+                    expected = None
+                if expected is not None:
+                    deviation = power - expected
+                    outlier = abs(deviation) > max(z * spread, min_delta)
+                    if outlier and not state.anomalous:
+                        found.append(
+                            {
+                                "device_id": device_id,
+                                "time": sweep_time.isoformat(),
+                                "power": power,
+                                "expected": expected,
+                                "std": spread,
+                                "kind": "high" if deviation > 0 else "low",
+                                "baseline": source,
+                            }
+                        )
+                    state.anomalous = outlier
+
+                # Welford update; once the count is capped the oldest weeks fade out
+                capped = count >= window
+                if not capped:
+                    count += 1
+                    state.counts[slot] = count
+                mean = state.means[slot]
+                delta = power - mean
+                mean += delta / count
+                state.means[slot] = mean
+                m2 = state.m2s[slot]
+                if capped:
+                    m2 *= 1 - 1 / count
+                state.m2s[slot] = max(m2 + delta * (power - mean), 0.0)
+
+                delta = power - state.ewma_mean
+                state.ewma_mean += alpha * delta
+                state.ewma_var = (1 - alpha) * (state.ewma_var + alpha * delta * delta)
+                state.seen += 1
+            if found:
+                self.events.extend(found)
+
+        if found:
+            logger.info(f"{len(found)} anomalies detected")
+            for listener in self._listeners:
+                try:
+                    listener(found)
+                except Exception as err:
+                    logger.error(f"Anomaly listener failed: {str(err)}")
+
+    def forget(self, keep_ids):
+        """Drop the statistics of devices that no longer exist."""
+        with self._lock:
+            for device_id in set(self._stats) - set(keep_ids):
+                del self._stats[device_id]
+
+    def recent(self, device_ids=None, limit=100):
+        """Newest anomaly events first, for all or the given devices."""
+        with self._lock:
+            events = [
+                event
+                for event in reversed(self.events)
+                if device_ids is None or event["device_id"] in device_ids
+            ]
+        return events[:limit]
+
+    def serve(self, path=LATEST_CACHE_SOCKET):
+        """Answer "anomaly.recent" requests from the web app."""
+
+        def handle(device_ids=None, limit=100):
+            return self.recent(device_ids and set(device_ids), limit)
+
+        local_ipc.get_server(path).register("anomaly.recent", handle)
+        return self
+
+
+_detector = None
+
+
+def get_anomaly_detector():
+    """Process-wide detector of the collector."""
+    global _detector
+    if _detector is None:
+        _detector = AnomalyDetector()
+    return _detector
+
+
+def fetch_anomalies(device_ids, limit=100, path=LATEST_CACHE_SOCKET):
+    """Recent anomaly events from the running collector; raises if unreachable."""
+    return local_ipc.call(
+        path, "anomaly.recent", device_ids=list(device_ids), limit=limit
+    )
+
+
+# level -> (model, date column, value column, history span)
+BUCKET_LEVELS = {
+    "daily": (
+        DeviceDailyConsumption,
+        DeviceDailyConsumption.date,
+        DeviceDailyConsumption.daily_average,
+        timedelta(days=ANOMALY_DAILY_HISTORY),
+    ),
+    "weekly": (
+        DeviceWeeklyConsumption,
+        DeviceWeeklyConsumption.date,
+        DeviceWeeklyConsumption.weekly_average,
+        timedelta(weeks=ANOMALY_WEEKLY_HISTORY),
+    ),
+}
+
+
+def flag_closed_buckets(session, level, after_id, z=ANOMALY_BUCKET_Z):
+    """
+    Set status "high"/"low" on the `level` rows with consumption_id > after_id
+    that deviate from the device's previous buckets. Returns the rows flagged.
+    """
+    model, date_col, value_col, span = BUCKET_LEVELS[level]
+    new_rows = session.execute(
+        select(model.consumption_id, model.device_id, date_col, value_col).where(
+            model.consumption_id > after_id
+        )
+    ).all()
+    if not new_rows:
+        return 0
+
+    history = {}
+    oldest = min(row[2] for row in new_rows) - span
+    device_ids = {row[1] for row in new_rows}
+    for device_id, when, value in session.execute(
+        select(model.device_id, date_col, value_col).where(
+            model.device_id.in_(device_ids), date_col >= oldest
+        )
+    ):
+        history.setdefault(device_id, []).append((when, value))
+
+    flagged = []
+    for consumption_id, device_id, when, value in new_rows:
+        previous = [
+            past
+            for past_when, past in history.get(device_id, ())
+            if when - span <= past_when < when
+        ]
+        if len(previous) < ANOMALY_MIN_HISTORY:
+            continue
+        # median / MAD, so earlier abnormal buckets do not mask later ones
+        center = median(previous)
+        spread = MAD_TO_STD * median(abs(past - center) for past in previous)
+        if abs(value - center) > max(z * spread, ANOMALY_MIN_DELTA_W):
+            flagged.append(
+                {
+                    "consumption_id": consumption_id,
+                    "status": "high" if value > center else "low",
+                }
+            )
+    if flagged:
+        session.execute(update(model), flagged)
+        logger.info(f"Flagged {len(flagged)} abnormal {level} buckets")
+    return len(flagged)
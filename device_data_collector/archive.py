@@ -0,0 +1,191 @@
+"""
+Columnar archive tier for long-term consumption history.
+
+Closed months of hourly and daily consumption older than ARCHIVE_AFTER_MONTHS
+are compacted into zstd-compressed Parquet files, one per device and month:
+
+    ARCHIVE_DIR/hourly/device_id=17/2026-07.parquet
+    ARCHIVE_DIR/daily/device_id=17/2026-07.parquet
+
+and removed from the database. read_series() answers a range query from the
+files (memory-mapped, only the time/value columns) plus the rows still in the
+database, so callers do not need to know where the cut-over is.
+
+The tier is off unless ARCHIVE_DIR is set; it needs the optional pyarrow package.
+"""
+import os
+import logging
+import importlib.util
+from datetime import datetime, date
+from sqlalchemy import select, delete
+
+from device_data_collector.db import db
+from device_data_collector.models import HourlyConsumption, DeviceDailyConsumption
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "3"))
+ARCHIVE_READ_BATCH = 50000
+
+# level -> (model, time column, value column)
+LEVELS = {
+    "hourly": (
+        HourlyConsumption,
+        HourlyConsumption.time,
+        HourlyConsumption.power_consumption,
+    ),
+    "daily": (
+        DeviceDailyConsumption,
+        DeviceDailyConsumption.date,
+        DeviceDailyConsumption.daily_average,
+    ),
+}
+
+
+def _pyarrow():
+    """(pyarrow, pyarrow.parquet), imported on first use: it is slow to import
+    and only the archive/read paths need it. None if it is not installed."""
+    if importlib.util.find_spec("pyarrow") is None:  # optional dependency
+        return None
+    import pyarrow
+    import pyarrow.parquet
+
+    return pyarrow, pyarrow.parquet
+
+
+def archive_enabled():
+    return bool(ARCHIVE_DIR) and _pyarrow() is not None
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_cutoff(now=None):
+    """Months strictly before this date are closed and old enough to archive."""
+    now = now or datetime.now()
+    return _add_months(_month_start(now), -ARCHIVE_AFTER_MONTHS)
+
+
+def archive_path(level, device_id, month, root=None):
+    return os.path.join(
+        root or ARCHIVE_DIR, level, f"device_id={device_id}", f"{month:%Y-%m}.parquet"
+    )
+
+
+def _schema(pa, level):
+    time_type = pa.timestamp("s") if level == "hourly" else pa.date32()
+    return pa.schema([("time", time_type), ("value", pa.float64())])
+
+
+def _write_month(level, device_id, month, rows, root=None):
+    """Write one device-month atomically, merging with a file left by an earlier run."""
+    pa, pq = _pyarrow()
+    path = archive_path(level, device_id, month, root)
+    merged = {}
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True).to_pydict()
+        merged.update(zip(existing["time"], existing["value"]))
+    merged.update(rows)
+    times = sorted(merged)
+    table = pa.table(
+        {"time": times, "value": [merged[t] for t in times]},
+        schema=_schema(pa, level),
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def archive_level(level, now=None, root=None):
+    """Move closed months of one level from the database into Parquet files."""
+    model, time_col, value_col = LEVELS[level]
+    cutoff = archive_cutoff(now)
+    if level == "hourly":
+        cutoff = datetime.combine(cutoff, datetime.min.time())
+    written = 0
+    with db.get_session() as session:
+        result = session.execute(
+            select(model.device_id, time_col, value_col)
+            .where(time_col < cutoff)
+            .order_by(model.device_id, time_col)
+            .execution_options(yield_per=ARCHIVE_READ_BATCH)
+        )
+        current_key, rows = None, {}
+        for device_id, when, value in result:
+            key = (device_id, _month_start(when))
+            if key != current_key:
+                if rows:
+                    _write_month(level, *current_key, rows, root)
+                    written += 1
+                current_key, rows = key, {}
+            rows[when] = value
+        if rows:
+            _write_month(level, *current_key, rows, root)
+            written += 1
+
+        if written:
+            session.execute(delete(model).where(time_col < cutoff))
+            logger.info(f"Archived {written} {level} device-months before {cutoff}")
+    return written
+
+
+def archive_closed_periods(now=None):
+    """Processor step: archive hourly and daily history older than ARCHIVE_AFTER_MONTHS."""
+    if not archive_enabled():
+        return
+    try:
+        for level in LEVELS:
+            archive_level(level, now)
+    except Exception as e:
+        logger.error(f"Error archiving consumption history: {str(e)}")
+        raise
+
+
+def _read_archived(level, device_id, start, end, root=None):
+    modules = _pyarrow() if (root or ARCHIVE_DIR) else None
+    if modules is None:
+        return []
+    _, pq = modules
+    if level == "daily":
+        start, end = start.date(), end.date()
+    month, last = _month_start(start), _month_start(end)
+    series = []
+    while month <= last:
+        path = archive_path(level, device_id, month, root)
+        if os.path.exists(path):
+            table = pq.read_table(
+                path,
+                columns=["time", "value"],
+                memory_map=True,
+                filters=[("time", ">=", start), ("time", "<", end)],
+            ).to_pydict()
+            series.extend(zip(table["time"], table["value"]))
+        month = _add_months(month, 1)
+    return series
+
+
+def read_series(session, level, device_id, start, end, root=None):
+    """
+    (time, value) pairs of one device for start <= time < end, merged from the
+    archive files and the database, ordered by time.
+    """
+    model, time_col, value_col = LEVELS[level]
+    series = _read_archived(level, device_id, start, end, root)
+    lower, upper = (start.date(), end.date()) if level == "daily" else (start, end)
+    series.extend(
+        session.execute(
+            select(time_col, value_col)
+            .where(model.device_id == device_id, time_col >= lower, time_col < upper)
+            .order_by(time_col)
+        ).all()
+    )
+    series.sort(key=lambda point: point[0])
+    return series
@@ -0,0 +1,169 @@
+"""
+Memoized ownership and user lookups for the web app.
+
+device/room/profile -> owning user_id, and user_id -> user fields, kept in
+bounded LRU caches with a TTL. Entries are dropped by ORM events whenever a
+device, room, profile or user is deleted or re-parented, so a cached answer
+never outlives the row it was derived from in this process. Other processes
+see such changes after AUTH_CACHE_TTL at the latest.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, select, inspect
+
+from device_data_collector.models import User, Profile, Room, Device
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+
+
+class LRUCache:
+    """Thread-safe LRU map with a maximum size and per-entry TTL."""
+
+    def __init__(self, maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+device_owners = LRUCache()
+room_owners = LRUCache()
+profile_owners = LRUCache()
+users = LRUCache()
+
+
+def _owner(cache, key, session, query):
+    owner = cache.get(key)
+    if owner is None:
+        owner = session.execute(query).scalar()
+        if owner is not None:
+            cache.put(key, owner)
+    return owner
+
+
+def device_owner(session, device_id):
+    """user_id owning the device, or None if it does not exist (one joined query on a miss)."""
+    return _owner(
+        device_owners,
+        device_id,
+        session,
+        select(Profile.user_id)
+        .join(Room, Room.profile_id == Profile.profile_id)
+        .join(Device, Device.room_id == Room.room_id)
+        .where(Device.device_id == device_id),
+    )
+
+
+def room_owner(session, room_id):
+    return _owner(
+        room_owners,
+        room_id,
+        session,
+        select(Profile.user_id)
+        .join(Room, Room.profile_id == Profile.profile_id)
+        .where(Room.room_id == room_id),
+    )
+
+
+def profile_owner(session, profile_id):
+    return _owner(
+        profile_owners,
+        profile_id,
+        session,
+        select(Profile.user_id).where(Profile.profile_id == profile_id),
+    )
+
+
+def cached_user(session, user_id):
+    """Row with user_id, user_name and email of a user, or None."""
+    user = users.get(user_id)
+    if user is None:
+        row = session.execute(
+            select(User.user_id, User.user_name, User.email).where(
+                User.user_id == user_id
+            )
+        ).first()
+        if row is None:
+            return None
+        user = row
+        users.put(user_id, user)
+    return user
+
+
+def _reparented(target, attribute):
+    return inspect(target).attrs[attribute].history.has_changes()
+
+
+@event.listens_for(Device, "after_delete")
+def _forget_device(mapper, connection, target):
+    device_owners.discard(target.device_id)
+
+
+@event.listens_for(Device, "after_update")
+def _moved_device(mapper, connection, target):
+    if _reparented(target, "room_id"):
+        device_owners.discard(target.device_id)
+
+
+@event.listens_for(Room, "after_delete")
+def _forget_room(mapper, connection, target):
+    room_owners.discard(target.room_id)
+    device_owners.clear()
+
+
+@event.listens_for(Room, "after_update")
+def _moved_room(mapper, connection, target):
+    if _reparented(target, "profile_id"):
+        _forget_room(mapper, connection, target)
+
+
+@event.listens_for(Profile, "after_delete")
+def _forget_profile(mapper, connection, target):
+    profile_owners.discard(target.profile_id)
+    room_owners.clear()
+    device_owners.clear()
+
+
+@event.listens_for(Profile, "after_update")
+def _moved_profile(mapper, connection, target):
+    if _reparented(target, "user_id"):
+        _forget_profile(mapper, connection, target)
+
+
+@event.listens_for(User, "after_delete")
+@event.listens_for(User, "after_update")
+def _forget_user(mapper, connection, target):
+    users.discard(target.user_id)
@@ -0,0 +1,327 @@
+"""
+Bulk re-aggregation (backfill) of consumption history with NumPy.
+
+Recomputes hourly rows from the raw readings, daily rows from hourly and
+weekly rows from daily for a time range, e.g. after a rollup fix or a schema
+change such as the hourly min/max/energy columns:
+
+    python -m device_data_collector.backfill --level all --start 2026-09-01
+
+The range is processed one window of whole target buckets at a time. A
+window's source rows are streamed in chunks (yield_per) into NumPy arrays and
+reduced per (device, bucket) with a lexsort plus reduceat, so memory depends
+on the devices and samples in one window, not on the length of the range.
+Each window replaces its target rows (delete + bulk insert) in one
+transaction: re-running is idempotent and an interruption loses at most the
+window in flight. Daily and weekly rows come back with status "regular", and
+the room/profile/user rollups of the window's buckets are recomputed with them.
+
+The end is clamped to buckets that are already closed, and the covered
+devices' watermarks are raised to it so the regular rollups do not insert
+those buckets again. Only history whose source rows are still in the
+database is recomputed: the start is moved up to the first whole bucket after
+the oldest source row (raw readings past RAW_RETENTION_DAYS and archived
+Parquet months are gone), and a window without any source rows keeps its
+target rows. Needs the optional numpy package.
+"""
+import logging
+import argparse
+from datetime import datetime, date, timedelta
+import numpy as np
+from sqlalchemy import select, insert, delete, func
+
+from device_data_collector.db import db
+from device_data_collector.ingest import ON_THRESHOLD_W, SAMPLE_INTERVAL, _chunks
+from device_data_collector.watermarks import advance_watermarks
+from device_data_collector.group_rollups import refresh_group_rollups
+from device_data_collector.data_processor import current_boundaries
+from device_data_collector.models import (
+    MinutelyConsumption,
+    HourlyConsumption,
+    DeviceDailyConsumption,
+    DeviceWeeklyConsumption,
+)
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK = 100000
+BACKFILL_WRITE_BATCH = 10000
+
+
+def hour_buckets(times):
+    return times.astype("datetime64[h]")
+
+
+def day_buckets(times):
+    return times.astype("datetime64[D]")
+
+
+def week_buckets(times):
+    """Monday of each week (1970-01-01 was a Thursday)."""
+    days = times.astype("datetime64[D]")
+    return days - (days.astype(np.int64) + 3) % 7
+
+
+def grouped_stats(device_ids, buckets, values):
+    """
+    Vectorized per-(device, bucket) reduction of unsorted readings.
+    Returns (device_ids, buckets, count, sum, min, max), one entry per group.
+    """
+    if not len(values):
+        empty = np.empty(0)
+        return device_ids[:0], buckets[:0], empty, empty, empty, empty
+    order = np.lexsort((buckets, device_ids))
+    device_ids, buckets, values = device_ids[order], buckets[order], values[order]
+    new_group = np.empty(len(values), dtype=bool)
+    new_group[0] = True
+    np.not_equal(device_ids[1:], device_ids[:-1], out=new_group[1:])
+    new_group[1:] |= buckets[1:] != buckets[:-1]
+    starts = np.flatnonzero(new_group)
+    return (
+        device_ids[starts],
+        buckets[starts],
+        np.diff(np.append(starts, len(values))),
+        np.add.reduceat(values, starts),
+        np.minimum.reduceat(values, starts),
+        np.maximum.reduceat(values, starts),
+    )
+
+
+def _hourly_rows(device_ids, buckets, counts, sums, mins, maxs):
+    energy = sums * (SAMPLE_INTERVAL / 3600.0)
+    return [
+        {
+            "device_id": device_id,
+            "power_consumption": total / count,
+            "min_power": low,
+            "max_power": high,
+            "energy_wh": wh,
+            "time": bucket,
+            "aggregated": False,
+        }
+        for device_id, bucket, count, total, low, high, wh in zip(
+            device_ids.tolist(),
+            buckets.astype("datetime64[us]").tolist(),
+            counts.tolist(),
+            sums.tolist(),
+            mins.tolist(),
+            maxs.tolist(),
+            energy.tolist(),
+        )
+    ]
+
+
+def _average_rows(value_key, as_date):
+    def rows(device_ids, buckets, counts, sums, mins, maxs):
+        buckets = buckets.astype("datetime64[D]" if as_date else "datetime64[us]")
+        return [
+            {
+                "device_id": device_id,
+                value_key: total / count,
+                "date": bucket,
+                "status": "regular",
+                "aggregated": False,
+            }
+            for device_id, bucket, count, total in zip(
+                device_ids.tolist(), buckets.tolist(), counts.tolist(), sums.tolist()
+            )
+        ]
+
+    return rows
+
+
+# level -> (source model, source time, source value, extra source filters,
+#           bucket function, target model, target time, row builder,
+#           boundary index in current_boundaries(), default window)
+LEVELS = {
+    "hourly": (
+        MinutelyConsumption,
+        MinutelyConsumption.time,
+        MinutelyConsumption.power_consumption,
+        [MinutelyConsumption.power_consumption > ON_THRESHOLD_W],
+        hour_buckets,
+        HourlyConsumption,
+        HourlyConsumption.time,
+        _hourly_rows,
+        0,
+        timedelta(hours=6),
+    ),
+    "daily": (
+        HourlyConsumption,
+        HourlyConsumption.time,
+        HourlyConsumption.power_consumption,
+        [],
+        day_buckets,
+        DeviceDailyConsumption,
+        DeviceDailyConsumption.date,
+        _average_rows("daily_average", as_date=True),
+        1,
+        timedelta(days=7),
+    ),
+    "weekly": (
+        DeviceDailyConsumption,
+        DeviceDailyConsumption.date,
+        DeviceDailyConsumption.daily_average,
+        [],
+        week_buckets,
+        DeviceWeeklyConsumption,
+        DeviceWeeklyConsumption.date,
+        _average_rows("weekly_average", as_date=False),
+        2,
+        timedelta(weeks=8),
+    ),
+}
+
+
+BUCKET_STEPS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+
+def _window_buckets(level, start, end):
+    step = BUCKET_STEPS[level]
+    return [start + step * index for index in range((end - start) // step)]
+
+
+def _bucket_start(level, when):
+    bucket = LEVELS[level][4](np.array([when], dtype="datetime64[us]"))[0]
+    return bucket.astype("datetime64[us]").astype(datetime)
+
+
+def _bound(column, when):
+    """Compare Date columns with dates and DateTime columns with datetimes."""
+    return when.date() if column.type.python_type is date else when
+
+
+def oldest_source(session, level, device_ids=None):
+    """Time of the oldest source row of a level still stored, or None."""
+    model, time_col, _, filters = LEVELS[level][:4]
+    query = select(func.min(time_col)).where(*filters)
+    if device_ids is not None:
+        query = query.where(model.device_id.in_(device_ids))
+    oldest = session.scalar(query)
+    if oldest is not None and not isinstance(oldest, datetime):
+        oldest = datetime.combine(oldest, datetime.min.time())
+    return oldest
+
+
+def load_window(session, level, start, end, device_ids=None, chunk=BACKFILL_CHUNK):
+    """(device_ids, times, values) arrays of a level's source rows in [start, end)."""
+    model, time_col, value_col, filters = LEVELS[level][:4]
+    query = select(model.device_id, time_col, value_col).where(
+        time_col >= _bound(time_col, start), time_col < _bound(time_col, end), *filters
+    )
+    if device_ids is not None:
+        query = query.where(model.device_id.in_(device_ids))
+    ids, times, values = [], [], []
+    result = session.execute(query.execution_options(yield_per=chunk))
+    for partition in result.partitions():
+        part_ids, part_times, part_values = zip(*partition)
+        ids.append(np.fromiter(part_ids, np.int64, len(part_ids)))
+        times.append(np.array(part_times, dtype="datetime64[us]"))
+        values.append(np.fromiter(part_values, np.float64, len(part_values)))
+    if not ids:
+        return (
+            np.empty(0, np.int64),
+            np.empty(0, "datetime64[us]"),
+            np.empty(0, np.float64),
+        )
+    return np.concatenate(ids), np.concatenate(times), np.concatenate(values)
+
+
+def backfill_level(level, start, end=None, device_ids=None, window=None, now=None):
+    """
+    Recompute `level` rows for the buckets in [start, end) from the level
+    below. Returns (source rows read, rows written).
+    """
+    (_, _, _, _, bucket_fn, target, target_time, build_rows, boundary, default) = (
+        LEVELS[level]
+    )
+    closed = current_boundaries(now)[boundary]
+    start = _bucket_start(level, start)
+    end = min(_bucket_start(level, end), closed) if end else closed
+    with db.get_session() as session:
+        oldest = oldest_source(session, level, device_ids)
+    if oldest is None:
+        logger.warning(f"No {level} source rows stored, nothing to backfill")
+        return 0, 0
+    first_whole = _bucket_start(level, oldest)
+    if first_whole < oldest:
+        first_whole += BUCKET_STEPS[level]
+    if start < first_whole:
+        logger.warning(
+            f"No {level} source rows before {oldest} (purged, archived or never "
+            f"collected); starting at {first_whole}"
+        )
+        start = first_whole
+    window = window or default
+    read = written = 0
+
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + window, end)
+        with db.get_session() as session:
+            ids, times, values = load_window(
+                session, level, window_start, window_end, device_ids
+            )
+            if not len(values):
+                # no source left (or ever) for this window: keep what is there
+                logger.info(f"{level} {window_start} .. {window_end}: no source rows")
+                window_start = window_end
+                continue
+            rows = build_rows(*grouped_stats(ids, bucket_fn(times), values))
+            stale = delete(target).where(
+                target_time >= _bound(target_time, window_start),
+                target_time < _bound(target_time, window_end),
+            )
+            if device_ids is not None:
+                stale = stale.where(target.device_id.in_(device_ids))
+            session.execute(stale)
+            for batch in _chunks(rows, BACKFILL_WRITE_BATCH):
+                session.execute(insert(target), batch)
+            refresh_group_rollups(
+                session, level, _window_buckets(level, window_start, window_end)
+            )
+        read += len(values)
+        written += len(rows)
+        logger.info(
+            f"{level} {window_start} .. {window_end}: "
+            f"{len(values)} source rows -> {len(rows)} rows"
+        )
+        window_start = window_end
+
+    if start < end:
+        with db.get_session() as session:
+            advance_watermarks(session, level, end, device_ids)
+    return read, written
+
+
+def backfill(levels, start, end=None, device_ids=None):
+    """Backfill the levels in order (hourly before daily before weekly)."""
+    for level in levels:
+        read, written = backfill_level(level, start, end, device_ids)
+        logger.info(f"Backfilled {level}: {read} source rows -> {written} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute consumption rollups")
+    parser.add_argument(
+        "--level", choices=["hourly", "daily", "weekly", "all"], default="all"
+    )
+    parser.add_argument(
+        "--start",
+        type=datetime.fromisoformat,
+        required=True,
+        help="first bucket; moved up to the oldest source rows still stored, "
+        "ranges already purged or archived to Parquet are left untouched",
+    )
+    parser.add_argument(
+        "--end", type=datetime.fromisoformat, help="default: last closed bucket"
+    )
+    parser.add_argument("--device", type=int, action="append", dest="devices")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    levels = list(LEVELS) if args.level == "all" else [args.level]
+    backfill(levels, args.start, args.end, args.devices)
@@ -1,83 +1,436 @@
+import os
 import time
 import logging
+import threading
 import requests
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+from sqlalchemy import select
 
 from device_data_collector.db import db
-from device_data_collector.models import Device, MinutelyConsumption
+from device_data_collector.models import Device
+from device_data_collector.ingest import write_sweep, ON_THRESHOLD_W, SAMPLE_INTERVAL
+from device_data_collector.device_client import get_device_client, DEVICE_TIMEOUT
+from device_data_collector.latest_cache import (
+    get_latest_cache,
+    publish_sweep,
+    SocketLatestCache,
+)
 from device_data_collector.data_processor import data_processor
+from device_data_collector.ticker import TickScheduler
+from device_data_collector.poll_policy import PollPolicy, serve_poll_stats
+from device_data_collector.spool import get_spool
+from device_data_collector.recent_store import get_recent_store
+from device_data_collector.anomaly import get_anomaly_detector
+from device_data_collector.alerts import get_alert_dispatcher
 
 logger = logging.getLogger(__name__)
 
+COLLECTOR_WORKERS = int(os.getenv("COLLECTOR_WORKERS", "64"))
+SWEEP_DEADLINE = float(os.getenv("SWEEP_DEADLINE", "45"))
+# seconds between rollup runs; SAMPLE_INTERVAL (sub-minute works, e.g. 10)
+# is defined in ingest
+PROCESS_INTERVAL = float(os.getenv("PROCESS_INTERVAL", "60"))
+# seconds between device list reloads; sweeps use the last list loaded
+DEVICE_REFRESH_INTERVAL = float(os.getenv("DEVICE_REFRESH_INTERVAL", "300"))
+# how long the first sweep waits for the first load
+DEVICE_REFRESH_TIMEOUT = float(os.getenv("DEVICE_REFRESH_TIMEOUT", "10"))
 
-def fetch_device_power(device_url):
+poll_policy = PollPolicy(SAMPLE_INTERVAL, DEVICE_TIMEOUT)
+
+_executor = None
+_executor_workers = 0
+_device_list = None
+_sweep_listeners = []
+
+
+def add_sweep_listener(listener):
+    """
+    Register listener(sweep_time, readings) to run after each stored sweep.
+    readings maps device_id to the polled watts (None when unreachable).
+    """
+    _sweep_listeners.append(listener)
+
+
+def _notify_sweep_listeners(sweep_time, readings):
+    for listener in _sweep_listeners:
+        try:
+            listener(sweep_time, readings)
+        except Exception as err:
+            logger.error(f"Sweep listener {listener.__name__} failed: {str(err)}")
+
+
+def fetch_device_power(device_url, generation=None):
     """Fetch Shelly device power; None if unreachable."""
     try:
-        resp = requests.get(f"{device_url}/rpc/Shelly.GetStatus", timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            return data.get("switch:0", {}).get("apower", 0.0)
-        if resp.status_code == 404:
-            resp = requests.get(f"{device_url}/status", timeout=5)
-            if resp.status_code == 200:
-                data = resp.json()
-                return data.get("meters", [{}])[0].get("power", 0.0)
-        return None
+        return get_device_client().get_power(device_url, generation)
     except requests.exceptions.RequestException as exc:
         logger.error(f"Error fetching power data: {str(exc)}")
         return None
 
 
-def collect_data():
-    """Collect power data if >1W, otherwise mark device as OFF."""
+class SweepStats:
+    """Outcome of one polling sweep over all devices."""
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.responded = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.missed_deadline = 0
+        self.duration = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.devices} devices in {self.duration:.2f}s: "
+            f"{self.responded} responded, {self.failed} failed, "
+            f"{self.timeouts} timed out, {self.missed_deadline} missed deadline"
+        )
+
+
+def _poll_one(device_url, timeout):
+    """Returns (power, timed_out) for a single device."""
     try:
-        with db.get_session() as session:
-            devices = session.query(Device).all()
-            if not devices:
-                logger.info("No devices found, waiting...")
-                return
-
-            for device in devices:
-                power = fetch_device_power(device.device_url)
-                if power and power > 1:
-                    usage = MinutelyConsumption(
-                        device_id=device.device_id,
-                        power_consumption=power,
-                        time=datetime.now(),
-                    )
-                    device.status = "ON"
-                    session.add(usage)
-                    session.commit()
-                    logger.info(f"Device {device.device_id}: {power}W")
-                else:
-                    device.status = "OFF"
-                    logger.info(
-                        f"Device {device.device_id} is OFF (power={power or 0.0})"
+        return get_device_client().get_power(device_url, timeout=timeout), False
+    except requests.exceptions.Timeout:
+        return None, True
+    except requests.exceptions.RequestException as exc:
+        logger.debug(f"Error fetching power data from {device_url}: {str(exc)}")
+        return None, False
+
+
+def _get_executor(max_workers):
+    """Pool is kept between sweeps so worker threads are reused."""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != max_workers:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="device-poll"
+        )
+        _executor_workers = max_workers
+    return _executor
+
+
+def poll_devices(
+    targets,
+    max_workers=COLLECTOR_WORKERS,
+    deadline=SWEEP_DEADLINE,
+    timeout=DEVICE_TIMEOUT,
+):
+    """
+    Fetch power from many devices in parallel on a bounded thread pool.
+    targets: iterable of (device_id, device_url) or (device_id, device_url, timeout).
+    Devices that have not answered when the sweep deadline passes are reported
+    as None and counted in missed_deadline. Returns (readings, SweepStats).
+
+    future.cancel() only drops calls that have not started; a running request
+    ends only at its own timeout, so request timeouts are capped at the
+    deadline; a hung plug never keeps a pool thread busy into the next sweep.
+    """
+    targets = [
+        (device_id, url, min(device_timeout, deadline))
+        for device_id, url, device_timeout in (
+            (target + (timeout,))[:3] for target in targets
+        )
+    ]
+    stats = SweepStats(len(targets))
+    readings = {device_id: None for device_id, _, _ in targets}
+    if not targets:
+        return readings, stats
+
+    started = time.monotonic()
+    executor = _get_executor(max_workers)
+    futures = {
+        executor.submit(_poll_one, url, device_timeout): device_id
+        for device_id, url, device_timeout in targets
+    }
+    done, not_done = wait(futures, timeout=deadline)
+
+    for future in done:
+        power, timed_out = future.result()
+        readings[futures[future]] = power
+        if power is not None:
+            stats.responded += 1
+        elif timed_out:
+            stats.timeouts += 1
+        else:
+            stats.failed += 1
+    for future in not_done:
+        future.cancel()
+    stats.missed_deadline = len(not_done)
+    stats.duration = time.monotonic() - started
+    return readings, stats
+
+
+def sweep_deadline():
+    """A sweep must finish well inside its sampling interval."""
+    return min(SWEEP_DEADLINE, SAMPLE_INTERVAL * 0.75)
+
+
+KnownDevice = namedtuple("KnownDevice", "device_id device_url status api_generation")
+
+
+class DeviceList:
+    """
+    The devices to sweep, reloaded from the database in a background thread
+    once the list is `interval` seconds old, so a sweep never waits on the
+    database: it uses the last list loaded, and only the first sweep waits
+    (up to `timeout`) for a load. Statuses and API generations the collector
+    stores are applied to the list as well, so they do not go stale between
+    reloads (including over a reload that read the database before them).
+    """
+
+    def __init__(
+        self, interval=DEVICE_REFRESH_INTERVAL, timeout=DEVICE_REFRESH_TIMEOUT
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self._devices = None  # {device_id: KnownDevice}
+        self._loaded_at = None
+        self._loading = None  # reload thread in flight
+        self._applied = {}  # device_id -> fields stored since that reload began
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Register listener(device_ids), run after each reload with every device id."""
+        self._listeners.append(listener)
+
+    def _load(self):
+        try:
+            with db.get_session() as session:
+                rows = session.execute(
+                    select(
+                        Device.device_id,
+                        Device.device_url,
+                        Device.status,
+                        Device.api_generation,
                     )
+                ).all()
+        except Exception as err:
+            logger.warning(f"Could not reload the device list: {str(err)}")
+            with self._lock:
+                self._loading = None
+            return
+        devices = {row.device_id: KnownDevice(*row) for row in rows}
+        with self._lock:
+            for device_id, fields in self._applied.items():
+                if device_id in devices:
+                    devices[device_id] = devices[device_id]._replace(**fields)
+            self._devices = devices
+            self._loaded_at = time.monotonic()
+            self._loading = None
+        for listener in self._listeners:
+            try:
+                listener(list(devices))
+            except Exception as err:
+                logger.error(
+                    f"Device list listener {listener.__name__} failed: {str(err)}"
+                )
+
+    def _reload(self):
+        """Start a reload unless one is in flight (call with the lock held)."""
+        if self._loading is None:
+            self._applied = {}
+            self._loading = threading.Thread(
+                target=self._load, name="device-list", daemon=True
+            )
+            self._loading.start()
+        return self._loading
+
+    def devices(self, shards=None, total_shards=1):
+        """
+        KnownDevice rows to sweep (only those whose device_id % total_shards
+        is in shards, if given). Raises if no list could be loaded yet.
+        """
+        with self._lock:
+            stale = (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at >= self.interval
+            )
+            loading = self._reload() if stale else None
+            devices = self._devices
+        if devices is None:
+            loading.join(self.timeout)
+            devices = self._devices
+            if devices is None:
+                raise RuntimeError("Device list not loaded yet, database unreachable?")
+        if shards is None:
+            return list(devices.values())
+        return [d for d in devices.values() if d.device_id % total_shards in shards]
+
+    def apply(self, status_changes, generations):
+        """Record statuses and API generations the collector just stored."""
+        fields = ((status_changes, "status"), (generations, "api_generation"))
+        with self._lock:
+            for changes, field in fields:
+                for device_id, value in changes.items():
+                    self._applied.setdefault(device_id, {})[field] = value
+                    if self._devices and device_id in self._devices:
+                        self._devices[device_id] = self._devices[device_id]._replace(
+                            **{field: value}
+                        )
+
+
+def get_device_list():
+    """Process-wide device list of the collector."""
+    global _device_list
+    if _device_list is None:
+        _device_list = DeviceList()
+    return _device_list
+
+
+def collect_data(shards=None, total_shards=1, tick_time=None):
+    """
+    Collect power data if >1W, otherwise mark device as OFF.
+    The whole sweep is written in one transaction through the bulk ingest path
+    (or appended to the local spool, see device_data_collector.spool), every
+    reading stamped with tick_time (the scheduler's canonical tick). Devices
+    come from the collector's DeviceList, not from a query per sweep.
+    With shards, only devices whose device_id % total_shards is in shards are polled.
+    """
+    spool = get_spool()
+    device_list = get_device_list()
+    try:
+        devices = device_list.devices(shards, total_shards)
+        if not devices:
+            logger.info("No devices found, waiting...")
+            return
+
+        sweep_time = tick_time or datetime.now()
+        client = get_device_client()
+        targets = []
+        for device in devices:
+            client.remember(device.device_url, device.api_generation)
+            timeout = poll_policy.plan(
+                device.device_id, sweep_time, switched_on=device.status == "ON"
+            )
+            if timeout is not None:
+                targets.append((device.device_id, device.device_url, timeout))
+        poll_policy.forget(device.device_id for device in devices)
+
+        readings, stats = poll_devices(targets, deadline=sweep_deadline())
+        for device_id, power in readings.items():
+            poll_policy.record(device_id, sweep_time, power)
+        logger.info(
+            f"Sweep finished: {stats}; {len(devices) - len(targets)} not due, "
+            f"devices by poll mode {poll_policy.summary(sweep_time)}"
+        )
+
+        rows = []
+        status_changes = {}
+        generations = {}
+        for device in devices:
+            if device.device_id not in readings:
+                continue  # not due this tick, status unchanged
+            generation = client.generation(device.device_url)
+            if generation is not None and generation != device.api_generation:
+                generations[device.device_id] = generation
+            power = readings[device.device_id]
+            if power and power > ON_THRESHOLD_W:
+                rows.append(
+                    {
+                        "device_id": device.device_id,
+                        "power_consumption": power,
+                        "time": sweep_time,
+                    }
+                )
+                status = "ON"
+                logger.debug(f"Device {device.device_id}: {power}W")
+            else:
+                status = "OFF"
+                logger.debug(f"Device {device.device_id} is OFF (power={power or 0.0})")
+            # a status still waiting in the spool is newer than the stored one
+            known = (
+                spool.pending_status(device.device_id, device.status)
+                if spool
+                else device.status
+            )
+            if status != known:
+                status_changes[device.device_id] = status
+
+        if spool:
+            spool.append(sweep_time, rows, status_changes, generations)
+        else:
+            with db.get_session() as session:
+                write_sweep(session, rows, status_changes, generations)
+        device_list.apply(status_changes, generations)
+        logger.info(
+            f"Stored {len(rows)} readings, {len(status_changes)} status changes"
+        )
     except Exception as err:
         logger.error(f"Error collecting data: {str(err)}")
         raise
 
+    _notify_sweep_listeners(sweep_time, readings)
+
+
+def process_tick(tick_time, held_back=None):
+    """
+    Run the rollups as of one sweep deadline before the tick, so a bucket is
+    only closed once every sweep stamped inside it has been written, and
+    before held_back (the oldest sweep still waiting in a spool).
+    """
+    now = tick_time - timedelta(seconds=sweep_deadline())
+    if held_back is not None and held_back <= now:
+        logger.info(f"Rollups held back to {held_back} until the spool is flushed")
+        # a bucket boundary equal to held_back would count that sweep as seen
+        now = held_back - timedelta(microseconds=1)
+    data_processor(now)
+
+
+def start_processor(should_run=None, held_back=None):
+    """
+    Rollups on their own cadence in a background thread, so they never delay
+    sampling. should_run() can veto a tick (e.g. not the rollup shard owner);
+    held_back() returns the time rollups must not pass, or None.
+    """
+
+    def run(tick_time):
+        if should_run is None or should_run():
+            process_tick(tick_time, held_back and held_back())
+
+    processor = TickScheduler(PROCESS_INTERVAL, name="data-processor")
+    processor.start(run)
+    return processor
+
 
 def run_data_collector():
     """
-    Check clock each second.
-    If minute changes, collect & process.
+    Sweep all devices every SAMPLE_INTERVAL seconds on aligned ticks;
+    rollups run separately every PROCESS_INTERVAL seconds.
     """
-    logger.info("Starting data collector...")
-    current_minute = datetime.now().minute
+    logger.info(f"Starting data collector (every {SAMPLE_INTERVAL}s)...")
+    cache = get_latest_cache()
+    if isinstance(cache, SocketLatestCache):
+        cache.serve()
+    serve_poll_stats(poll_policy)
+    spool = get_spool()
+    if spool:
+        spool.start_flusher()
+    add_sweep_listener(publish_sweep)
+    recent_store = get_recent_store().serve()
+    add_sweep_listener(recent_store.record)
+    get_device_list().add_listener(recent_store.forget)
+    detector = get_anomaly_detector().serve()
+    add_sweep_listener(detector.record)
+    get_device_list().add_listener(detector.forget)
+    alerts = get_alert_dispatcher().start()
+    add_sweep_listener(alerts.submit)
+    get_anomaly_detector().add_listener(alerts.submit_anomalies)
+    processor = start_processor(held_back=spool and spool.oldest_pending)
 
-    while True:
-        try:
-            now = datetime.now()
-            if now.minute != current_minute:
-                current_minute = now.minute
-                collect_data()
-                data_processor()
-            time.sleep(1)
-        except Exception as err:
-            logger.error(f"Error in collector loop: {str(err)}")
-            time.sleep(5)
+    sampler = TickScheduler(SAMPLE_INTERVAL, name="collector")
+    try:
+        sampler.run(lambda tick_time: collect_data(tick_time=tick_time))
+    finally:
+        processor.stop()
+        alerts.stop()
+        if spool:
+            spool.close()
+        logger.info(f"Collector stopped: {sampler}; {processor}; {alerts}")
 
 
 if __name__ == "__main__":
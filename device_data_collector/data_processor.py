@@ -1,9 +1,23 @@
 import logging
-from datetime import datetime
-from sqlalchemy import desc
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, func, literal, false
 from device_data_collector.db import db
+from device_data_collector.partitions import run_partition_maintenance
+from device_data_collector.archive import archive_closed_periods
+from device_data_collector.energy import integrate_energy
+from device_data_collector.anomaly import flag_closed_buckets
+from device_data_collector.ingest import SAMPLE_INTERVAL
+from device_data_collector.group_rollups import (
+    last_row_id,
+    new_buckets,
+    refresh_group_rollups,
+)
+from device_data_collector.watermarks import (
+    pending_since_watermark,
+    advance_watermarks,
+    watermark_floor,
+)
 from device_data_collector.models import (
-    Device,
     MinutelyConsumption,
     HourlyConsumption,
     DeviceDailyConsumption,
@@ -13,149 +27,255 @@ from device_data_collector.models import (
 logger = logging.getLogger(__name__)
 
 
-def aggregate_hourly():
-    """
-    Find the 60 newest minutely logs per device, if exactly 60 exist, create HourlyConsumption
-    and delete them.
-    """
-    try:
-        with db.get_session() as session:
-            any_aggregated = False
-            devices = session.query(Device).all()
-
-            for device in devices:
-                recent_minutely = (
-                    session.query(MinutelyConsumption)
-                    .filter(MinutelyConsumption.device_id == device.device_id)
-                    .filter(MinutelyConsumption.power_consumption > 1)
-                    .order_by(desc(MinutelyConsumption.time))
-                    .limit(60)
-                    .all()
-                )
+def _dialect(session):
+    return session.get_bind().dialect.name
+
+
+def hour_bucket(dialect, col):
+    """SQL expression truncating a DATETIME column to the start of its hour."""
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00.000000", col)
+    return func.date_format(col, "%Y-%m-%d %H:00:00")
+
+
+def day_bucket(dialect, col):
+    """SQL expression truncating a DATETIME/DATE column to its date."""
+    return func.date(col)
 
-                if len(recent_minutely) == 60:
-                    logs_sorted = sorted(recent_minutely, key=lambda x: x.time)
-                    avg_power = sum(m.power_consumption for m in logs_sorted) / 60
-                    start_time = logs_sorted[0].time
 
-                    hour_entry = HourlyConsumption(
-                        device_id=device.device_id,
-                        power_consumption=avg_power,
-                        time=start_time,
-                    )
-                    session.add(hour_entry)
+def week_bucket(dialect, col):
+    """SQL expression for the Monday starting the week of a DATE column."""
+    if dialect == "sqlite":
+        # same text format as SQLAlchemy's DATETIME values (and hour_bucket)
+        return func.strftime(
+            "%Y-%m-%d 00:00:00.000000",
+            col,
+            func.printf("-%d days", (func.strftime("%w", col) + 6) % 7),
+        )
+    return func.subdate(col, func.weekday(col))
 
-                    for m in recent_minutely:
-                        session.delete(m)
 
-                    any_aggregated = True
+def current_boundaries(now=None):
+    """Start of the current (still open) hour, day and week."""
+    now = now or datetime.now()
+    hour_start = now.replace(minute=0, second=0, microsecond=0)
+    day_start = hour_start.replace(hour=0)
+    week_start = day_start - timedelta(days=day_start.weekday())
+    return hour_start, day_start, week_start
 
-            if any_aggregated:
-                logger.info("Hourly aggregation done.")
+
+def _since_floor(session, level, time_col, as_date=False):
+    """Extra range condition so the source scan starts at the oldest watermark."""
+    floor = watermark_floor(session, level)
+    if floor is None:
+        return ()
+    return (time_col >= (floor.date() if as_date else floor),)
+
+
+def aggregate_hourly(now=None):
+    """
+    Roll minutely logs of the hours closed since each device's hourly watermark
+    into HourlyConsumption (mean/min/max watts and energy, one INSERT ... SELECT
+    ... GROUP BY device_id, hour), then advance the watermarks. Raw rows stay
+    until retention drops them.
+    """
+    try:
+        hour_start, _, _ = current_boundaries(now)
+        with db.get_session() as session:
+            bucket = hour_bucket(_dialect(session), MinutelyConsumption.time)
+            watermark, onclause, pending = pending_since_watermark(
+                "hourly", MinutelyConsumption.device_id, MinutelyConsumption.time
+            )
+            source = (
+                select(
+                    MinutelyConsumption.device_id,
+                    func.avg(MinutelyConsumption.power_consumption),
+                    func.min(MinutelyConsumption.power_consumption),
+                    func.max(MinutelyConsumption.power_consumption),
+                    func.sum(MinutelyConsumption.power_consumption)
+                    * (SAMPLE_INTERVAL / 3600.0),
+                    bucket,
+                    false(),
+                )
+                .outerjoin(watermark, onclause)
+                .where(
+                    MinutelyConsumption.time < hour_start,
+                    MinutelyConsumption.power_consumption > 1,
+                    pending,
+                    *_since_floor(session, "hourly", MinutelyConsumption.time),
+                )
+                .group_by(MinutelyConsumption.device_id, bucket)
+            )
+            last_id = last_row_id(session, "hourly")
+            result = session.execute(
+                insert(HourlyConsumption).from_select(
+                    [
+                        "device_id",
+                        "power_consumption",
+                        "min_power",
+                        "max_power",
+                        "energy_wh",
+                        "time",
+                        "aggregated",
+                    ],
+                    source,
+                )
+            )
+            if result.rowcount:
+                logger.info(f"Hourly aggregation done ({result.rowcount} hours).")
+                refresh_group_rollups(
+                    session, "hourly", new_buckets(session, "hourly", last_id)
+                )
+            advance_watermarks(session, "hourly", hour_start)
     except Exception as e:
         logger.error(f"Error in hourly aggregation: {str(e)}")
         raise
 
 
-def aggregate_daily():
+def aggregate_daily(now=None):
     """
-    Find the 24 newest hourly logs (aggregated=False) per device, if exactly 24 then
-    create DeviceDailyConsumption and mark them aggregated.
+    Roll hourly logs of the days closed since each device's daily watermark
+    into DeviceDailyConsumption with one INSERT ... SELECT, flag abnormal days,
+    then advance the watermarks.
     """
     try:
+        _, day_start, _ = current_boundaries(now)
         with db.get_session() as session:
-            any_aggregated = False
-            devices = session.query(Device).all()
-
-            for device in devices:
-                recent_hourly = (
-                    session.query(HourlyConsumption)
-                    .filter(HourlyConsumption.device_id == device.device_id)
-                    .filter(HourlyConsumption.aggregated == False)
-                    .order_by(desc(HourlyConsumption.time))
-                    .limit(24)
-                    .all()
+            bucket = day_bucket(_dialect(session), HourlyConsumption.time)
+            watermark, onclause, pending = pending_since_watermark(
+                "daily",
+                HourlyConsumption.device_id,
+                HourlyConsumption.time,
+                HourlyConsumption.aggregated,
+            )
+            source = (
+                select(
+                    HourlyConsumption.device_id,
+                    func.avg(HourlyConsumption.power_consumption),
+                    bucket,
+                    literal("regular"),
+                    false(),
                 )
-
-                if len(recent_hourly) == 24:
-                    logs_sorted = sorted(recent_hourly, key=lambda x: x.time)
-                    avg_day = sum(h.power_consumption for h in logs_sorted) / 24
-                    day_date = logs_sorted[0].time.date()
-
-                    daily_entry = DeviceDailyConsumption(
-                        device_id=device.device_id,
-                        daily_average=avg_day,
-                        date=day_date,
-                        status="regular",
-                    )
-                    session.add(daily_entry)
-
-                    for h in recent_hourly:
-                        h.aggregated = True
-
-                    any_aggregated = True
-
-            if any_aggregated:
-                logger.info("Daily aggregation done.")
+                .outerjoin(watermark, onclause)
+                .where(
+                    HourlyConsumption.time < day_start,
+                    pending,
+                    *_since_floor(session, "daily", HourlyConsumption.time),
+                )
+                .group_by(HourlyConsumption.device_id, bucket)
+            )
+            last_id = last_row_id(session, "daily")
+            result = session.execute(
+                insert(DeviceDailyConsumption).from_select(
+                    ["device_id", "daily_average", "date", "status", "aggregated"],
+                    source,
+                )
+            )
+            if result.rowcount:
+                logger.info(f"Daily aggregation done ({result.rowcount} days).")
+                refresh_group_rollups(
+                    session, "daily", new_buckets(session, "daily", last_id)
+                )
+                flag_closed_buckets(session, "daily", last_id)
+            advance_watermarks(session, "daily", day_start)
     except Exception as e:
         logger.error(f"Error in daily aggregation: {str(e)}")
         raise
 
 
-def aggregate_weekly():
+def aggregate_weekly(now=None):
     """
-    Find the 7 newest daily logs (aggregated=False) per device, if exactly 7 then
-    create DeviceWeeklyConsumption and mark them aggregated.
+    Roll daily logs of the weeks (Monday start) closed since each device's weekly
+    watermark into DeviceWeeklyConsumption, flag abnormal weeks, then advance
+    the watermarks.
     """
     try:
+        _, _, week_start = current_boundaries(now)
         with db.get_session() as session:
-            any_aggregated = False
-            devices = session.query(Device).all()
-
-            for device in devices:
-                recent_daily = (
-                    session.query(DeviceDailyConsumption)
-                    .filter(DeviceDailyConsumption.device_id == device.device_id)
-                    .filter(DeviceDailyConsumption.aggregated == False)
-                    .order_by(desc(DeviceDailyConsumption.date))
-                    .limit(7)
-                    .all()
+            bucket = week_bucket(_dialect(session), DeviceDailyConsumption.date)
+            watermark, onclause, pending = pending_since_watermark(
+                "weekly",
+                DeviceDailyConsumption.device_id,
+                DeviceDailyConsumption.date,
+                DeviceDailyConsumption.aggregated,
+                as_date=True,
+            )
+            source = (
+                select(
+                    DeviceDailyConsumption.device_id,
+                    func.avg(DeviceDailyConsumption.daily_average),
+                    bucket,
+                    literal("regular"),
+                    false(),
+                )
+                .outerjoin(watermark, onclause)
+                .where(
+                    DeviceDailyConsumption.date < week_start.date(),
+                    pending,
+                    *_since_floor(
+                        session, "weekly", DeviceDailyConsumption.date, as_date=True
+                    ),
+                )
+                .group_by(DeviceDailyConsumption.device_id, bucket)
+            )
+            last_id = last_row_id(session, "weekly")
+            result = session.execute(
+                insert(DeviceWeeklyConsumption).from_select(
+                    ["device_id", "weekly_average", "date", "status", "aggregated"],
+                    source,
                 )
+            )
+            if result.rowcount:
+                logger.info(f"Weekly aggregation done ({result.rowcount} weeks).")
+                refresh_group_rollups(
+                    session, "weekly", new_buckets(session, "weekly", last_id)
+                )
+                flag_closed_buckets(session, "weekly", last_id)
+            advance_watermarks(session, "weekly", week_start)
+    except Exception as e:
+        logger.error(f"Error in weekly aggregation: {str(e)}")
+        raise
+
 
-                if len(recent_daily) == 7:
-                    logs_sorted = sorted(recent_daily, key=lambda x: x.date)
-                    avg_week = sum(d.daily_average for d in logs_sorted) / 7
-                    start_day = logs_sorted[0].date
+class RollupScheduler:
+    """
+    Runs a rollup level only when one of its calendar buckets has closed since
+    the previous run, so the per-minute call costs no queries between boundaries.
+    Progress across restarts lives in the per-device RollupWatermark rows.
+    """
 
-                    weekly_entry = DeviceWeeklyConsumption(
-                        device_id=device.device_id,
-                        weekly_average=avg_week,
-                        date=start_day,
-                        status="regular",
-                    )
-                    session.add(weekly_entry)
+    def __init__(self):
+        self._last_boundary = {}
 
-                    for d in recent_daily:
-                        d.aggregated = True
+    def run(self, now=None):
+        now = now or datetime.now()
+        hour_start, day_start, week_start = current_boundaries(now)
+        for level, boundary, step in (
+            ("hourly", hour_start, aggregate_hourly),
+            ("energy", hour_start, integrate_energy),
+            ("daily", day_start, aggregate_daily),
+            ("weekly", week_start, aggregate_weekly),
+            ("retention", day_start, run_partition_maintenance),
+            ("archive", day_start, archive_closed_periods),
+        ):
+            if self._last_boundary.get(level) == boundary:
+                continue
+            step(now)
+            self._last_boundary[level] = boundary
 
-                    any_aggregated = True
 
-            if any_aggregated:
-                logger.info("Weekly aggregation done.")
-    except Exception as e:
-        logger.error(f"Error in weekly aggregation: {str(e)}")
-        raise
+scheduler = RollupScheduler()
 
 
-def data_processor():
+def data_processor(now=None):
     """
-    Runs the entire chain: minutely->hourly, hourly->daily, daily->weekly.
-    Called each minute in data_collector so logs stay up-to-date.
+    Runs the entire chain: minutely->hourly (and the energy counters),
+    hourly->daily, daily->weekly.
+    Called each minute in data_collector; a level only does work when one of
+    its wall-clock buckets has closed since the last run.
     """
     try:
-        aggregate_hourly()
-        aggregate_daily()
-        aggregate_weekly()
+        scheduler.run(now)
         logger.info("Data processing completed.")
     except Exception as e:
         logger.error(f"Error in data processing: {str(e)}")
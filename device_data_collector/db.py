@@ -1,27 +1,86 @@
+"""
+Database configuration and the process-wide DatabaseHandler.
+
+Nothing connects at import time: the engine and session factory are built on
+first use of db.engine / db.Session / db.get_session(), so importing the
+models (CLI scripts, web workers, tools) costs no connection setup and works
+while the database is down.
+"""
 import os
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import logging
+import threading
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# "mysql" (default) or "sqlite" for an embedded single-file database
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+
 DB_USERNAME = os.getenv("DB_USERNAME", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_NAME = os.getenv("DB_NAME", "intelergy")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "intelergy.db")
+
+
+def build_database_url(backend=DB_BACKEND):
+    if backend == "sqlite":
+        return f"sqlite:///{SQLITE_PATH}"
+    if backend == "mysql":
+        return (
+            f"mysql+mysqlconnector://{DB_USERNAME}:{quote_plus(DB_PASSWORD)}"
+            f"@{DB_HOST}/{DB_NAME}"
+            "?auth_plugin=mysql_native_password"
+            "&charset=utf8mb4"
+        )
+    raise ValueError(f"Unknown DB_BACKEND {backend!r}, expected mysql or sqlite")
+
+
+DATABASE_URL = build_database_url()
+
+
+def _tune_sqlite(dbapi_connection, connection_record):
+    """
+    WAL lets the web app read while the collector writes; NORMAL sync is safe
+    under WAL and the collector already commits once per sweep.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
 
-DATABASE_URL = (
-    f"mysql+mysqlconnector://{DB_USERNAME}:{quote_plus(DB_PASSWORD)}@{DB_HOST}/{DB_NAME}"
-    "?auth_plugin=mysql_native_password"
-    "&charset=utf8mb4"
-)
+def build_engine(url=DATABASE_URL):
+    """Engine for a MySQL or SQLite URL with the pool/connection settings each needs."""
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            pool_pre_ping=True,
+            connect_args={"check_same_thread": False, "timeout": 30},
+            echo=False,
+        )
+        event.listen(engine, "connect", _tune_sqlite)
+        return engine
+    return create_engine(
+        url,
+        pool_size=20,
+        pool_recycle=3600,
+        pool_pre_ping=True,
+        connect_args={"auth_plugin": "mysql_native_password"},
+        echo=False,
+    )
 
 Base = declarative_base()
 
@@ -38,21 +97,48 @@ class DatabaseHandler:
     def __init__(self):
         if self._initialized:
             return
-        try:
-            self.engine = create_engine(
-                DATABASE_URL,
-                pool_size=20,
-                pool_recycle=3600,
-                pool_pre_ping=True,
-                connect_args={"auth_plugin": "mysql_native_password"},
-                echo=False,
-            )
-            self.Session = sessionmaker(bind=self.engine)
-            self._initialized = True
-            logger.info("Database connection initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize database connection: {e}")
-            raise
+        self._engine = None
+        self._session_factory = None
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    def _connect(self):
+        with self._lock:
+            if self._engine is not None:
+                return
+            try:
+                engine = build_engine()
+                self._session_factory = sessionmaker(bind=engine)
+                self._engine = engine
+                logger.info("Database connection initialized successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize database connection: {e}")
+                raise
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._connect()
+        return self._engine
+
+    @property
+    def Session(self):
+        if self._session_factory is None:
+            self._connect()
+        return self._session_factory
+
+    def configure(self, url):
+        """Point the handler at another database (tests, benchmarks)."""
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self._engine = build_engine(url)
+            self._session_factory = sessionmaker(bind=self._engine)
+
+    def dispose(self):
+        """Drop pooled connections, e.g. in a forked child before first use."""
+        if self._engine is not None:
+            self._engine.dispose()
 
     @contextmanager
     def get_session(self):
@@ -85,4 +171,3 @@ class DatabaseHandler:
 
 
 db = DatabaseHandler()
-session = db.Session()
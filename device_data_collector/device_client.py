@@ -0,0 +1,139 @@
+"""
+Shared HTTP client for Shelly plugs.
+
+All device calls go through one requests.Session whose adapter keeps a
+keep-alive connection pool per device host, so a sweep reuses TCP connections
+instead of opening one per request. The client also remembers each device's
+API generation (Gen 2 RPC or Gen 1 REST): once known, polls and toggles go
+straight to the right endpoint instead of paying a 404 round-trip on Gen 1
+plugs. Callers seed it from and persist it to Device.api_generation.
+"""
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+DEVICE_TIMEOUT = float(os.getenv("DEVICE_TIMEOUT", "5"))
+# host pools kept (one per plug), and idle connections kept per host
+DEVICE_POOL_HOSTS = int(os.getenv("DEVICE_POOL_HOSTS", "4096"))
+DEVICE_POOL_SIZE = int(os.getenv("DEVICE_POOL_SIZE", "64"))
+
+GEN1 = 1
+GEN2 = 2
+
+
+class DeviceClient:
+    def __init__(
+        self,
+        timeout=DEVICE_TIMEOUT,
+        pool_hosts=DEVICE_POOL_HOSTS,
+        pool_size=DEVICE_POOL_SIZE,
+    ):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, device_url):
+        """Detected API generation of a device, or None if not known yet."""
+        return self._generations.get(device_url)
+
+    def remember(self, device_url, generation):
+        """Seed a known generation (e.g. Device.api_generation); None is ignored."""
+        if generation is not None:
+            with self._lock:
+                self._generations.setdefault(device_url, generation)
+
+    def _learn(self, device_url, generation):
+        with self._lock:
+            if generation is None:
+                self._generations.pop(device_url, None)
+            else:
+                self._generations[device_url] = generation
+
+    def _gen2_power(self, device_url, timeout):
+        """(HTTP status, watts) from the Gen 2 RPC status."""
+        resp = self.session.get(f"{device_url}/rpc/Shelly.GetStatus", timeout=timeout)
+        if resp.status_code != 200:
+            return resp.status_code, None
+        return 200, resp.json().get("switch:0", {}).get("apower", 0.0)
+
+    def _gen1_power(self, device_url, timeout):
+        """(HTTP status, watts) from the Gen 1 REST status."""
+        resp = self.session.get(f"{device_url}/status", timeout=timeout)
+        if resp.status_code != 200:
+            return resp.status_code, None
+        return 200, resp.json().get("meters", [{}])[0].get("power", 0.0)
+
+    def get_power(self, device_url, generation=None, timeout=None):
+        """
+        Current power in watts, None if the device answered without a reading.
+        Raises requests.exceptions.RequestException on network errors.
+        """
+        timeout = timeout or self.timeout
+        self.remember(device_url, generation)
+        if self.generation(device_url) == GEN1:
+            status, power = self._gen1_power(device_url, timeout)
+            if status != 404:
+                return power
+            self._learn(device_url, None)  # replaced by a Gen 2 plug, detect again
+
+        status, power = self._gen2_power(device_url, timeout)
+        if status == 200:
+            self._learn(device_url, GEN2)
+            return power
+        if status == 404:
+            status, power = self._gen1_power(device_url, timeout)
+            if status == 200:
+                self._learn(device_url, GEN1)
+                return power
+        return None
+
+    def _gen2_switch(self, device_url, turn_on, timeout):
+        return self.session.post(
+            f"{device_url}/rpc/Switch.Set",
+            json={"id": 0, "on": turn_on},
+            timeout=timeout,
+        ).status_code
+
+    def _gen1_switch(self, device_url, turn_on, timeout):
+        return self.session.get(
+            f"{device_url}/relay/0",
+            params={"turn": "on" if turn_on else "off"},
+            timeout=timeout,
+        ).status_code
+
+    def set_switch(self, device_url, turn_on, generation=None, timeout=None):
+        """Turn the relay on/off; True on success. Raises on network errors."""
+        timeout = timeout or self.timeout
+        self.remember(device_url, generation)
+        if self.generation(device_url) == GEN1:
+            status = self._gen1_switch(device_url, turn_on, timeout)
+            if status != 404:
+                return status == 200
+            self._learn(device_url, None)
+
+        status = self._gen2_switch(device_url, turn_on, timeout)
+        if status == 200:
+            self._learn(device_url, GEN2)
+            return True
+        if status == 404 and self._gen1_switch(device_url, turn_on, timeout) == 200:
+            self._learn(device_url, GEN1)
+            return True
+        return False
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_device_client():
+    """Process-wide client, so every caller shares the connection pools."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DeviceClient()
+        return _client
@@ -0,0 +1,235 @@
+"""
+Energy (Wh) integration and cost estimation.
+
+Each time an hour closes, the data processor integrates the readings stored
+since every device's counter into its running totals (EnergyCounter): Wh and
+cost since metering started. Integration is a zero-order hold on the actual
+reading times, so variable sample intervals are handled: a reading counts
+until the next one if that arrives within ENERGY_MAX_GAP seconds, otherwise
+(the device went OFF, which stores no reading, or was unreachable) for one
+SAMPLE_INTERVAL only. Energy is split at hour boundaries and priced with the
+time-of-use tariff of each hour.
+
+At the end of every hour in which a device used energy, its totals are
+stored in EnergySnapshot. The kWh and cost of any period between hour
+boundaries is then the difference of two snapshots (energy_between()),
+instead of a scan over the readings.
+
+Tariffs: ENERGY_TARIFFS is a list of hour-of-day bands with a price per kWh,
+e.g. "0-7:0.45,7-17:0.62,17-23:0.71,23-24:0.45"; hours not covered cost
+ENERGY_PRICE.
+"""
+import os
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, func, and_
+
+from device_data_collector.db import db
+from device_data_collector.ingest import SAMPLE_INTERVAL
+from device_data_collector.models import (
+    Device,
+    EnergyCounter,
+    EnergySnapshot,
+    MinutelyConsumption,
+)
+
+logger = logging.getLogger(__name__)
+
+ENERGY_PRICE = float(os.getenv("ENERGY_PRICE", "0.6"))
+ENERGY_TARIFFS = os.getenv("ENERGY_TARIFFS", "")
+# readings further apart than this are not bridged
+ENERGY_MAX_GAP = float(os.getenv("ENERGY_MAX_GAP", str(SAMPLE_INTERVAL * 1.5)))
+ENERGY_DEVICE_BATCH = 500
+
+HOUR = timedelta(hours=1)
+
+
+def parse_tariffs(spec, default=ENERGY_PRICE):
+    """Price per kWh for each hour of the day (list of 24) from "start-end:price,..."."""
+    prices = [default] * 24
+    for band in filter(None, (part.strip() for part in spec.split(","))):
+        hours, price = band.split(":")
+        start, end = (int(hour) for hour in hours.split("-"))
+        if not 0 <= start < end <= 24:
+            raise ValueError(f"Invalid tariff hours {hours!r}")
+        for hour in range(start, end):
+            prices[hour] = float(price)
+    return prices
+
+
+TARIFF_PRICES = parse_tariffs(ENERGY_TARIFFS)
+
+
+class EnergyIntegrator:
+    """Integrates one device's readings into its counter (an EnergyCounter row)."""
+
+    def __init__(self, prices=None, interval=SAMPLE_INTERVAL, max_gap=ENERGY_MAX_GAP):
+        self.prices = prices or TARIFF_PRICES
+        self.hold = timedelta(seconds=interval)
+        self.max_gap = timedelta(seconds=max_gap)
+
+    def _accrue(self, counter, start, end, snapshots):
+        """Count counter.last_power over [start, end), hour by hour."""
+        while start < end:
+            hour = start.replace(minute=0, second=0, microsecond=0)
+            stop = min(end, hour + HOUR)
+            wh = counter.last_power * (stop - start).total_seconds() / 3600.0
+            counter.total_wh += wh
+            counter.total_cost += wh / 1000.0 * self.prices[hour.hour]
+            snapshots[hour + HOUR] = (counter.total_wh, counter.total_cost)
+            start = stop
+
+    def _close_reading(self, counter, end, snapshots):
+        """Count the last reading up to end (its hold is cut at end)."""
+        if counter.last_time is None:
+            return
+        start = max(counter.accrued_until, counter.last_time)
+        if end > start:
+            self._accrue(counter, start, end, snapshots)
+            counter.accrued_until = end
+
+    def integrate(self, counter, readings, boundary):
+        """
+        Add time-ordered (time, watts) readings after counter.accrued_until
+        and up to boundary. Returns {hour boundary: (total Wh, total cost)}
+        for the hours that gained energy.
+        """
+        snapshots = {}
+        for when, power in readings:
+            if counter.last_time is not None:
+                if when - counter.last_time <= self.max_gap:
+                    self._close_reading(counter, when, snapshots)
+                else:
+                    self._close_reading(
+                        counter, counter.last_time + self.hold, snapshots
+                    )
+            counter.last_time, counter.last_power = when, power
+            counter.accrued_until = when
+        # the last reading holds at least one interval up to the boundary; the
+        # rest of its hold (if the next reading follows soon enough) is counted
+        # on the next run, so closed hours are never reopened
+        if counter.last_time is not None:
+            self._close_reading(
+                counter, min(boundary, counter.last_time + self.hold), snapshots
+            )
+        counter.accrued_until = max(counter.accrued_until or boundary, boundary)
+        return snapshots
+
+
+def _new_counter(device_id):
+    return EnergyCounter(device_id=device_id, total_wh=0.0, total_cost=0.0)
+
+
+def integrate_energy(now=None, integrator=None):
+    """
+    Hourly step of the data processor: integrate the readings up to the
+    start of the current hour into the device counters and snapshots, one
+    transaction per ENERGY_DEVICE_BATCH devices.
+    """
+    integrator = integrator or EnergyIntegrator()
+    hour_start = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+    try:
+        with db.get_session() as session:
+            device_ids = session.scalars(
+                select(Device.device_id).order_by(Device.device_id)
+            ).all()
+        snapshot_count = 0
+        for offset in range(0, len(device_ids), ENERGY_DEVICE_BATCH):
+            batch = device_ids[offset : offset + ENERGY_DEVICE_BATCH]
+            with db.get_session() as session:
+                snapshot_count += _integrate_batch(
+                    session, integrator, batch, hour_start
+                )
+        if snapshot_count:
+            logger.info(f"Energy integration done ({snapshot_count} device-hours).")
+    except Exception as e:
+        logger.error(f"Error in energy integration: {str(e)}")
+        raise
+
+
+def _integrate_batch(session, integrator, device_ids, boundary):
+    counters = {
+        counter.device_id: counter
+        for counter in session.scalars(
+            select(EnergyCounter).where(EnergyCounter.device_id.in_(device_ids))
+        )
+    }
+    for device_id in device_ids:
+        if device_id not in counters:
+            counters[device_id] = _new_counter(device_id)
+            session.add(counters[device_id])
+
+    query = select(
+        MinutelyConsumption.device_id,
+        MinutelyConsumption.time,
+        MinutelyConsumption.power_consumption,
+    ).where(
+        MinutelyConsumption.device_id.in_(device_ids),
+        MinutelyConsumption.time <= boundary,
+    )
+    scanned = [c.accrued_until for c in counters.values() if c.accrued_until]
+    if len(scanned) == len(device_ids):
+        query = query.where(MinutelyConsumption.time > min(scanned))
+    readings = {}
+    for device_id, when, power in session.execute(
+        query.order_by(MinutelyConsumption.device_id, MinutelyConsumption.time)
+    ):
+        accrued_until = counters[device_id].accrued_until
+        if accrued_until is None or when > accrued_until:
+            readings.setdefault(device_id, []).append((when, power))
+
+    snapshots = []
+    for device_id, counter in counters.items():
+        for time, (total_wh, total_cost) in integrator.integrate(
+            counter, readings.get(device_id, ()), boundary
+        ).items():
+            snapshots.append(
+                {
+                    "device_id": device_id,
+                    "time": time,
+                    "total_wh": total_wh,
+                    "total_cost": total_cost,
+                }
+            )
+    if snapshots:
+        session.execute(insert(EnergySnapshot), snapshots)
+    return len(snapshots)
+
+
+def totals_at(session, device_ids, when):
+    """{device_id: (Wh, cost)} used before `when` (an hour boundary)."""
+    latest = (
+        select(EnergySnapshot.device_id, func.max(EnergySnapshot.time).label("time"))
+        .where(EnergySnapshot.device_id.in_(device_ids), EnergySnapshot.time <= when)
+        .group_by(EnergySnapshot.device_id)
+        .subquery()
+    )
+    rows = session.execute(
+        select(
+            EnergySnapshot.device_id, EnergySnapshot.total_wh, EnergySnapshot.total_cost
+        ).join(
+            latest,
+            and_(
+                EnergySnapshot.device_id == latest.c.device_id,
+                EnergySnapshot.time == latest.c.time,
+            ),
+        )
+    )
+    return {device_id: (total_wh, total_cost) for device_id, total_wh, total_cost in rows}
+
+
+def energy_between(session, device_ids, start, end):
+    """
+    {device_id: (kWh, cost)} used in [start, end), both rounded down to the
+    hour, from two snapshot lookups per device.
+    """
+    start = start.replace(minute=0, second=0, microsecond=0)
+    end = end.replace(minute=0, second=0, microsecond=0)
+    before = totals_at(session, device_ids, start)
+    after = totals_at(session, device_ids, end)
+    result = {}
+    for device_id in device_ids:
+        wh_start, cost_start = before.get(device_id, (0.0, 0.0))
+        wh_end, cost_end = after.get(device_id, (wh_start, cost_start))
+        result[device_id] = ((wh_end - wh_start) / 1000.0, cost_end - cost_start)
+    return result
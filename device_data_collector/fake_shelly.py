@@ -0,0 +1,186 @@
+"""
+Local fake Shelly HTTP server for exercising the collector without hardware.
+
+One server simulates many plugs. Device N lives under the path prefix /N, so
+its device_url is e.g. http://127.0.0.1:8099/17 and the collector hits
+/17/rpc/Shelly.GetStatus (Gen 2) or /17/status (Gen 1) exactly like a real plug.
+
+    python -m device_data_collector.fake_shelly --devices 5000 --latency 0.2
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _FakeShellyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes; with Nagle on, each reply on a
+    # keep-alive connection waits for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        parsed = urlparse(self.path)
+        parts = parsed.path.strip("/").split("/", 1)
+        try:
+            device_no = int(parts[0])
+        except ValueError:
+            return None, None, None
+        rest = "/" + parts[1] if len(parts) > 1 else "/"
+        return device_no, rest, parse_qs(parsed.query)
+
+    def _handle(self):
+        fake = self.server.fake
+        device_no, rest, query = self._route()
+        if device_no is None or not 0 <= device_no < fake.num_devices:
+            self._send_json(404, {"error": "no such device"})
+            return
+
+        fake.count_request(rest)
+        if device_no in fake.unreachable:
+            time.sleep(fake.hang)
+            self.close_connection = True
+            return
+        if fake.latency:
+            time.sleep(fake.latency + random.uniform(0, fake.jitter))
+
+        gen1 = fake.is_gen1(device_no)
+        if self.command == "POST" and self.headers.get("Content-Length"):
+            self.rfile.read(int(self.headers["Content-Length"]))
+
+        if rest == "/rpc/Shelly.GetStatus" and not gen1:
+            self._send_json(
+                200, {"switch:0": {"apower": fake.power(device_no), "output": True}}
+            )
+        elif rest == "/rpc/Switch.Set" and not gen1:
+            self._send_json(200, {"was_on": True})
+        elif rest == "/status" and gen1:
+            self._send_json(200, {"meters": [{"power": fake.power(device_no)}]})
+        elif rest == "/relay/0" and gen1:
+            turn = query.get("turn", ["on"])[0]
+            self._send_json(200, {"ison": turn == "on"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class _CountingHTTPServer(ThreadingHTTPServer):
+    def process_request(self, request, client_address):
+        self.fake.count_connection()
+        super().process_request(request, client_address)
+
+
+class FakeShellyServer:
+    """
+    Threaded HTTP server answering for num_devices plugs.
+    latency/jitter: seconds added to every reply.
+    gen1_ratio: fraction of devices that only speak the Gen 1 API.
+    unreachable: device numbers that hang for `hang` seconds and never reply.
+    requests_by_path and connections count the requests and the TCP
+    connections accepted, e.g. to check keep-alive reuse.
+    """
+
+    def __init__(
+        self,
+        num_devices=1000,
+        latency=0.0,
+        jitter=0.0,
+        gen1_ratio=0.0,
+        unreachable=(),
+        hang=30.0,
+        host="127.0.0.1",
+        port=0,
+    ):
+        self.num_devices = num_devices
+        self.latency = latency
+        self.jitter = jitter
+        self.gen1_ratio = gen1_ratio
+        self.unreachable = set(unreachable)
+        self.hang = hang
+        self.requests_by_path = {}
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        _CountingHTTPServer.request_queue_size = 4096
+        self.httpd = _CountingHTTPServer((host, port), _FakeShellyHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def device_url(self, device_no):
+        return f"{self.base_url}/{device_no}"
+
+    def is_gen1(self, device_no):
+        return (device_no * 7919) % 1000 < self.gen1_ratio * 1000
+
+    def power(self, device_no):
+        return round(5 + (device_no % 200) + random.random(), 3)
+
+    def count_request(self, path):
+        with self._lock:
+            self.requests_by_path[path] = self.requests_by_path.get(path, 0) + 1
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Shelly plug farm")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--gen1-ratio", type=float, default=0.0)
+    parser.add_argument("--unreachable", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    server = FakeShellyServer(
+        num_devices=args.devices,
+        latency=args.latency,
+        jitter=args.jitter,
+        gen1_ratio=args.gen1_ratio,
+        unreachable=range(args.unreachable),
+        port=args.port,
+    )
+    print(f"Fake Shelly farm with {args.devices} devices on {server.base_url}/<n>")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
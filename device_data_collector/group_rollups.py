@@ -0,0 +1,140 @@
+"""
+Room, profile and user rollups on top of the device rollups.
+
+Whenever the data processor (or a backfill) writes device rows for some
+buckets, refresh_group_rollups() recomputes the group_consumptions rows of
+exactly those buckets: one INSERT ... SELECT ... GROUP BY per scope, summing
+the device averages (and hourly energy) over the current room -> profile ->
+user hierarchy. A dashboard then reads one row per room, profile or user and
+bucket, however many devices it has. Buckets are only recomputed when their
+device rows change, so moving a device to another room affects the buckets
+rolled up from then on.
+"""
+from datetime import datetime, date
+from sqlalchemy import select, insert, delete, func, literal, null
+
+from device_data_collector.models import (
+    Room,
+    Device,
+    Profile,
+    GroupConsumption,
+    HourlyConsumption,
+    DeviceDailyConsumption,
+    DeviceWeeklyConsumption,
+)
+
+# level -> (device model, bucket column, value column, energy column or None)
+DEVICE_LEVELS = {
+    "hourly": (
+        HourlyConsumption,
+        HourlyConsumption.time,
+        HourlyConsumption.power_consumption,
+        HourlyConsumption.energy_wh,
+    ),
+    "daily": (
+        DeviceDailyConsumption,
+        DeviceDailyConsumption.date,
+        DeviceDailyConsumption.daily_average,
+        None,
+    ),
+    "weekly": (
+        DeviceWeeklyConsumption,
+        DeviceWeeklyConsumption.date,
+        DeviceWeeklyConsumption.weekly_average,
+        None,
+    ),
+}
+
+SCOPES = {
+    "room": Room.room_id,
+    "profile": Room.profile_id,
+    "user": Profile.user_id,
+}
+
+
+def _as_datetime(value):
+    """Bucket start as a datetime (daily buckets are dates)."""
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.min.time())
+
+
+def _bucket(session, column, buckets):
+    """
+    (bucket expression, condition selecting `buckets`) for a DATE/DATETIME
+    column. The condition compares the bare column, so its time index is used.
+    SQLite keeps text: the selected bucket is written in SQLAlchemy's DATETIME
+    storage format there, so date buckets read back as datetimes.
+    """
+    if column.type.python_type is date:
+        buckets = [value.date() for value in buckets]
+    if session.get_bind().dialect.name == "sqlite":
+        bucket = func.strftime("%Y-%m-%d %H:%M:%S.000000", column)
+        return bucket, column.in_(buckets)
+    return column, column.in_(buckets)
+
+
+def new_buckets(session, level, after_id):
+    """Distinct buckets of the `level` device rows with consumption_id > after_id."""
+    model, time_col, _, _ = DEVICE_LEVELS[level]
+    return [
+        bucket
+        for (bucket,) in session.execute(
+            select(time_col).where(model.consumption_id > after_id).distinct()
+        )
+    ]
+
+
+def last_row_id(session, level):
+    model = DEVICE_LEVELS[level][0]
+    return session.scalar(select(func.max(model.consumption_id))) or 0
+
+
+def refresh_group_rollups(session, level, buckets):
+    """Recompute the room/profile/user rows of `level` for the given buckets."""
+    buckets = sorted({_as_datetime(bucket) for bucket in buckets})
+    if not buckets:
+        return 0
+    model, time_col, value_col, energy_col = DEVICE_LEVELS[level]
+    bucket, selected = _bucket(session, time_col, buckets)
+
+    session.execute(
+        delete(GroupConsumption).where(
+            GroupConsumption.level == level, GroupConsumption.bucket.in_(buckets)
+        )
+    )
+    written = 0
+    for scope, scope_col in SCOPES.items():
+        source = (
+            select(
+                literal(scope),
+                scope_col,
+                literal(level),
+                bucket,
+                func.sum(value_col),
+                func.sum(energy_col) if energy_col is not None else null(),
+                func.count(),
+            )
+            .select_from(model)
+            .join(Device, Device.device_id == model.device_id)
+            .join(Room, Room.room_id == Device.room_id)
+            .join(Profile, Profile.profile_id == Room.profile_id)
+            .where(selected)
+            .group_by(scope_col, bucket)
+        )
+        written += session.execute(
+            insert(GroupConsumption).from_select(
+                [
+                    "scope",
+                    "scope_id",
+                    "level",
+                    "bucket",
+                    "power_consumption",
+                    "energy_wh",
+                    "device_count",
+                ],
+                source,
+            )
+        ).rowcount
+    return written
+
@@ -0,0 +1,80 @@
+import os
+import logging
+from sqlalchemy import insert, update, case
+
+from device_data_collector.models import Device, MinutelyConsumption
+
+logger = logging.getLogger(__name__)
+
+INGEST_FLUSH_SIZE = int(os.getenv("INGEST_FLUSH_SIZE", "5000"))
+
+# readings at or below this many watts are not stored; the device counts as OFF
+ON_THRESHOLD_W = 1.0
+
+# seconds between sweeps; each stored reading stands for this much energy
+SAMPLE_INTERVAL = float(os.getenv("SAMPLE_INTERVAL", "60"))
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def insert_readings(session, rows, flush_size=INGEST_FLUSH_SIZE):
+    """
+    Bulk insert minutely readings (dicts with device_id, power_consumption, time).
+    One executemany per flush_size rows instead of one INSERT per device.
+    """
+    for chunk in _chunks(rows, flush_size):
+        session.execute(insert(MinutelyConsumption), chunk)
+
+
+def update_statuses(session, changes, flush_size=INGEST_FLUSH_SIZE):
+    """
+    Apply Device.status transitions ({device_id: "ON"/"OFF"}) with a single
+    UPDATE ... CASE per flush_size devices.
+    """
+    items = list(changes.items())
+    for chunk in _chunks(items, flush_size):
+        on_ids = [device_id for device_id, status in chunk if status == "ON"]
+        session.execute(
+            update(Device)
+            .where(Device.device_id.in_([device_id for device_id, _ in chunk]))
+            .values(status=case((Device.device_id.in_(on_ids), "ON"), else_="OFF"))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def update_generations(session, generations, flush_size=INGEST_FLUSH_SIZE):
+    """
+    Persist newly detected Device.api_generation values ({device_id: 1 or 2}),
+    one UPDATE per generation and flush_size devices.
+    """
+    by_generation = {}
+    for device_id, generation in generations.items():
+        by_generation.setdefault(generation, []).append(device_id)
+    for generation, device_ids in by_generation.items():
+        for chunk in _chunks(device_ids, flush_size):
+            session.execute(
+                update(Device)
+                .where(Device.device_id.in_(chunk))
+                .values(api_generation=generation)
+                .execution_options(synchronize_session=False)
+            )
+
+
+def write_sweep(
+    session, rows, status_changes, generations=None, flush_size=INGEST_FLUSH_SIZE
+):
+    """
+    Persist one sweep: the readings, the status transitions and any newly
+    detected API generations.
+    Round-trips depend on flush_size, not on the number of devices.
+    The caller's session commits once for the whole sweep.
+    """
+    insert_readings(session, rows, flush_size)
+    update_statuses(session, status_changes, flush_size)
+    update_generations(session, generations or {}, flush_size)
+    logger.debug(
+        f"Wrote {len(rows)} readings and {len(status_changes)} status changes"
+    )
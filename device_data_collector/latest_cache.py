@@ -0,0 +1,243 @@
+"""
+Latest-reading cache shared by the collector and the web app.
+
+The collector publishes every device that answered after each sweep (OFF
+devices as 0 W); the web app reads from here and only queries the database for
+devices that are missing or older than LATEST_CACHE_TTL seconds.
+
+Backends (LATEST_CACHE_BACKEND):
+  mmap   - fixed-slot file, slot = device_id, readable by any local process
+           without a round-trip (default)
+  socket - the collector keeps a dict and serves it over a local UNIX socket
+  none   - disabled, always use the database
+"""
+import os
+import mmap
+import time
+import struct
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+from device_data_collector import local_ipc
+from device_data_collector.ingest import ON_THRESHOLD_W
+
+logger = logging.getLogger(__name__)
+
+LATEST_CACHE_BACKEND = os.getenv("LATEST_CACHE_BACKEND", "mmap")
+LATEST_CACHE_PATH = os.getenv(
+    "LATEST_CACHE_PATH", os.path.join(tempfile.gettempdir(), "intelergy-latest.bin")
+)
+LATEST_CACHE_SOCKET = os.getenv(
+    "LATEST_CACHE_SOCKET", os.path.join(tempfile.gettempdir(), "intelergy.sock")
+)
+LATEST_CACHE_SLOTS = int(os.getenv("LATEST_CACHE_SLOTS", "65536"))
+LATEST_CACHE_TTL = float(os.getenv("LATEST_CACHE_TTL", "180"))
+
+_HEADER = struct.Struct("<4sIQ")  # magic, slot count, publish sequence
+_SLOT = struct.Struct("<Q2d")  # per-slot seqlock counter, power, epoch seconds
+_MAGIC = b"ILC1"
+
+
+class LatestCache:
+    """Interface: publish a sweep, read fresh entries back."""
+
+    def __init__(self, ttl=LATEST_CACHE_TTL):
+        self.ttl = ttl
+
+    def publish(self, readings, when):
+        """readings: {device_id: watts} stored for the sweep at `when`."""
+        raise NotImplementedError
+
+    def _lookup(self, device_ids):
+        """{device_id: (watts, epoch seconds)} for the ids present."""
+        raise NotImplementedError
+
+    def get_many(self, device_ids, now=None):
+        """{device_id: (watts, datetime)} for ids with an entry newer than the TTL."""
+        now = now or time.time()
+        try:
+            found = self._lookup(device_ids)
+        except Exception as e:
+            logger.debug(f"Latest cache unavailable: {e}")
+            return {}
+        return {
+            device_id: (power, datetime.fromtimestamp(stamp))
+            for device_id, (power, stamp) in found.items()
+            if now - stamp <= self.ttl
+        }
+
+    def get(self, device_id, now=None):
+        return self.get_many([device_id], now).get(device_id)
+
+    def sequence(self):
+        """Counter bumped per published sweep, or None if the backend has none."""
+        return None
+
+    def available(self):
+        """False when no collector can publish here (disabled, or not on this host)."""
+        return True
+
+
+class MmapLatestCache(LatestCache):
+    """
+    One fixed-size file, mapped by every process. Slot i holds device_id i;
+    writes use a per-slot seqlock so readers never see a torn (power, time) pair.
+    """
+
+    def __init__(self, path=LATEST_CACHE_PATH, slots=LATEST_CACHE_SLOTS, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.slots = slots
+        self._map = None
+
+    def _open(self, create):
+        """Writer (create=True) sizes the file; readers map it read-only once it exists."""
+        if self._map is not None:
+            return self._map
+        size = _HEADER.size + self.slots * _SLOT.size
+        if create:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        elif os.path.exists(self.path):
+            fd = os.open(self.path, os.O_RDONLY)
+        else:
+            return None
+        try:
+            if create and os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, self.slots, 0), 0)
+            access = mmap.ACCESS_WRITE if create else mmap.ACCESS_READ
+            table = mmap.mmap(fd, size, access=access)
+        finally:
+            os.close(fd)
+        magic, slots, _ = _HEADER.unpack_from(table, 0)
+        if magic != _MAGIC or slots != self.slots:
+            table.close()
+            raise ValueError(f"{self.path} is not a latest-reading cache file")
+        self._map = table
+        return table
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def sequence(self):
+        """Bumped once per published sweep; cheap change detection for readers."""
+        table = self._open(create=False)
+        return _HEADER.unpack_from(table, 0)[2] if table is not None else 0
+
+    def publish(self, readings, when):
+        table = self._open(create=True)
+        stamp = when.timestamp()
+        for device_id, power in readings.items():
+            if not 0 <= device_id < self.slots:
+                continue
+            offset = _HEADER.size + device_id * _SLOT.size
+            seq = _SLOT.unpack_from(table, offset)[0]
+            struct.pack_into("<Q", table, offset, seq + 1)
+            _SLOT.pack_into(table, offset, seq + 1, power, stamp)
+            struct.pack_into("<Q", table, offset, seq + 2)
+        _, slots, sequence = _HEADER.unpack_from(table, 0)
+        _HEADER.pack_into(table, 0, _MAGIC, slots, sequence + 1)
+
+    def _lookup(self, device_ids):
+        table = self._open(create=False)
+        if table is None:
+            return {}
+        found = {}
+        for device_id in device_ids:
+            if not 0 <= device_id < self.slots:
+                continue
+            offset = _HEADER.size + device_id * _SLOT.size
+            for _ in range(3):
+                before, power, stamp = _SLOT.unpack_from(table, offset)
+                after = struct.unpack_from("<Q", table, offset)[0]
+                if before == after and not before % 2:
+                    break
+            else:
+                continue
+            if stamp:
+                found[device_id] = (power, stamp)
+        return found
+
+
+class SocketLatestCache(LatestCache):
+    """
+    Collector side keeps the entries in a dict and serves them (serve());
+    web workers query it over the local socket.
+    """
+
+    def __init__(self, path=LATEST_CACHE_SOCKET, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def serve(self):
+        local_ipc.get_server(self.path).register("latest.get", self._serve_get)
+        return self
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def _serve_get(self, device_ids):
+        with self._lock:
+            return {
+                str(device_id): self._entries[device_id]
+                for device_id in device_ids
+                if device_id in self._entries
+            }
+
+    def publish(self, readings, when):
+        stamp = when.timestamp()
+        with self._lock:
+            for device_id, power in readings.items():
+                self._entries[device_id] = (power, stamp)
+
+    def _lookup(self, device_ids):
+        result = local_ipc.call(self.path, "latest.get", device_ids=list(device_ids))
+        return {int(device_id): tuple(entry) for device_id, entry in result.items()}
+
+
+class NullLatestCache(LatestCache):
+    def publish(self, readings, when):
+        pass
+
+    def available(self):
+        return False
+
+    def _lookup(self, device_ids):
+        return {}
+
+
+_cache = None
+
+
+def get_latest_cache():
+    """Process-wide cache for the configured backend."""
+    global _cache
+    if _cache is None:
+        if LATEST_CACHE_BACKEND == "mmap":
+            _cache = MmapLatestCache()
+        elif LATEST_CACHE_BACKEND == "socket":
+            _cache = SocketLatestCache()
+        else:
+            _cache = NullLatestCache()
+    return _cache
+
+
+def publish_sweep(sweep_time, readings):
+    """
+    Sweep listener: publish every device that answered, OFF devices (at or
+    below ON_THRESHOLD_W, not stored in the database) as 0 W, so that readers
+    find them without a database query. Unreachable devices are not
+    published; their entry ages out after the TTL.
+    """
+    get_latest_cache().publish(
+        {
+            device_id: power if power > ON_THRESHOLD_W else 0.0
+            for device_id, power in readings.items()
+            if power is not None
+        },
+        sweep_time,
+    )
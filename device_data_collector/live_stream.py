@@ -0,0 +1,173 @@
+"""
+Fan-out of live readings to Server-Sent Events connections.
+
+A single PowerBroadcaster thread per web process watches the latest-reading
+cache (the mmap backend exposes a sweep sequence number, so an idle check is a
+16-byte read) and, when the collector publishes a sweep, reads the readings of
+all subscribed devices once and hands each subscriber only its own devices.
+1,000 open dashboards therefore cost one upstream read per sweep, not 1,000.
+
+The collector publishes OFF devices as 0 W, so room totals drop when a device
+is switched off; a device unreachable for longer than the cache TTL is sent
+with power null and no longer counted.
+
+Each connection holds a small bounded queue; a slow client loses intermediate
+updates (oldest dropped) instead of growing memory. Serving many idle SSE
+connections needs an async-capable WSGI worker (gevent/eventlet); the Flask
+dev server spends one thread per connection.
+"""
+import json
+import time
+import queue
+import logging
+import threading
+
+from device_data_collector.latest_cache import get_latest_cache
+
+logger = logging.getLogger(__name__)
+
+STREAM_POLL_INTERVAL = 1.0
+STREAM_QUEUE_SIZE = 8
+
+
+class Subscription:
+    """One SSE connection: device_id -> room_id mapping plus its pending updates."""
+
+    __slots__ = ("rooms", "values", "queue")
+
+    def __init__(self, rooms):
+        self.rooms = rooms
+        self.values = {}
+        self.queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    def offer(self, readings):
+        """
+        Queue the readings ({device_id: (watts, datetime) or None if expired})
+        that concern this subscriber, dropping the oldest update if full.
+        """
+        # a sweep usually holds far more devices than one dashboard shows
+        mine = {
+            device_id: readings[device_id]
+            for device_id in self.rooms
+            if device_id in readings
+        }
+        if not mine:
+            return
+        devices = {}
+        for device_id, reading in mine.items():
+            if reading is None:
+                # expired: no longer counted in the room totals
+                self.values.pop(device_id, None)
+                devices[device_id] = {"power": None, "last_updated": None}
+            else:
+                power, stamp = self.values[device_id] = reading
+                devices[device_id] = {"power": power, "last_updated": stamp.isoformat()}
+        totals = {room_id: 0.0 for room_id in set(self.rooms.values())}
+        for device_id, (power, _) in self.values.items():
+            totals[self.rooms[device_id]] += power
+        event = {"time_range": "minutely", "devices": devices, "rooms": totals}
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class PowerBroadcaster:
+    def __init__(self, cache=None, poll_interval=STREAM_POLL_INTERVAL):
+        self.cache = cache or get_latest_cache()
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_seen = {}
+
+    def subscribe(self, rooms):
+        """rooms: {device_id: room_id} of the devices the connection shows."""
+        subscription = Subscription(rooms)
+        # start from the current readings so the page is complete right away
+        subscription.offer(self.cache.get_many(list(rooms)))
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="power-broadcaster", daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def connections(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _changed_readings(self, device_ids):
+        """New readings since the last sweep; None for entries that expired since."""
+        readings = self.cache.get_many(device_ids)
+        changed = {
+            device_id: reading
+            for device_id, reading in readings.items()
+            if self._last_seen.get(device_id) != reading[1]
+        }
+        for device_id, (_, stamp) in changed.items():
+            self._last_seen[device_id] = stamp
+        for device_id in device_ids:
+            if device_id not in readings and device_id in self._last_seen:
+                del self._last_seen[device_id]
+                changed[device_id] = None
+        return changed
+
+    def _run(self):
+        last_sequence = None
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                sequence = self.cache.sequence()
+                if sequence is not None and sequence == last_sequence:
+                    continue
+                last_sequence = sequence
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                if not subscribers:
+                    continue
+                device_ids = set()
+                for subscription in subscribers:
+                    device_ids.update(subscription.rooms)
+                changed = self._changed_readings(list(device_ids))
+                if changed:
+                    for subscription in subscribers:
+                        subscription.offer(changed)
+            except Exception as e:
+                logger.error(f"Error broadcasting live readings: {str(e)}")
+
+    def stream(self, subscription, heartbeat=15.0):
+        """SSE body generator; unsubscribes when the client goes away."""
+        try:
+            while True:
+                try:
+                    event = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            _broadcaster = PowerBroadcaster()
+        return _broadcaster
@@ -0,0 +1,86 @@
+"""
+Minimal JSON-lines request/response protocol over a local UNIX socket.
+
+The collector process serves in-memory state (latest readings, recent history)
+to web workers on the same host. A request is one JSON object
+{"op": name, ...params} terminated by a newline, the response is one JSON
+line {"result": ...} or {"error": message}.
+"""
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+
+logger = logging.getLogger(__name__)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                handler = self.server.handlers[request.pop("op")]
+                response = {"result": handler(**request)}
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class LocalServer:
+    """Threaded UNIX socket server dispatching ops to handler functions."""
+
+    def __init__(self, path, handlers=None):
+        self.path = path
+        self.handlers = dict(handlers or {})
+        self._server = None
+
+    def register(self, op, handler):
+        self.handlers[op] = handler
+        if self._server is not None:
+            self._server.handlers = self.handlers
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, _Handler)
+        self._server.daemon_threads = True
+        self._server.handlers = self.handlers
+        threading.Thread(
+            target=self._server.serve_forever, name="local-ipc", daemon=True
+        ).start()
+        logger.info(f"Serving {sorted(self.handlers)} on {self.path}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+_servers = {}
+
+
+def get_server(path):
+    """Process-wide server for a socket path, so several features can share it."""
+    if path not in _servers:
+        _servers[path] = LocalServer(path).start()
+    return _servers[path]
+
+
+def call(path, op, timeout=0.5, **params):
+    """Send one request; raises (OSError, RuntimeError, ValueError) on failure."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(dict(params, op=op)).encode() + b"\n")
+        with sock.makefile("rb") as stream:
+            response = json.loads(stream.readline())
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response["result"]
@@ -0,0 +1,152 @@
+"""
+Versioned schema migrations.
+
+Each migration is (version, description, function(connection)). migrate()
+applies the ones newer than the highest version recorded in schema_version,
+in order, and records each one. Migrations must be idempotent (checkfirst /
+inspector checks) because version 1 creates missing tables straight from the
+current models.
+
+    python -m device_data_collector.migrations
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import select, func, insert, inspect, text
+
+from device_data_collector.db import db, Base
+from device_data_collector.models import SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+
+def _index(name):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"No index named {name} in the models")
+
+
+def _create_indexes(connection, *names):
+    for name in names:
+        _index(name).create(connection, checkfirst=True)
+
+
+def _v1_initial_schema(connection):
+    Base.metadata.create_all(connection)
+
+
+def _v2_consumption_indexes(connection):
+    _create_indexes(
+        connection,
+        "ix_minutely_device_time",
+        "ix_minutely_time",
+        "ix_hourly_device_time",
+        "ix_daily_device_date",
+        "ix_weekly_device_date",
+    )
+
+
+def _v3_time_range_indexes(connection):
+    _create_indexes(connection, "ix_hourly_time")
+
+
+def _v4_collector_leases(connection):
+    for name in ("collector_workers", "collector_leases"):
+        Base.metadata.tables[name].create(connection, checkfirst=True)
+
+
+def _add_column(connection, table, name):
+    """ALTER TABLE ... ADD COLUMN from the model's column definition, if missing."""
+    if name in {column["name"] for column in inspect(connection).get_columns(table)}:
+        return
+    column = Base.metadata.tables[table].columns[name]
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+
+
+def _v5_device_api_generation(connection):
+    _add_column(connection, "devices", "api_generation")
+
+
+def _v6_hourly_min_max_energy(connection):
+    for name in ("min_power", "max_power", "energy_wh"):
+        _add_column(connection, "hourly_consumptions", name)
+
+
+def _v7_group_consumptions(connection):
+    Base.metadata.tables["group_consumptions"].create(connection, checkfirst=True)
+    _create_indexes(
+        connection, "ix_group_level_bucket", "ix_daily_date", "ix_weekly_date"
+    )
+
+
+def _v8_energy_counters(connection):
+    for name in ("energy_counters", "energy_snapshots"):
+        Base.metadata.tables[name].create(connection, checkfirst=True)
+
+
+def _v9_sqlite_week_format(connection):
+    """SQLite: weekly rollups were stored without the microseconds ORM values have."""
+    if connection.dialect.name != "sqlite":
+        return
+    connection.execute(
+        text(
+            "UPDATE weekly_consumptions "
+            "SET date = strftime('%Y-%m-%d %H:%M:%S.000000', date) "
+            "WHERE length(date) = 19"
+        )
+    )
+
+
+def _v10_worker_spool_oldest(connection):
+    _add_column(connection, "collector_workers", "spool_oldest")
+
+
+MIGRATIONS = [
+    (1, "initial schema", _v1_initial_schema),
+    (2, "consumption (device_id, time) indexes", _v2_consumption_indexes),
+    (3, "hourly time index for watermark range scans", _v3_time_range_indexes),
+    (4, "collector workers and shard leases", _v4_collector_leases),
+    (5, "devices.api_generation", _v5_device_api_generation),
+    (6, "hourly min/max power and energy", _v6_hourly_min_max_energy),
+    (7, "room/profile/user rollups", _v7_group_consumptions),
+    (8, "energy counters and hourly snapshots", _v8_energy_counters),
+    (9, "SQLite weekly dates in DATETIME storage format", _v9_sqlite_week_format),
+    (10, "collector_workers.spool_oldest", _v10_worker_spool_oldest),
+]
+
+
+def current_version(connection):
+    SchemaVersion.__table__.create(connection, checkfirst=True)
+    return connection.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def migrate(target=None):
+    """Bring the schema up to `target` (default: latest). Returns the new version."""
+    try:
+        with db.engine.begin() as connection:
+            version = current_version(connection)
+        for number, description, apply in MIGRATIONS:
+            if number <= version or (target is not None and number > target):
+                continue
+            with db.engine.begin() as connection:
+                logger.info(f"Applying migration {number}: {description}")
+                apply(connection)
+                connection.execute(
+                    insert(SchemaVersion).values(
+                        version=number,
+                        description=description,
+                        applied_at=datetime.now(),
+                    )
+                )
+            version = number
+        return version
+    except Exception as e:
+        logger.error(f"Failed to migrate database schema: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Schema at version {migrate()}")
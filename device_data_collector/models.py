@@ -1,6 +1,7 @@
 from sqlalchemy import (
     Column,
     Integer,
+    SmallInteger,
     String,
     ForeignKey,
     Date,
@@ -8,6 +9,7 @@ from sqlalchemy import (
     Float,
     Boolean,
     Enum,
+    Index,
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -63,6 +65,8 @@ class Device(Base):
     device_url = Column(String(100), nullable=False)
     type = Column(String(50), nullable=False)
     status = Column(Enum("ON", "OFF"), default="OFF")
+    # Shelly API generation (1 or 2) detected by the device client, None = unknown
+    api_generation = Column(SmallInteger, nullable=True)
     room_id = Column(
         Integer, ForeignKey("rooms.room_id", ondelete="CASCADE"), nullable=False
     )
@@ -85,6 +89,10 @@ class Device(Base):
 
 class MinutelyConsumption(Base):
     __tablename__ = "minutely_consumptions"
+    __table_args__ = (
+        Index("ix_minutely_device_time", "device_id", "time", "power_consumption"),
+        Index("ix_minutely_time", "time"),
+    )
 
     consumption_id = Column(Integer, primary_key=True, autoincrement=True)
     device_id = Column(
@@ -98,20 +106,31 @@ class MinutelyConsumption(Base):
 
 class HourlyConsumption(Base):
     __tablename__ = "hourly_consumptions"
+    __table_args__ = (
+        Index("ix_hourly_device_time", "device_id", "time", "power_consumption"),
+        Index("ix_hourly_time", "time"),
+    )
 
     consumption_id = Column(Integer, primary_key=True, autoincrement=True)
     device_id = Column(
         Integer, ForeignKey("devices.device_id", ondelete="CASCADE"), nullable=False
     )
-    power_consumption = Column(Float, nullable=False)
+    power_consumption = Column(Float, nullable=False)  # mean of the stored readings
+    min_power = Column(Float, nullable=True)
+    max_power = Column(Float, nullable=True)
+    energy_wh = Column(Float, nullable=True)
     time = Column(DateTime, nullable=False)
-    aggregated = Column(Boolean, default=False, nullable=False)  # for daily
+    aggregated = Column(Boolean, default=False, nullable=False)  # legacy, see RollupWatermark
 
     device = relationship("Device", back_populates="hourly_consumptions")
 
 
 class DeviceDailyConsumption(Base):
     __tablename__ = "device_daily_consumptions"
+    __table_args__ = (
+        Index("ix_daily_device_date", "device_id", "date", "daily_average"),
+        Index("ix_daily_date", "date"),
+    )
 
     consumption_id = Column(Integer, primary_key=True, autoincrement=True)
     device_id = Column(
@@ -120,13 +139,17 @@ class DeviceDailyConsumption(Base):
     daily_average = Column(Float, nullable=False)
     date = Column(Date, nullable=False)
     status = Column(String(50), nullable=False, default="regular")
-    aggregated = Column(Boolean, default=False, nullable=False)  # for weekly
+    aggregated = Column(Boolean, default=False, nullable=False)  # legacy, see RollupWatermark
 
     device = relationship("Device", back_populates="daily_consumptions")
 
 
 class DeviceWeeklyConsumption(Base):
     __tablename__ = "weekly_consumptions"
+    __table_args__ = (
+        Index("ix_weekly_device_date", "device_id", "date", "weekly_average"),
+        Index("ix_weekly_date", "date"),
+    )
 
     consumption_id = Column(Integer, primary_key=True, autoincrement=True)
     device_id = Column(
@@ -138,3 +161,102 @@ class DeviceWeeklyConsumption(Base):
     aggregated = Column(Boolean, default=False, nullable=False)
 
     device = relationship("Device", back_populates="weekly_consumptions")
+
+
+class GroupConsumption(Base):
+    """
+    Consumption of a room, profile or user per closed bucket, maintained by the
+    data processor from the device rollups (see device_data_collector.group_rollups).
+    """
+
+    __tablename__ = "group_consumptions"
+    __table_args__ = (Index("ix_group_level_bucket", "level", "bucket"),)
+
+    scope = Column(String(10), primary_key=True)  # room / profile / user
+    scope_id = Column(Integer, primary_key=True, autoincrement=False)
+    level = Column(String(20), primary_key=True)  # hourly / daily / weekly
+    bucket = Column(DateTime, primary_key=True)  # start of the hour/day/week
+    power_consumption = Column(Float, nullable=False)  # sum of the device averages
+    energy_wh = Column(Float, nullable=True)  # hourly only
+    device_count = Column(Integer, nullable=False)
+
+
+class EnergyCounter(Base):
+    """
+    Running energy meter of one device, see device_data_collector.energy:
+    totals since metering started plus the integration state.
+    """
+
+    __tablename__ = "energy_counters"
+
+    device_id = Column(
+        Integer,
+        ForeignKey("devices.device_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    total_wh = Column(Float, nullable=False, default=0.0)
+    total_cost = Column(Float, nullable=False, default=0.0)
+    last_time = Column(DateTime, nullable=True)  # last reading integrated
+    last_power = Column(Float, nullable=True)
+    accrued_until = Column(DateTime, nullable=True)  # counted and scanned up to here
+
+
+class EnergySnapshot(Base):
+    """Device counter totals as of the end of an hour in which energy was used."""
+
+    __tablename__ = "energy_snapshots"
+
+    device_id = Column(
+        Integer,
+        ForeignKey("devices.device_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    time = Column(DateTime, primary_key=True)  # hour boundary, totals before it
+    total_wh = Column(Float, nullable=False)
+    total_cost = Column(Float, nullable=False)
+
+
+class RollupWatermark(Base):
+    """Per-device, per-level end of the last closed bucket rolled up (exclusive)."""
+
+    __tablename__ = "rollup_watermarks"
+
+    device_id = Column(
+        Integer,
+        ForeignKey("devices.device_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    level = Column(String(20), primary_key=True)  # hourly / daily / weekly
+    closed_through = Column(DateTime, nullable=False)
+
+
+class CollectorWorker(Base):
+    """Liveness of one sharded collector worker; sizes every worker's fair share."""
+
+    __tablename__ = "collector_workers"
+
+    worker_id = Column(String(100), primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False)
+    # oldest sweep still in the worker's spool (None: all flushed), so the
+    # rollups do not close buckets that will still receive readings
+    spool_oldest = Column(DateTime, nullable=True)
+
+
+class CollectorLease(Base):
+    """Ownership of one collector shard (device_id % shards), renewed by heartbeat."""
+
+    __tablename__ = "collector_leases"
+
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    owner = Column(String(100), nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
+
+class SchemaVersion(Base):
+    """One row per applied migration, see device_data_collector.migrations."""
+
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    description = Column(String(200), nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=datetime.now)
@@ -0,0 +1,207 @@
+"""
+Time-partitioned storage and retention for minutely_consumptions.
+
+On MySQL the table can be converted once (enable_partitioning) to daily
+RANGE partitions on TO_DAYS(time). Retention then drops whole expired
+partitions and maintain_partitions keeps PARTITION_AHEAD_DAYS empty partitions
+ready ahead of today, split off the catch-all pmax partition. Both run once a
+day from the data processor (run_partition_maintenance).
+
+MySQL does not allow foreign keys on partitioned tables, so the conversion
+drops the device_id foreign key; rows of deleted devices are still removed by
+the ORM cascade on Device and age out with their partition.
+
+SQLite (and unpartitioned MySQL) fall back to an indexed range DELETE on
+ix_minutely_time, batched on MySQL to keep lock times short.
+
+    python -m device_data_collector.partitions enable
+"""
+import os
+import sys
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import text, inspect, select, delete, func
+
+from device_data_collector.db import db
+from device_data_collector.models import MinutelyConsumption
+from device_data_collector.watermarks import watermark_floor
+
+logger = logging.getLogger(__name__)
+
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "7"))
+PARTITION_AHEAD_DAYS = int(os.getenv("PARTITION_AHEAD_DAYS", "3"))
+RETENTION_DELETE_BATCH = 50000
+
+TABLE = MinutelyConsumption.__tablename__
+
+
+def partition_name(day):
+    return f"p{day:%Y%m%d}"
+
+
+def _partition_day(name):
+    return datetime.strptime(name[1:], "%Y%m%d").date()
+
+
+def _partition_clause(day):
+    upper = day + timedelta(days=1)
+    return (
+        f"PARTITION {partition_name(day)} "
+        f"VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))"
+    )
+
+
+def list_partitions(connection):
+    """Names of the daily partitions of minutely_consumptions (empty if unpartitioned)."""
+    if connection.dialect.name != "mysql":
+        return []
+    rows = connection.execute(
+        text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+            "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+        ),
+        {"table": TABLE},
+    ).all()
+    return [row[0] for row in rows if row[0] != "pmax"]
+
+
+def enable_partitioning(today=None):
+    """One-off conversion of minutely_consumptions to daily RANGE partitions (MySQL only)."""
+    today = today or datetime.now().date()
+    try:
+        with db.engine.begin() as connection:
+            if connection.dialect.name != "mysql":
+                raise RuntimeError(
+                    "Partitioned storage needs MySQL; other backends use range deletes"
+                )
+            if list_partitions(connection):
+                logger.info(f"{TABLE} is already partitioned")
+                return
+
+            oldest = connection.execute(
+                select(func.min(MinutelyConsumption.time))
+            ).scalar()
+            first_day = max(
+                oldest.date() if oldest else today,
+                today - timedelta(days=RAW_RETENTION_DAYS),
+            )
+            days = [
+                first_day + timedelta(days=i)
+                for i in range((today - first_day).days + PARTITION_AHEAD_DAYS + 1)
+            ]
+
+            for foreign_key in inspect(connection).get_foreign_keys(TABLE):
+                connection.execute(
+                    text(f"ALTER TABLE {TABLE} DROP FOREIGN KEY {foreign_key['name']}")
+                )
+            connection.execute(
+                text(
+                    f"ALTER TABLE {TABLE} DROP PRIMARY KEY, "
+                    "ADD PRIMARY KEY (consumption_id, time)"
+                )
+            )
+            clauses = ", ".join(_partition_clause(day) for day in days)
+            connection.execute(
+                text(
+                    f"ALTER TABLE {TABLE} PARTITION BY RANGE (TO_DAYS(time)) "
+                    f"({clauses}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+                )
+            )
+            logger.info(f"Partitioned {TABLE} into {len(days)} daily partitions")
+    except Exception as e:
+        logger.error(f"Failed to partition {TABLE}: {e}")
+        raise
+
+
+def _add_future_partitions(connection, existing, today):
+    last = _partition_day(existing[-1]) if existing else today - timedelta(days=1)
+    missing = [
+        last + timedelta(days=i)
+        for i in range(1, (today - last).days + PARTITION_AHEAD_DAYS + 1)
+    ]
+    if missing:
+        clauses = ", ".join(_partition_clause(day) for day in missing)
+        connection.execute(
+            text(
+                f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO "
+                f"({clauses}, PARTITION pmax VALUES LESS THAN MAXVALUE)"
+            )
+        )
+        logger.info(f"Added {len(missing)} partitions to {TABLE}")
+
+
+def retention_cutoff(session, now=None):
+    """
+    Oldest moment raw readings must be kept from: RAW_RETENTION_DAYS ago, but
+    never past the hourly watermark of any device, so rows not rolled up yet survive.
+    """
+    now = now or datetime.now()
+    cutoff = (now - timedelta(days=RAW_RETENTION_DAYS)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    lagging = watermark_floor(session, "hourly")
+    if lagging is None:
+        return None
+    if lagging < cutoff:
+        cutoff = lagging.replace(hour=0, minute=0, second=0, microsecond=0)
+    return cutoff
+
+
+def maintain_partitions(now=None):
+    """Keep PARTITION_AHEAD_DAYS empty daily partitions ready (no-op when unpartitioned)."""
+    today = (now or datetime.now()).date()
+    with db.engine.begin() as connection:
+        partitions = list_partitions(connection)
+        if partitions:
+            _add_future_partitions(connection, partitions, today)
+
+
+def apply_retention(now=None):
+    """Drop raw readings older than the retention window (whole partitions when possible)."""
+    try:
+        with db.get_session() as session:
+            cutoff = retention_cutoff(session, now)
+            if cutoff is None:
+                return
+            connection = session.connection()
+            dialect = connection.dialect.name
+            partitions = list_partitions(connection)
+            if partitions:
+                expired = [p for p in partitions if _partition_day(p) < cutoff.date()]
+                if expired:
+                    connection.execute(
+                        text(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(expired)}")
+                    )
+                    logger.info(f"Dropped {len(expired)} expired partitions")
+                return
+
+            stmt = delete(MinutelyConsumption).where(MinutelyConsumption.time < cutoff)
+            if dialect == "mysql":
+                stmt = stmt.with_dialect_options(mysql_limit=RETENTION_DELETE_BATCH)
+            removed = 0
+            while True:
+                result = session.execute(stmt)
+                removed += result.rowcount
+                session.commit()
+                if dialect != "mysql" or result.rowcount < RETENTION_DELETE_BATCH:
+                    break
+            if removed:
+                logger.info(f"Deleted {removed} raw readings older than {cutoff}")
+    except Exception as e:
+        logger.error(f"Error applying raw data retention: {str(e)}")
+        raise
+
+
+def run_partition_maintenance(now=None):
+    """Daily job: drop expired raw data, then make sure upcoming partitions exist."""
+    apply_retention(now)
+    maintain_partitions(now)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] == ["enable"]:
+        enable_partitioning()
+    else:
+        run_partition_maintenance()
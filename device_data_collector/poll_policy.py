@@ -0,0 +1,198 @@
+"""
+Adaptive per-device polling for the collector.
+
+Healthy devices are polled every tick. A device that fails (error, timeout or
+missed sweep deadline) backs off exponentially: it is retried after 1, 2, 4,
+... sampling intervals, up to POLL_BACKOFF_MAX seconds. After
+POLL_BREAKER_FAILURES consecutive failures its circuit opens and it is only
+probed every POLL_PROBE_INTERVAL seconds with the short POLL_PROBE_TIMEOUT, so
+a dead plug stops costing a full timeout per sweep; the first answer closes
+the circuit again. Devices that have read OFF for POLL_IDLE_AFTER seconds are
+polled every POLL_IDLE_INTERVAL seconds until they turn on (or are switched on
+from the web app).
+
+Devices that are skipped on a tick get no reading and keep their status.
+The collector serves its per-device stats over the local socket ("poll.stats").
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+
+from device_data_collector import local_ipc
+from device_data_collector.ingest import ON_THRESHOLD_W
+from device_data_collector.latest_cache import LATEST_CACHE_SOCKET
+
+POLL_BACKOFF_MAX = float(os.getenv("POLL_BACKOFF_MAX", "900"))
+POLL_BREAKER_FAILURES = int(os.getenv("POLL_BREAKER_FAILURES", "5"))
+POLL_PROBE_INTERVAL = float(os.getenv("POLL_PROBE_INTERVAL", "600"))
+POLL_PROBE_TIMEOUT = float(os.getenv("POLL_PROBE_TIMEOUT", "1"))
+# 0 disables slow polling of idle devices
+POLL_IDLE_AFTER = float(os.getenv("POLL_IDLE_AFTER", "3600"))
+POLL_IDLE_INTERVAL = float(os.getenv("POLL_IDLE_INTERVAL", "300"))
+
+HEALTHY = "healthy"
+BACKOFF = "backoff"
+OPEN = "open"
+IDLE = "idle"
+
+
+class DevicePollState:
+    __slots__ = (
+        "failures",
+        "circuit_open",
+        "off_since",
+        "next_poll",
+        "polls",
+        "successes",
+        "errors",
+        "skipped",
+        "last_success",
+    )
+
+    def __init__(self):
+        self.failures = 0
+        self.circuit_open = False
+        self.off_since = None
+        self.next_poll = None
+        self.polls = 0
+        self.successes = 0
+        self.errors = 0
+        self.skipped = 0
+        self.last_success = None
+
+    def mode(self, now, idle_after):
+        if self.circuit_open:
+            return OPEN
+        if self.failures:
+            return BACKOFF
+        if idle_after and self.off_since and now - self.off_since >= idle_after:
+            return IDLE
+        return HEALTHY
+
+    def as_dict(self, now, idle_after):
+        return {
+            "mode": self.mode(now, idle_after),
+            "failures": self.failures,
+            "next_poll": self.next_poll.isoformat() if self.next_poll else None,
+            "polls": self.polls,
+            "successes": self.successes,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "last_success": (
+                self.last_success.isoformat() if self.last_success else None
+            ),
+        }
+
+
+class PollPolicy:
+    def __init__(
+        self,
+        interval,
+        timeout,
+        backoff_max=POLL_BACKOFF_MAX,
+        breaker_failures=POLL_BREAKER_FAILURES,
+        probe_interval=POLL_PROBE_INTERVAL,
+        probe_timeout=POLL_PROBE_TIMEOUT,
+        idle_after=POLL_IDLE_AFTER,
+        idle_interval=POLL_IDLE_INTERVAL,
+    ):
+        self.interval = timedelta(seconds=interval)
+        self.timeout = timeout
+        self.backoff_max = timedelta(seconds=backoff_max)
+        self.breaker_failures = breaker_failures
+        self.probe_interval = timedelta(seconds=probe_interval)
+        self.probe_timeout = min(probe_timeout, timeout)
+        self.idle_after = timedelta(seconds=idle_after)
+        self.idle_interval = timedelta(seconds=idle_interval)
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, device_id):
+        state = self._states.get(device_id)
+        if state is None:
+            state = self._states[device_id] = DevicePollState()
+        return state
+
+    def plan(self, device_id, now, switched_on=False):
+        """
+        Request timeout to poll the device with on this tick, or None to skip it.
+        switched_on (stored status ON) ends slow idle polling right away.
+        """
+        with self._lock:
+            state = self._state(device_id)
+            if switched_on:
+                state.off_since = None
+                if not state.failures:
+                    state.next_poll = None
+            if state.next_poll is not None and now < state.next_poll:
+                state.skipped += 1
+                return None
+            return self.probe_timeout if state.circuit_open else self.timeout
+
+    def record(self, device_id, now, power):
+        """Outcome of a poll: watts, or None if the device did not answer."""
+        with self._lock:
+            state = self._state(device_id)
+            state.polls += 1
+            if power is None:
+                state.errors += 1
+                state.failures += 1
+                if state.failures >= self.breaker_failures:
+                    state.circuit_open = True
+                    state.next_poll = now + self.probe_interval
+                else:
+                    backoff = self.interval * 2 ** (state.failures - 1)
+                    state.next_poll = now + min(backoff, self.backoff_max)
+                return
+
+            state.successes += 1
+            state.last_success = now
+            state.failures = 0
+            state.circuit_open = False
+            if power > ON_THRESHOLD_W:
+                state.off_since = None
+            elif state.off_since is None:
+                state.off_since = now
+            if state.mode(now, self.idle_after) == IDLE:
+                state.next_poll = now + self.idle_interval
+            else:
+                state.next_poll = None
+
+    def forget(self, keep_ids):
+        """Drop the state of devices that no longer exist."""
+        with self._lock:
+            for device_id in set(self._states) - set(keep_ids):
+                del self._states[device_id]
+
+    def summary(self, now):
+        """Number of devices per mode."""
+        counts = {HEALTHY: 0, BACKOFF: 0, OPEN: 0, IDLE: 0}
+        with self._lock:
+            for state in self._states.values():
+                counts[state.mode(now, self.idle_after)] += 1
+        return counts
+
+    def snapshot(self, now, device_ids=None):
+        """{device_id: per-device poll stats} for all or the given devices."""
+        with self._lock:
+            return {
+                device_id: state.as_dict(now, self.idle_after)
+                for device_id, state in self._states.items()
+                if device_ids is None or device_id in device_ids
+            }
+
+
+def serve_poll_stats(policy, path=LATEST_CACHE_SOCKET):
+    """Answer "poll.stats" requests from the web app with the collector's policy state."""
+
+    def handle(device_ids=None):
+        snapshot = policy.snapshot(datetime.now(), device_ids and set(device_ids))
+        return {str(device_id): stats for device_id, stats in snapshot.items()}
+
+    local_ipc.get_server(path).register("poll.stats", handle)
+
+
+def fetch_poll_stats(device_ids, path=LATEST_CACHE_SOCKET):
+    """{device_id: poll stats} from the running collector; raises if unreachable."""
+    result = local_ipc.call(path, "poll.stats", device_ids=list(device_ids))
+    return {int(device_id): stats for device_id, stats in result.items()}
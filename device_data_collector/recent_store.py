@@ -0,0 +1,185 @@
+"""
+Recent readings of every device, kept in collector memory.
+
+Each device has a fixed ring of RECENT_HOURS of samples: one float32 slot per
+SAMPLE_INTERVAL tick, indexed by tick number (epoch seconds // interval), so
+timestamps are implicit and never stored. Ticks without an answer hold NaN.
+Appending is O(1) (a gap of skipped ticks clears one slot per tick that passed).
+
+Memory: 4 bytes per sample, i.e. 86400 / SAMPLE_INTERVAL * 4 bytes per
+device-day (5,760 bytes at 60 s) plus about 150 bytes of per-device overhead;
+10,000 devices with 24 h at 60 s take about 59 MB. Rings are created for the
+devices the collector has polled since it started and dropped (forget) when
+a reload of the collector's device list no longer has the device.
+
+The store keeps every answered reading, including OFF (0 W) ones. The web app
+reads it over the collector's local socket ("recent.get"), e.g. for charts of
+the last day, instead of scanning minutely_consumptions.
+"""
+import os
+import math
+import threading
+from array import array
+from datetime import datetime
+
+from device_data_collector import local_ipc
+from device_data_collector.ingest import SAMPLE_INTERVAL
+from device_data_collector.latest_cache import LATEST_CACHE_SOCKET
+
+RECENT_HOURS = float(os.getenv("RECENT_HOURS", "24"))
+
+_NAN = float("nan")
+
+
+class DeviceRing:
+    """Fixed-size float32 ring; slot = tick % size, last_tick = newest tick written."""
+
+    __slots__ = ("values", "last_tick")
+
+    def __init__(self, size):
+        self.values = array("f", [_NAN]) * size
+        self.last_tick = None
+
+    def append(self, tick, value):
+        values = self.values
+        size = len(values)
+        last = self.last_tick
+        if last is not None and tick <= last:
+            if tick > last - size:
+                values[tick % size] = value  # late answer for a tick still held
+            return
+        if last is None or tick - last > size:
+            values[:] = array("f", [_NAN]) * size
+        else:
+            for skipped in range(last + 1, tick):
+                values[skipped % size] = _NAN
+        values[tick % size] = value
+        self.last_tick = tick
+
+    def window(self, first, last):
+        """Values of ticks first..last (inclusive), NaN where nothing is held."""
+        values = self.values
+        size = len(values)
+        held_from = self.last_tick - size + 1 if self.last_tick is not None else 0
+        held_to = self.last_tick if self.last_tick is not None else -1
+        return [
+            values[tick % size] if held_from <= tick <= held_to else _NAN
+            for tick in range(first, last + 1)
+        ]
+
+
+class RecentStore:
+    def __init__(self, interval=SAMPLE_INTERVAL, hours=RECENT_HOURS):
+        self.interval = interval
+        self.size = max(int(hours * 3600 // interval), 1)
+        self._rings = {}
+        self._first_tick = None
+        self._lock = threading.Lock()
+
+    def _tick(self, when):
+        return int(round(when.timestamp() / self.interval))
+
+    def record(self, sweep_time, readings):
+        """Sweep listener: {device_id: watts or None} polled at sweep_time."""
+        tick = self._tick(sweep_time)
+        with self._lock:
+            if self._first_tick is None:
+                self._first_tick = tick
+            for device_id, power in readings.items():
+                ring = self._rings.get(device_id)
+                if ring is None:
+                    ring = self._rings[device_id] = DeviceRing(self.size)
+                ring.append(tick, _NAN if power is None else power)
+
+    def forget(self, keep_ids):
+        """Drop the rings of devices that no longer exist."""
+        with self._lock:
+            for device_id in set(self._rings) - set(keep_ids):
+                del self._rings[device_id]
+
+    def covers(self, start, now=None):
+        """True if every tick from start on was recorded while the store ran."""
+        if self._first_tick is None:
+            return False
+        newest = int((now or datetime.now()).timestamp() // self.interval)
+        oldest = newest - self.size + 1
+        return self._tick(start) >= max(self._first_tick, oldest)
+
+    def window(self, device_ids, start, end):
+        """
+        (first tick epoch, {device_id: values}) for the ticks in [start, end);
+        values has one entry per tick, None where nothing was read.
+        """
+        first = math.ceil(start.timestamp() / self.interval)
+        last = math.ceil(end.timestamp() / self.interval) - 1
+        with self._lock:
+            found = {
+                device_id: self._rings[device_id].window(first, last)
+                for device_id in device_ids
+                if device_id in self._rings
+            }
+        return first * self.interval, {
+            device_id: [None if math.isnan(value) else value for value in values]
+            for device_id, values in found.items()
+        }
+
+    def nbytes(self):
+        """Bytes held by the sample arrays."""
+        with self._lock:
+            return sum(
+                ring.values.buffer_info()[1] * ring.values.itemsize
+                for ring in self._rings.values()
+            )
+
+    def serve(self, path=LATEST_CACHE_SOCKET):
+        """Answer "recent.get" requests from the web app."""
+        local_ipc.get_server(path).register("recent.get", self._serve_get)
+        return self
+
+    def _serve_get(self, device_ids, start, end):
+        start, end = datetime.fromtimestamp(start), datetime.fromtimestamp(end)
+        if not self.covers(start):
+            return None
+        first, found = self.window(device_ids, start, end)
+        return {
+            "first": first,
+            "interval": self.interval,
+            "devices": {str(device_id): values for device_id, values in found.items()},
+        }
+
+
+_store = None
+
+
+def get_recent_store():
+    """Process-wide store of the collector."""
+    global _store
+    if _store is None:
+        _store = RecentStore()
+    return _store
+
+
+def fetch_recent(device_ids, start, end, path=LATEST_CACHE_SOCKET):
+    """
+    {device_id: [(datetime, watts)]} of the ticks in [start, end) from the
+    running collector, or None if it does not hold the whole range (started
+    later, or start older than RECENT_HOURS). Raises if unreachable.
+    """
+    result = local_ipc.call(
+        path,
+        "recent.get",
+        device_ids=list(device_ids),
+        start=start.timestamp(),
+        end=end.timestamp(),
+    )
+    if result is None:
+        return None
+    first, interval = result["first"], result["interval"]
+    return {
+        int(device_id): [
+            (datetime.fromtimestamp(first + offset * interval), value)
+            for offset, value in enumerate(values)
+            if value is not None
+        ]
+        for device_id, values in result["devices"].items()
+    }
@@ -0,0 +1,142 @@
+"""
+Range queries with server-side downsampling for charts.
+
+choose_level() picks the coarsest stored level whose step is still finer than
+the requested resolution, so a one-year chart reads ~52 weekly or ~365 daily
+rows instead of half a million minutely ones. downsample() then buckets the
+rows into at most `points` (mean, min, max) points. Minutely rows of the last
+RECENT_HOURS come from the collector's in-memory ring buffers when it holds
+the whole range, and from the database otherwise.
+"""
+import math
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select
+
+from device_data_collector.archive import read_series
+from device_data_collector.ingest import ON_THRESHOLD_W, SAMPLE_INTERVAL
+from device_data_collector.recent_store import fetch_recent
+from device_data_collector.partitions import RAW_RETENTION_DAYS
+from device_data_collector.models import MinutelyConsumption, DeviceWeeklyConsumption
+
+logger = logging.getLogger(__name__)
+
+MAX_POINTS = 2000
+
+# (level, seconds per stored row), finest first; "minutely" rows are one
+# sweep apart, which is SAMPLE_INTERVAL rather than a minute when tuned
+LEVEL_STEPS = [
+    ("minutely", SAMPLE_INTERVAL),
+    ("hourly", 3600),
+    ("daily", 86400),
+    ("weekly", 7 * 86400),
+]
+
+
+def choose_level(start, end, points, now=None):
+    """Coarsest level with step <= (end - start) / points that still has data for start."""
+    now = now or datetime.now()
+    resolution = (end - start).total_seconds() / max(points, 1)
+    level = LEVEL_STEPS[0][0]
+    for name, step in LEVEL_STEPS:
+        if step <= resolution:
+            level = name
+    if level == "minutely" and start < now - timedelta(days=RAW_RETENTION_DAYS):
+        level = "hourly"
+    return level
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.combine(value, datetime.min.time())
+
+
+def _recent_rows(device_id, start, end):
+    """
+    Minutely rows from the collector's ring buffers, filtered like the stored
+    readings (ON only); None if the collector cannot serve the range.
+    """
+    try:
+        recent = fetch_recent([device_id], start, end)
+    except Exception as e:
+        logger.debug(f"Recent readings unavailable: {e}")
+        return None
+    if recent is None:
+        return None
+    return [
+        (when, value)
+        for when, value in recent.get(device_id, [])
+        if value > ON_THRESHOLD_W
+    ]
+
+
+def fetch_level(session, level, device_id, start, end):
+    """(datetime, value) rows of one level in [start, end), archive included."""
+    if level == "minutely":
+        rows = _recent_rows(device_id, start, end)
+        if rows is not None:
+            return rows
+    if level in ("hourly", "daily"):
+        rows = read_series(session, level, device_id, start, end)
+    else:
+        model, time_col, value_col = {
+            "minutely": (
+                MinutelyConsumption,
+                MinutelyConsumption.time,
+                MinutelyConsumption.power_consumption,
+            ),
+            "weekly": (
+                DeviceWeeklyConsumption,
+                DeviceWeeklyConsumption.date,
+                DeviceWeeklyConsumption.weekly_average,
+            ),
+        }[level]
+        rows = session.execute(
+            select(time_col, value_col)
+            .where(model.device_id == device_id, time_col >= start, time_col < end)
+            .order_by(time_col)
+        ).all()
+    return [(_as_datetime(when), value) for when, value in rows]
+
+
+def downsample(rows, start, end, points):
+    """Bucket time-ordered (datetime, value) rows into <= points mean/min/max points."""
+    if not rows:
+        return []
+    width = max(math.ceil((end - start).total_seconds() / points), 1)
+    result = []
+    current, values = None, []
+    for when, value in rows:
+        bucket = int((when - start).total_seconds() // width)
+        if bucket != current and values:
+            result.append(_summarize(start, width, current, values))
+            values = []
+        current = bucket
+        values.append(value)
+    result.append(_summarize(start, width, current, values))
+    return result
+
+
+def _summarize(start, width, bucket, values):
+    return {
+        "time": (start + timedelta(seconds=bucket * width)).isoformat(),
+        "mean": sum(values) / len(values),
+        "min": min(values),
+        "max": max(values),
+    }
+
+
+def device_series(session, device_id, start, end, points):
+    """
+    Downsampled series of one device: (level, points). Falls back to finer
+    levels when the chosen one has nothing yet (e.g. a device younger than a week).
+    """
+    points = min(max(points, 1), MAX_POINTS)
+    names = [name for name, _ in LEVEL_STEPS]
+    chosen = names.index(choose_level(start, end, points))
+    for level in reversed(names[: chosen + 1]):
+        rows = fetch_level(session, level, device_id, start, end)
+        if rows:
+            break
+    return level, downsample(rows, start, end, points)
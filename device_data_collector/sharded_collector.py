@@ -0,0 +1,338 @@
+"""
+Sharded collector: several processes (on one or more hosts) split the devices.
+
+Devices are hash-partitioned into COLLECTOR_SHARDS shards by device_id % shards.
+Each shard has a row in collector_leases; a worker owns the shards whose lease
+it holds and renews them every COLLECTOR_HEARTBEAT seconds, together with its
+own row in collector_workers. Leases are taken
+with a compare-and-set UPDATE, so two workers never hold the same shard, and a
+shard whose owner stopped heartbeating is picked up by another worker once its
+lease has expired (COLLECTOR_LEASE_TTL). Workers take at most a fair share of
+the shards (shards / live workers) and release the surplus when more join.
+A worker whose heartbeats fail (database unreachable) stops sweeping and
+rolling up once COLLECTOR_LEASE_TTL has passed since its last renewal, as its
+shards may then belong to another worker.
+
+Each heartbeat also reports the oldest sweep still in the worker's spool. The
+rollups are held back to the oldest of those, and to the last heartbeat of a
+worker that has missed one (its spool may be filling up unreported), for at
+most COLLECTOR_ROLLUP_HOLD seconds: a worker that died without releasing its
+row stops holding them back after that.
+
+The worker holding shard 0 also runs the rollups, so they run exactly once.
+With several collector processes use the mmap latest-reading cache: the socket
+backend lives inside a single process, as do the recent-readings ring buffers,
+poll stats and anomaly events, which only the single-process collector serves
+(each worker still runs anomaly detection and alerting for its own devices).
+
+    python -m device_data_collector.sharded_collector --workers 4
+"""
+import os
+import sys
+import math
+import time
+import signal
+import socket
+import logging
+import argparse
+import multiprocessing
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert, delete, func, or_
+from sqlalchemy.exc import IntegrityError
+
+from device_data_collector.db import db
+from device_data_collector.models import CollectorLease, CollectorWorker
+from device_data_collector.data_collector import (
+    collect_data,
+    add_sweep_listener,
+    get_device_list,
+    start_processor,
+    SAMPLE_INTERVAL,
+)
+from device_data_collector.ticker import TickScheduler
+from device_data_collector.anomaly import get_anomaly_detector
+from device_data_collector.alerts import get_alert_dispatcher
+from device_data_collector.spool import get_spool, SPOOL_DIR
+from device_data_collector.latest_cache import (
+    get_latest_cache,
+    publish_sweep,
+    SocketLatestCache,
+)
+
+logger = logging.getLogger(__name__)
+
+COLLECTOR_SHARDS = int(os.getenv("COLLECTOR_SHARDS", "16"))
+COLLECTOR_LEASE_TTL = float(os.getenv("COLLECTOR_LEASE_TTL", "90"))
+COLLECTOR_HEARTBEAT = float(os.getenv("COLLECTOR_HEARTBEAT", "20"))
+COLLECTOR_ROLLUP_HOLD = float(os.getenv("COLLECTOR_ROLLUP_HOLD", str(6 * 3600)))
+
+
+class ShardLeases:
+    """The set of shards held by one worker, kept alive through the lease table."""
+
+    def __init__(
+        self, owner, shards=COLLECTOR_SHARDS, ttl=COLLECTOR_LEASE_TTL, spool=None
+    ):
+        self.owner = owner
+        self.shards = shards
+        self.ttl = ttl
+        self.spool = spool
+        self.held = set()
+        self.renewed_at = None  # start of the last successful heartbeat
+
+    def _ensure_rows(self, session):
+        existing = set(session.execute(select(CollectorLease.shard)).scalars())
+        missing = [
+            {"shard": shard} for shard in range(self.shards) if shard not in existing
+        ]
+        if missing:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(CollectorLease), missing)
+            except IntegrityError:
+                pass  # another worker created them first
+
+    def _live_workers(self, session, now):
+        """Record this worker's heartbeat and count the workers still alive."""
+        values = {
+            "heartbeat_at": now,
+            "spool_oldest": self.spool.oldest_pending() if self.spool else None,
+        }
+        seen = session.execute(
+            update(CollectorWorker)
+            .where(CollectorWorker.worker_id == self.owner)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if seen.rowcount == 0:
+            session.execute(
+                insert(CollectorWorker).values(worker_id=self.owner, **values)
+            )
+        return session.execute(
+            select(func.count()).where(
+                CollectorWorker.heartbeat_at >= now - timedelta(seconds=self.ttl)
+            )
+        ).scalar()
+
+    def _claim(self, session, shard, now):
+        """Take or renew one lease; True if this worker holds it afterwards."""
+        result = session.execute(
+            update(CollectorLease)
+            .where(
+                CollectorLease.shard == shard,
+                or_(
+                    CollectorLease.owner == self.owner,
+                    CollectorLease.owner.is_(None),
+                    CollectorLease.expires_at < now,
+                ),
+            )
+            .values(owner=self.owner, expires_at=now + timedelta(seconds=self.ttl))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    def _release(self, session, shards):
+        if shards:
+            session.execute(
+                update(CollectorLease)
+                .where(
+                    CollectorLease.shard.in_(shards),
+                    CollectorLease.owner == self.owner,
+                )
+                .values(owner=None, expires_at=None)
+                .execution_options(synchronize_session=False)
+            )
+
+    def heartbeat(self, now=None):
+        """
+        Renew held leases, give back shards above the fair share and claim
+        free or expired ones up to it. Returns the shards held afterwards.
+        """
+        now = now or datetime.now()
+        with db.get_session() as session:
+            self._ensure_rows(session)
+            share = math.ceil(self.shards / self._live_workers(session, now))
+
+            held = {
+                shard for shard in sorted(self.held) if self._claim(session, shard, now)
+            }
+            surplus = sorted(held)[share:]
+            self._release(session, surplus)
+            held.difference_update(surplus)
+
+            if len(held) < share:
+                free = session.execute(
+                    select(CollectorLease.shard)
+                    .where(
+                        or_(
+                            CollectorLease.owner.is_(None),
+                            CollectorLease.expires_at < now,
+                        )
+                    )
+                    .order_by(CollectorLease.shard)
+                ).scalars()
+                for shard in free:
+                    if len(held) >= share:
+                        break
+                    if self._claim(session, shard, now):
+                        held.add(shard)
+
+        if held != self.held:
+            logger.info(f"{self.owner} now holds shards {sorted(held)}")
+        self.held = held
+        self.renewed_at = now
+        return held
+
+    def active(self, now=None):
+        """
+        Shards this worker may sweep: the held ones, unless the leases have
+        expired since the last successful heartbeat (e.g. the database is
+        unreachable), in which case another worker may have claimed them.
+        """
+        now = now or datetime.now()
+        if self.renewed_at is None or now >= self.renewed_at + timedelta(
+            seconds=self.ttl
+        ):
+            return set()
+        return self.held
+
+    def rollup_hold(self, now=None):
+        """Time the rollups must not pass while spooled sweeps are pending, or None."""
+        now = now or datetime.now()
+        late = now - timedelta(seconds=1.5 * COLLECTOR_HEARTBEAT)
+        with db.get_session() as session:
+            workers = session.execute(
+                select(
+                    CollectorWorker.worker_id,
+                    CollectorWorker.heartbeat_at,
+                    CollectorWorker.spool_oldest,
+                ).where(
+                    CollectorWorker.heartbeat_at
+                    >= now - timedelta(seconds=COLLECTOR_ROLLUP_HOLD)
+                )
+            ).all()
+        bounds = []
+        for worker_id, heartbeat_at, spool_oldest in workers:
+            if worker_id == self.owner:
+                continue  # our own spool is read directly below
+            if spool_oldest is not None:
+                bounds.append(spool_oldest)
+            if heartbeat_at < late:
+                bounds.append(heartbeat_at)
+        if self.spool and self.spool.oldest_pending() is not None:
+            bounds.append(self.spool.oldest_pending())
+        return min(bounds, default=None)
+
+    def release_all(self):
+        with db.get_session() as session:
+            self._release(session, list(self.held))
+            session.execute(
+                delete(CollectorWorker).where(CollectorWorker.worker_id == self.owner)
+            )
+        self.held = set()
+
+
+def run_shard_worker(owner=None, shards=COLLECTOR_SHARDS, index=0):
+    """
+    One worker: lease heartbeats, rollups (while holding shard 0) and sweeps of
+    the held shards each run on their own tick scheduler. Worker `index` keeps
+    its spool in SPOOL_DIR/worker-<index>, so a restarted worker replays it.
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    spool = get_spool(SPOOL_DIR and os.path.join(SPOOL_DIR, f"worker-{index}"))
+    leases = ShardLeases(owner, shards, spool=spool)
+    if spool:
+        spool.start_flusher()
+    cache = get_latest_cache()
+    if isinstance(cache, SocketLatestCache):
+        logger.warning("The socket latest cache is per process; use mmap with shards")
+    else:
+        add_sweep_listener(publish_sweep)
+    add_sweep_listener(get_anomaly_detector().record)
+    get_device_list().add_listener(get_anomaly_detector().forget)
+    alerts = get_alert_dispatcher().start()
+    add_sweep_listener(alerts.submit)
+    get_anomaly_detector().add_listener(alerts.submit_anomalies)
+
+    logger.info(f"Starting collector worker {owner} ({shards} shards)...")
+    leases.heartbeat()
+    heartbeat = TickScheduler(COLLECTOR_HEARTBEAT, name="lease-heartbeat")
+    heartbeat.start(leases.heartbeat)
+    processor = start_processor(
+        should_run=lambda: 0 in leases.active(), held_back=leases.rollup_hold
+    )
+
+    def sweep(tick_time):
+        held = sorted(leases.active())
+        if held:
+            collect_data(held, shards, tick_time)
+
+    sampler = TickScheduler(SAMPLE_INTERVAL, name="collector")
+    try:
+        sampler.run(sweep)
+    finally:
+        heartbeat.stop()
+        processor.stop()
+        alerts.stop()
+        if spool:
+            spool.close()
+        leases.release_all()
+        logger.info(f"Collector worker {owner} stopped: {sampler}; {alerts}")
+
+
+def _exit_on_sigterm():
+    """Turn SIGTERM into SystemExit so `finally` blocks (lease release) run."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+
+def _worker_main(shards, index):
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(processName)s - %(levelname)s - %(message)s",
+    )
+    _exit_on_sigterm()
+    try:
+        run_shard_worker(shards=shards, index=index)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(workers, shards=COLLECTOR_SHARDS):
+    """Start `workers` worker processes and restart any that exits."""
+    context = multiprocessing.get_context("spawn")
+
+    def start(index):
+        process = context.Process(
+            target=_worker_main, args=(shards, index), name=f"collector-{index}"
+        )
+        process.start()
+        return process
+
+    _exit_on_sigterm()
+    processes = [start(index) for index in range(workers)]
+    try:
+        while True:
+            time.sleep(5)
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning(
+                        f"{process.name} exited with {process.exitcode}, restarting"
+                    )
+                    processes[index] = start(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded device data collector")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shards", type=int, default=COLLECTOR_SHARDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run_workers(args.workers, args.shards)
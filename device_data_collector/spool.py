@@ -0,0 +1,348 @@
+"""
+Durable local spool between the collector and the database.
+
+With SPOOL_DIR set, collect_data() appends each sweep to an append-only log
+on local disk and returns; a flusher thread drains the log into the database
+in large batches. Sampling therefore keeps its cadence while the database is
+slow or down, and nothing collected is lost: after a restart the flusher
+replays whatever was not committed yet.
+
+Layout of SPOOL_DIR:
+    000000000001.log, ...  segments, rotated at SPOOL_SEGMENT_BYTES
+    checkpoint.json        {"segment": n, "offset": bytes} flushed so far
+
+Each record is a frame <length:u32><crc32:u32><json payload> holding one sweep.
+A torn or corrupt frame at the end of the newest segment (crash mid-write) is
+truncated on open. Segments behind the checkpoint are deleted.
+
+Backpressure: once the unflushed backlog exceeds SPOOL_MAX_BYTES, append()
+blocks for up to SPOOL_BLOCK_TIMEOUT seconds and then raises SpoolFull.
+
+Rollups must not close buckets whose readings are still spooled (they would
+never be rolled up or metered), so the collector holds the data processor back
+to oldest_pending(), the oldest sweep not yet in the database.
+"""
+import os
+import json
+import time
+import zlib
+import struct
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import select
+
+from device_data_collector.db import db
+from device_data_collector.models import MinutelyConsumption
+from device_data_collector.ingest import (
+    insert_readings,
+    update_statuses,
+    update_generations,
+)
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", "")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(1024 * 1024 * 1024)))
+SPOOL_BLOCK_TIMEOUT = float(os.getenv("SPOOL_BLOCK_TIMEOUT", "5"))
+SPOOL_FLUSH_ROWS = int(os.getenv("SPOOL_FLUSH_ROWS", "50000"))
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "1") != "0"
+
+_FRAME = struct.Struct("<II")  # payload length, crc32
+_CHECKPOINT = "checkpoint.json"
+_RETRY_MAX = 30.0
+
+
+class SpoolFull(Exception):
+    pass
+
+
+def _segment_name(number):
+    return f"{number:012d}.log"
+
+
+def _encode(sweep_time, rows, status_changes, generations):
+    return json.dumps(
+        {
+            "time": sweep_time.isoformat(),
+            "rows": [[row["device_id"], row["power_consumption"]] for row in rows],
+            "status": status_changes,
+            "generations": generations,
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
+def _sweep_time(payload):
+    return datetime.fromisoformat(json.loads(payload)["time"])
+
+
+def _decode(payload):
+    record = json.loads(payload)
+    sweep_time = datetime.fromisoformat(record["time"])
+    return (
+        [
+            {"device_id": device_id, "power_consumption": power, "time": sweep_time}
+            for device_id, power in record["rows"]
+        ],
+        {int(device_id): status for device_id, status in record["status"].items()},
+        {int(device_id): gen for device_id, gen in record["generations"].items()},
+    )
+
+
+def read_frames(path, offset=0):
+    """
+    Yield (end offset, payload) of the valid frames of a segment from offset,
+    stopping at the end of file or at the first torn/corrupt frame.
+    """
+    with open(path, "rb") as segment:
+        segment.seek(offset)
+        while True:
+            header = segment.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                return
+            length, crc = _FRAME.unpack(header)
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return
+            offset += _FRAME.size + length
+            yield offset, payload
+
+
+class Spool:
+    def __init__(
+        self,
+        directory=SPOOL_DIR,
+        segment_bytes=SPOOL_SEGMENT_BYTES,
+        max_bytes=SPOOL_MAX_BYTES,
+        block_timeout=SPOOL_BLOCK_TIMEOUT,
+        fsync=SPOOL_FSYNC,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.block_timeout = block_timeout
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._pending_status = {}
+        self._pending_times = deque()  # sweep time of each unflushed frame
+        self._flusher = None
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._checkpoint = self._read_checkpoint()
+        self._recover()
+
+    def _segments(self):
+        return sorted(
+            int(name[:-4])
+            for name in os.listdir(self.directory)
+            if name.endswith(".log") and name[:-4].isdigit()
+        )
+
+    def _path(self, number):
+        return os.path.join(self.directory, _segment_name(number))
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, _CHECKPOINT)) as f:
+                checkpoint = json.load(f)
+            return checkpoint["segment"], checkpoint["offset"]
+        except FileNotFoundError:
+            return 0, 0
+
+    def _write_checkpoint(self, segment, offset):
+        path = os.path.join(self.directory, _CHECKPOINT)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"segment": segment, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        self._checkpoint = (segment, offset)
+
+    def _recover(self):
+        """Truncate a torn tail, rebuild the backlog size and pending statuses."""
+        segments = self._segments()
+        if segments:
+            last = self._path(segments[-1])
+            end = 0
+            for end, _ in read_frames(last):
+                pass
+            if end < os.path.getsize(last):
+                logger.warning(f"Truncating torn spool tail of {last} at {end}")
+                os.truncate(last, end)
+        self._segment = segments[-1] if segments else max(self._checkpoint[0], 1)
+        self._fd = os.open(
+            self._path(self._segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644
+        )
+        self._size = os.fstat(self._fd).st_size
+
+        self._backlog = 0
+        for segment, _, payload in self._unflushed():
+            self._backlog += _FRAME.size + len(payload)
+            self._pending_status.update(_decode(payload)[1])
+            self._pending_times.append(_sweep_time(payload))
+        if self._backlog:
+            logger.info(f"Spool holds {self._backlog} unflushed bytes to replay")
+
+    def _unflushed(self):
+        """(segment, end offset, payload) of every frame after the checkpoint."""
+        checkpoint_segment, checkpoint_offset = self._checkpoint
+        for segment in self._segments():
+            if segment < checkpoint_segment:
+                continue
+            offset = checkpoint_offset if segment == checkpoint_segment else 0
+            for end, payload in read_frames(self._path(segment), offset):
+                yield segment, end, payload
+
+    def append(self, sweep_time, rows, status_changes, generations=None):
+        """Durably log one sweep. Blocks while the backlog is over max_bytes."""
+        payload = _encode(sweep_time, rows, status_changes, generations or {})
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._cond:
+            deadline = time.monotonic() + self.block_timeout
+            while self._backlog + len(frame) > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SpoolFull(f"{self._backlog} bytes waiting for the database")
+                self._cond.wait(remaining)
+            if self._size >= self.segment_bytes:
+                self._rotate()
+            os.write(self._fd, frame)
+            if self.fsync:
+                os.fsync(self._fd)
+            self._size += len(frame)
+            self._backlog += len(frame)
+            self._pending_status.update(status_changes)
+            self._pending_times.append(sweep_time)
+            self._cond.notify_all()
+
+    def _rotate(self):
+        os.close(self._fd)
+        self._segment += 1
+        self._fd = os.open(
+            self._path(self._segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644
+        )
+        self._size = 0
+
+    def pending_status(self, device_id, default=None):
+        """Status logged for a device but not yet in the database, else default."""
+        with self._cond:
+            return self._pending_status.get(device_id, default)
+
+    def backlog(self):
+        with self._cond:
+            return self._backlog
+
+    def oldest_pending(self):
+        """Time of the oldest sweep not yet in the database, None if all are."""
+        with self._cond:
+            return min(self._pending_times) if self._pending_times else None
+
+    def _next_batch(self, max_rows):
+        rows, statuses, generations = [], {}, {}
+        position, size, frames = None, 0, 0
+        for segment, end, payload in self._unflushed():
+            batch_rows, batch_statuses, batch_generations = _decode(payload)
+            rows.extend(batch_rows)
+            statuses.update(batch_statuses)
+            generations.update(batch_generations)
+            position = (segment, end)
+            size += _FRAME.size + len(payload)
+            frames += 1
+            if len(rows) >= max_rows:
+                break
+        return rows, statuses, generations, position, size, frames
+
+    def flush_once(self, max_rows=SPOOL_FLUSH_ROWS, dedupe=False):
+        """
+        Write the next batch to the database in one transaction and advance the
+        checkpoint. With dedupe, readings already in the database are skipped
+        (a crash between commit and checkpoint replays the last batch).
+        Returns the number of readings written, None if nothing was pending.
+        """
+        rows, statuses, generations, position, size, frames = self._next_batch(
+            max_rows
+        )
+        if position is None:
+            return None
+        with db.get_session() as session:
+            if dedupe and rows:
+                times = {row["time"] for row in rows}
+                stored = {
+                    tuple(row)
+                    for row in session.execute(
+                        select(
+                            MinutelyConsumption.device_id, MinutelyConsumption.time
+                        ).where(MinutelyConsumption.time.in_(times))
+                    )
+                }
+                rows = [
+                    row for row in rows if (row["device_id"], row["time"]) not in stored
+                ]
+            insert_readings(session, rows)
+            update_statuses(session, statuses)
+            update_generations(session, generations)
+        self._write_checkpoint(*position)
+
+        with self._cond:
+            self._backlog -= size
+            for _ in range(frames):
+                self._pending_times.popleft()
+            for device_id, status in statuses.items():
+                if self._pending_status.get(device_id) == status:
+                    del self._pending_status[device_id]
+            self._cond.notify_all()
+        for segment in self._segments():
+            if segment < position[0]:
+                os.unlink(self._path(segment))
+        return len(rows)
+
+    def _run_flusher(self):
+        dedupe, delay = True, 1.0
+        while not self._stop.is_set():
+            try:
+                written = self.flush_once(dedupe=dedupe)
+            except Exception as err:
+                logger.error(f"Spool flush failed, retrying in {delay:.0f}s: {err}")
+                self._stop.wait(delay)
+                delay = min(delay * 2, _RETRY_MAX)
+                continue
+            dedupe, delay = False, 1.0
+            if written is not None:
+                logger.debug(f"Flushed {written} spooled readings")
+                continue
+            with self._cond:
+                self._cond.wait(1.0)
+
+    def start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="spool-flusher", daemon=True
+            )
+            self._flusher.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        os.close(self._fd)
+
+
+_spool = None
+
+
+def get_spool(directory=SPOOL_DIR):
+    """
+    Process-wide spool when SPOOL_DIR is set, else None (direct writes).
+    The first call picks the directory (sharded workers use one each).
+    """
+    global _spool
+    if _spool is None and directory:
+        _spool = Spool(directory)
+    return _spool
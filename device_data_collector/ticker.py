@@ -0,0 +1,92 @@
+"""
+Drift-free periodic scheduling on the monotonic clock.
+
+Ticks are aligned to wall-clock multiples of the interval (every 10 s fires at
+:00, :10, :20, ...), so every process sampling at the same interval stamps its
+readings with the same canonical tick time. Deadlines advance by exactly one
+interval per tick, so a slow run never pushes later ticks back: a run that
+overruns its slot is counted as an overrun, and ticks whose slot has passed
+entirely are skipped and counted as missed instead of being run late in a burst.
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# wall clock jumps (NTP step, suspend) larger than this re-align the ticks
+RESYNC_THRESHOLD = 1.0
+
+
+class TickScheduler:
+    def __init__(self, interval, name="ticker"):
+        self.interval = interval
+        self.name = name
+        self.ticks = 0
+        self.overruns = 0
+        self.missed = 0
+        self.last_duration = 0.0
+        self._stop = threading.Event()
+
+    def _align(self):
+        """(monotonic deadline, wall-clock epoch) of the next aligned tick."""
+        wall, mono = time.time(), time.monotonic()
+        next_wall = (wall // self.interval + 1) * self.interval
+        return mono + (next_wall - wall), next_wall
+
+    def run(self, callback):
+        """Call callback(tick_time) on every tick until stop(); blocks."""
+        next_mono, next_wall = self._align()
+        while not self._stop.is_set():
+            delay = next_mono - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+
+            lag = time.monotonic() - next_mono
+            if lag >= self.interval:
+                skipped = int(lag // self.interval)
+                self.missed += skipped
+                next_mono += skipped * self.interval
+                next_wall += skipped * self.interval
+                logger.warning(f"{self.name}: missed {skipped} tick(s)")
+            drift = (time.time() - next_wall) - (time.monotonic() - next_mono)
+            if abs(drift) > RESYNC_THRESHOLD:
+                logger.warning(f"{self.name}: wall clock jumped, re-aligning ticks")
+                next_mono, next_wall = self._align()
+                continue
+
+            tick_time = datetime.fromtimestamp(next_wall)
+            started = time.monotonic()
+            try:
+                callback(tick_time)
+            except Exception as err:
+                logger.error(f"{self.name}: tick {tick_time} failed: {str(err)}")
+            self.ticks += 1
+            self.last_duration = time.monotonic() - started
+
+            next_mono += self.interval
+            next_wall += self.interval
+            if time.monotonic() > next_mono:
+                self.overruns += 1
+                logger.warning(
+                    f"{self.name}: tick {tick_time:%H:%M:%S} took "
+                    f"{self.last_duration:.2f}s, over the {self.interval}s interval"
+                )
+
+    def start(self, callback):
+        """Run in a daemon thread; returns the thread."""
+        thread = threading.Thread(
+            target=self.run, args=(callback,), name=self.name, daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.ticks} ticks, {self.overruns} overruns, "
+            f"{self.missed} missed, last took {self.last_duration:.2f}s"
+        )
@@ -0,0 +1,75 @@
+from sqlalchemy import select, insert, update, func, literal, false, and_, or_
+from sqlalchemy.orm import aliased
+
+from device_data_collector.models import Device, RollupWatermark
+
+
+def pending_since_watermark(
+    level, device_col, time_expr, legacy_flag=None, as_date=False
+):
+    """
+    Outer-join target for the `level` watermark: returns (watermark, onclause,
+    condition) where condition keeps rows at or after each device's watermark.
+    Devices with no watermark yet fall back to the legacy aggregated flag.
+    as_date compares against the watermark's date, for DATE-keyed sources.
+    """
+    watermark = aliased(RollupWatermark)
+    onclause = and_(watermark.device_id == device_col, watermark.level == level)
+    closed_through = watermark.closed_through
+    if as_date:
+        closed_through = func.date(closed_through)
+    fresh = watermark.closed_through.is_(None)
+    if legacy_flag is not None:
+        fresh = and_(fresh, legacy_flag == false())
+    return watermark, onclause, or_(fresh, time_expr >= closed_through)
+
+
+def advance_watermarks(session, level, boundary, device_ids=None):
+    """
+    Move every device's (or only device_ids') `level` watermark up to boundary
+    (two set-based statements).
+    """
+    raise_lagging = update(RollupWatermark).where(
+        RollupWatermark.level == level,
+        RollupWatermark.closed_through < boundary,
+    )
+    known = select(RollupWatermark.device_id).where(RollupWatermark.level == level)
+    missing = select(Device.device_id, literal(level), literal(boundary)).where(
+        Device.device_id.not_in(known)
+    )
+    if device_ids is not None:
+        raise_lagging = raise_lagging.where(RollupWatermark.device_id.in_(device_ids))
+        missing = missing.where(Device.device_id.in_(device_ids))
+
+    session.execute(
+        raise_lagging.values(closed_through=boundary).execution_options(
+            synchronize_session=False
+        )
+    )
+    session.execute(
+        insert(RollupWatermark).from_select(
+            ["device_id", "level", "closed_through"], missing
+        )
+    )
+
+
+def watermark_floor(session, level):
+    """
+    Oldest `level` watermark over all devices, usable as a lower time bound for
+    index range scans. None when some device has no watermark yet.
+    """
+    lagging, missing = session.execute(
+        select(
+            func.min(RollupWatermark.closed_through),
+            func.count(Device.device_id) - func.count(RollupWatermark.device_id),
+        )
+        .select_from(Device)
+        .outerjoin(
+            RollupWatermark,
+            and_(
+                RollupWatermark.device_id == Device.device_id,
+                RollupWatermark.level == level,
+            ),
+        )
+    ).one()
+    return None if missing else lagging
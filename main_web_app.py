@@ -1,4 +1,14 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import (
+    Flask,
+    Response,
+    render_template,
+    request,
+    redirect,
+    url_for,
+    flash,
+    jsonify,
+    stream_with_context,
+)
 from flask_login import (
     LoginManager,
     UserMixin,
@@ -16,29 +26,36 @@ from device_data_collector.models import (
     DeviceWeeklyConsumption,
     HourlyConsumption,
     DeviceDailyConsumption,
+    GroupConsumption,
 )
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import select, func, and_, or_
 import requests
 from device_data_collector.db import db
+from device_data_collector.migrations import migrate
+from device_data_collector.latest_cache import get_latest_cache
+from device_data_collector.live_stream import get_broadcaster
+from device_data_collector.series import device_series
+from device_data_collector.device_client import get_device_client
+from device_data_collector.poll_policy import fetch_poll_stats
+from device_data_collector.energy import energy_between
+from device_data_collector.anomaly import fetch_anomalies
+from device_data_collector.auth_cache import (
+    cached_user,
+    device_owner,
+    room_owner,
+    profile_owner,
+    device_owners,
+    room_owners,
+    profile_owners,
+)
 import re
 import os
+import logging
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "your-secret-key-here")
 
-# Initialize database tables only if they don't exist
-try:
-    # Check if tables exist by trying to query the users table
-    with db.get_session() as session:
-        session.query(User).first()
-except Exception as e:
-    app.logger.info("Tables don't exist, creating them...")
-    try:
-        db.create_tables()
-        app.logger.info("Database tables created successfully")
-    except Exception as e:
-        app.logger.error(f"Error creating database tables: {e}")
-
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "login"
@@ -56,7 +73,7 @@ def load_user(user_id):
     app.logger.debug(f"Loading user with ID: {user_id}")
     with db.get_session() as session:
         try:
-            user = session.query(User).filter_by(user_id=user_id).first()
+            user = cached_user(session, int(user_id))
             return UserWrapper(user) if user else None
         except Exception as e:
             app.logger.error(f"Error loading user: {str(e)}")
@@ -168,6 +185,62 @@ def profile_view(profile_id):
         return render_template("profile.html", profile=profile, rooms=rooms)
 
 
+# time_range -> (model, time column, value column, response key)
+POWER_LEVELS = {
+    "minutely": (
+        MinutelyConsumption,
+        MinutelyConsumption.time,
+        MinutelyConsumption.power_consumption,
+        "power",
+    ),
+    "hourly": (
+        HourlyConsumption,
+        HourlyConsumption.time,
+        HourlyConsumption.power_consumption,
+        "hourly_average",
+    ),
+    "daily": (
+        DeviceDailyConsumption,
+        DeviceDailyConsumption.date,
+        DeviceDailyConsumption.daily_average,
+        "daily_average",
+    ),
+    "weekly": (
+        DeviceWeeklyConsumption,
+        DeviceWeeklyConsumption.date,
+        DeviceWeeklyConsumption.weekly_average,
+        "weekly_average",
+    ),
+}
+
+
+def power_payload(time_range, value, last_updated):
+    """Response body for one device's latest reading at the given granularity."""
+    key = POWER_LEVELS[time_range][3]
+    return {
+        key: float(value) if value is not None else None,
+        "last_updated": last_updated.isoformat() if last_updated else None,
+    }
+
+
+def latest_readings(session, time_range, device_ids):
+    """{device_id: (value, time)} of the newest `time_range` row of each device."""
+    model, time_col, value_col, _ = POWER_LEVELS[time_range]
+    latest = (
+        select(model.device_id, func.max(time_col).label("latest"))
+        .where(model.device_id.in_(device_ids))
+        .group_by(model.device_id)
+        .subquery()
+    )
+    rows = session.execute(
+        select(model.device_id, value_col, time_col).join(
+            latest,
+            and_(model.device_id == latest.c.device_id, time_col == latest.c.latest),
+        )
+    )
+    return {device_id: (value, when) for device_id, value, when in rows}
+
+
 @app.route("/api/device/<int:device_id>/power")
 @login_required
 def get_device_power(device_id):
@@ -175,94 +248,324 @@ def get_device_power(device_id):
     time_range = request.args.get("time_range", "minutely")
 
     with db.get_session() as session:
-        device = session.query(Device).filter_by(device_id=device_id).first()
-        if not device:
+        # Verify the device exists and belongs to the current user
+        owner = device_owner(session, device_id)
+        if owner is None:
             app.logger.error(f"Device {device_id} not found")  # Debug log
             return jsonify({"error": "Device not found"}), 404
-
-        # Verify the device belongs to the current user
-        room = session.query(Room).filter_by(room_id=device.room_id).first()
-        profile = session.query(Profile).filter_by(profile_id=room.profile_id).first()
-        if profile.user_id != current_user.id:
+        if owner != current_user.id:
             return jsonify({"error": "Access denied"}), 403
 
         response = {}
-
-        if time_range == "minutely":
-            # Get the latest minutely consumption
-            latest_consumption = (
-                session.query(MinutelyConsumption)
-                .filter_by(device_id=device_id)
-                .order_by(MinutelyConsumption.time.desc())
+        cached = (
+            get_latest_cache().get(device_id) if time_range == "minutely" else None
+        )
+        if cached:
+            response = power_payload(time_range, *cached)
+        elif time_range in POWER_LEVELS:
+            # Get the latest consumption at the requested granularity
+            model, time_col, value_col, _ = POWER_LEVELS[time_range]
+            latest = (
+                session.query(value_col, time_col)
+                .filter(model.device_id == device_id)
+                .order_by(time_col.desc())
                 .first()
             )
-            response = {
-                "power": (
-                    float(latest_consumption.power_consumption)
-                    if latest_consumption
-                    else None
-                ),
-                "last_updated": (
-                    latest_consumption.time.isoformat() if latest_consumption else None
-                ),
-            }
-        elif time_range == "hourly":
-            # Get the latest hourly consumption
-            hourly_consumption = (
-                session.query(HourlyConsumption)
-                .filter_by(device_id=device_id)
-                .order_by(HourlyConsumption.time.desc())
-                .first()
+            response = power_payload(
+                time_range, *(latest if latest else (None, None))
             )
-            response = {
-                "hourly_average": (
-                    float(hourly_consumption.power_consumption)
-                    if hourly_consumption
-                    else None
-                ),
-                "last_updated": (
-                    hourly_consumption.time.isoformat() if hourly_consumption else None
-                ),
+
+        app.logger.debug(f"Sending response: {response}")  # Debug log
+        return jsonify(response)
+
+
+def query_time(name, default):
+    """
+    ISO 8601 query argument as a naive local datetime, like the stored times;
+    values with a UTC offset are converted. Raises ValueError if malformed.
+    """
+    if name not in request.args:
+        return default
+    value = datetime.fromisoformat(request.args[name])
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+@app.route("/api/device/<int:device_id>/series")
+@login_required
+def get_device_series(device_id):
+    """
+    Consumption history for start <= time < end (ISO 8601, local time unless
+    an offset is given; default: last 24h), read from the coarsest level that
+    fits and downsampled to <= points points.
+    """
+    try:
+        end = query_time("end", datetime.now())
+        start = query_time("start", end - timedelta(days=1))
+        points = int(request.args.get("points", 500))
+    except ValueError:
+        return jsonify({"error": "Invalid start, end or points"}), 400
+    if start >= end or points < 1:
+        return jsonify({"error": "Invalid start, end or points"}), 400
+
+    with db.get_session() as session:
+        # Verify the device exists and belongs to the current user
+        owner = device_owner(session, device_id)
+        if owner is None:
+            return jsonify({"error": "Device not found"}), 404
+        if owner != current_user.id:
+            return jsonify({"error": "Access denied"}), 403
+
+        level, series = device_series(session, device_id, start, end, points)
+        return jsonify(
+            {
+                "device_id": device_id,
+                "level": level,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "points": series,
             }
-        elif time_range == "daily":
-            # Get the latest daily consumption
-            daily_consumption = (
-                session.query(DeviceDailyConsumption)
-                .filter_by(device_id=device_id)
-                .order_by(DeviceDailyConsumption.date.desc())
-                .first()
-            )
-            response = {
-                "daily_average": (
-                    float(daily_consumption.daily_average)
-                    if daily_consumption
-                    else None
-                ),
-                "last_updated": (
-                    daily_consumption.date.isoformat() if daily_consumption else None
-                ),
+        )
+
+
+@app.route("/api/device/<int:device_id>/energy")
+@login_required
+def get_device_energy(device_id):
+    """
+    kWh and estimated cost for start <= time < end (ISO 8601, rounded down to
+    the hour; default: the last 24 closed hours), from the energy counters.
+    """
+    try:
+        end = query_time("end", datetime.now()).replace(
+            minute=0, second=0, microsecond=0
+        )
+        start = query_time("start", end - timedelta(days=1)).replace(
+            minute=0, second=0, microsecond=0
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid start or end"}), 400
+    if start > end:
+        return jsonify({"error": "Invalid start or end"}), 400
+
+    with db.get_session() as session:
+        # Verify the device exists and belongs to the current user
+        owner = device_owner(session, device_id)
+        if owner is None:
+            return jsonify({"error": "Device not found"}), 404
+        if owner != current_user.id:
+            return jsonify({"error": "Access denied"}), 403
+
+        kwh, cost = energy_between(session, [device_id], start, end)[device_id]
+        return jsonify(
+            {
+                "device_id": device_id,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "kwh": kwh,
+                "cost": cost,
             }
-        elif time_range == "weekly":
-            # Get the latest weekly consumption
-            weekly_consumption = (
-                session.query(DeviceWeeklyConsumption)
-                .filter_by(device_id=device_id)
-                .order_by(DeviceWeeklyConsumption.date.desc())
-                .first()
-            )
-            response = {
-                "weekly_average": (
-                    float(weekly_consumption.weekly_average)
-                    if weekly_consumption
-                    else None
+        )
+
+
+@app.route("/api/device/<int:device_id>/poll-stats")
+@login_required
+def get_device_poll_stats(device_id):
+    """The collector's adaptive polling state for one device (mode, failures, ...)."""
+    with db.get_session() as session:
+        # Verify the device exists and belongs to the current user
+        owner = device_owner(session, device_id)
+        if owner is None:
+            return jsonify({"error": "Device not found"}), 404
+        if owner != current_user.id:
+            return jsonify({"error": "Access denied"}), 403
+
+    try:
+        stats = fetch_poll_stats([device_id]).get(device_id)
+    except Exception as e:
+        app.logger.debug(f"Collector poll stats unavailable: {e}")
+        return jsonify({"error": "Collector not reachable"}), 503
+    return jsonify({"device_id": device_id, "poll": stats})
+
+
+def group_totals(session, level, profile_id, room_ids):
+    """
+    ({room_id: watts}, profile watts) of the profile's latest closed `level`
+    bucket, from the pre-aggregated group rollups (one row per room).
+    """
+    latest = (
+        select(func.max(GroupConsumption.bucket))
+        .where(
+            GroupConsumption.scope == "profile",
+            GroupConsumption.scope_id == profile_id,
+            GroupConsumption.level == level,
+        )
+        .scalar_subquery()
+    )
+    rows = session.execute(
+        select(
+            GroupConsumption.scope,
+            GroupConsumption.scope_id,
+            GroupConsumption.power_consumption,
+        ).where(
+            GroupConsumption.level == level,
+            GroupConsumption.bucket == latest,
+            or_(
+                and_(
+                    GroupConsumption.scope == "profile",
+                    GroupConsumption.scope_id == profile_id,
                 ),
-                "last_updated": (
-                    weekly_consumption.date.isoformat() if weekly_consumption else None
+                and_(
+                    GroupConsumption.scope == "room",
+                    GroupConsumption.scope_id.in_(room_ids),
                 ),
-            }
+            ),
+        )
+    ).all()
+    rooms, total = {}, None
+    for scope, scope_id, value in rows:
+        if scope == "profile":
+            total = value
+        else:
+            rooms[scope_id] = value
+    return rooms, total
+
+
+@app.route("/api/device/<int:device_id>/anomalies")
+@login_required
+def get_device_anomalies(device_id):
+    """Recent abnormal readings of one device detected by the collector, newest first."""
+    with db.get_session() as session:
+        # Verify the device exists and belongs to the current user
+        owner = device_owner(session, device_id)
+        if owner is None:
+            return jsonify({"error": "Device not found"}), 404
+        if owner != current_user.id:
+            return jsonify({"error": "Access denied"}), 403
+
+    try:
+        events = fetch_anomalies([device_id])
+    except Exception as e:
+        app.logger.debug(f"Collector anomalies unavailable: {e}")
+        return jsonify({"error": "Collector not reachable"}), 503
+    return jsonify({"device_id": device_id, "anomalies": events})
+
+
+@app.route("/api/profile/<int:profile_id>/power")
+@login_required
+def get_profile_power(profile_id):
+    """
+    Latest reading of every device in a profile, plus per-room totals, from a
+    single joined query (ownership check included). Minutely readings come from
+    the latest-reading cache; only the devices it misses are read from the
+    database.
+    Hourly/daily/weekly room and profile totals are those of the latest closed
+    bucket, read from the group rollups.
+    """
+    time_range = request.args.get("time_range", "minutely")
+    if time_range not in POWER_LEVELS:
+        return jsonify({"error": "Invalid time range"}), 400
+    model, time_col, value_col, _ = POWER_LEVELS[time_range]
+
+    with db.get_session() as session:
+        owned = (
+            select(Room.room_id, Device.device_id)
+            .select_from(Profile)
+            .outerjoin(Room, Room.profile_id == Profile.profile_id)
+            .outerjoin(Device, Device.room_id == Room.room_id)
+            .where(Profile.profile_id == profile_id, Profile.user_id == current_user.id)
+        )
+        cached = {}
+        if time_range == "minutely":
+            # Device list only; readings come from the latest-reading cache
+            rows = session.execute(owned).all()
+            device_ids = [device_id for _, device_id in rows if device_id is not None]
+            cached = get_latest_cache().get_many(device_ids)
+            missing = [device_id for device_id in device_ids if device_id not in cached]
+            if missing:
+                # unreachable for longer than the cache TTL, or no cache
+                cached.update(latest_readings(session, time_range, missing))
+        else:
+            profile_devices = (
+                select(Device.device_id)
+                .join(Room, Room.room_id == Device.room_id)
+                .where(Room.profile_id == profile_id)
+            )
+            latest = (
+                select(model.device_id, func.max(time_col).label("latest"))
+                .where(model.device_id.in_(profile_devices))
+                .group_by(model.device_id)
+                .subquery()
+            )
+            rows = session.execute(
+                owned.add_columns(value_col, time_col)
+                .outerjoin(latest, latest.c.device_id == Device.device_id)
+                .outerjoin(
+                    model,
+                    and_(
+                        model.device_id == Device.device_id,
+                        time_col == latest.c.latest,
+                    ),
+                )
+            ).all()
+        if not rows:
+            return jsonify({"error": "Profile not found"}), 404
+
+        devices, rooms = {}, {}
+        for room_id, device_id, *reading in rows:
+            if room_id is None:
+                continue
+            rooms.setdefault(room_id, 0.0)
+            if device_id is None:
+                continue
+            value, last_updated = cached.get(device_id) or reading or (None, None)
+            devices[device_id] = power_payload(time_range, value, last_updated)
+            rooms[room_id] += float(value or 0.0)
+
+        total = sum(rooms.values())
+        if time_range != "minutely":
+            group_rooms, group_total = group_totals(
+                session, time_range, profile_id, list(rooms)
+            )
+            if group_total is not None:
+                rooms = {room_id: group_rooms.get(room_id, 0.0) for room_id in rooms}
+                total = group_total
+
+        return jsonify(
+            {"time_range": time_range, "devices": devices, "rooms": rooms, "total": total}
+        )
 
-        app.logger.debug(f"Sending response: {response}")  # Debug log
-        return jsonify(response)
+
+@app.route("/api/profile/<int:profile_id>/stream")
+@login_required
+def stream_profile_power(profile_id):
+    """
+    Server-Sent Events: pushes the profile's minutely readings as they are
+    collected. 503 when no collector publishes to a latest-reading cache on
+    this host; the page then keeps polling /api/profile/<id>/power.
+    """
+    if not get_latest_cache().available():
+        return jsonify({"error": "Live readings unavailable"}), 503
+    with db.get_session() as session:
+        rows = session.execute(
+            select(Profile.profile_id, Device.device_id, Room.room_id)
+            .select_from(Profile)
+            .outerjoin(Room, Room.profile_id == Profile.profile_id)
+            .outerjoin(Device, Device.room_id == Room.room_id)
+            .where(Profile.profile_id == profile_id, Profile.user_id == current_user.id)
+        ).all()
+    if not rows:
+        return jsonify({"error": "Profile not found"}), 404
+
+    broadcaster = get_broadcaster()
+    subscription = broadcaster.subscribe(
+        {device_id: room_id for _, device_id, room_id in rows if device_id is not None}
+    )
+    return Response(
+        stream_with_context(broadcaster.stream(subscription)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/profile/add", methods=["POST"])
@@ -276,6 +579,7 @@ def add_profile():
         new_profile = Profile(name=name, user_id=current_user.id)
         session.add(new_profile)
         session.commit()  # Explicit commit for write operations
+        profile_owners.put(new_profile.profile_id, current_user.id)
         return jsonify({"success": True, "profile_id": new_profile.profile_id})
 
 
@@ -291,19 +595,14 @@ def add_room():
 
         # Verify the profile belongs to the current user
         with db.get_session() as session:
-            profile = (
-                session.query(Profile)
-                .filter_by(profile_id=profile_id, user_id=current_user.id)
-                .first()
-            )
-
-            if not profile:
+            if profile_owner(session, int(profile_id)) != current_user.id:
                 return jsonify({"error": "Profile not found"}), 404
 
             # Create new room
             new_room = Room(name=name, profile_id=profile_id)
             session.add(new_room)
             session.commit()
+            room_owners.put(new_room.room_id, current_user.id)
 
             # Check if request wants JSON response
             if request.headers.get("X-Requested-With") == "XMLHttpRequest":
@@ -330,19 +629,11 @@ def add_device():
             return jsonify({"error": "All fields are required"}), 400
 
         with db.get_session() as session:
-            # First get the room to verify it exists and get its profile_id
-            room = session.query(Room).filter_by(room_id=room_id).first()
-            if not room:
+            # Verify the room exists and belongs to the current user
+            owner = room_owner(session, int(room_id))
+            if owner is None:
                 return jsonify({"error": "Room not found"}), 404
-
-            # Verify the room belongs to the current user through the profile
-            profile = (
-                session.query(Profile)
-                .filter_by(profile_id=room.profile_id, user_id=current_user.id)
-                .first()
-            )
-
-            if not profile:
+            if owner != current_user.id:
                 return jsonify({"error": "Access denied"}), 403
 
             # Create new device
@@ -355,57 +646,32 @@ def add_device():
             )
             session.add(new_device)
             session.commit()
+            device_owners.put(new_device.device_id, current_user.id)
 
             # Check if request wants JSON response
             if request.headers.get("X-Requested-With") == "XMLHttpRequest":
                 return jsonify({"success": True, "device_id": new_device.device_id})
             else:
                 # Regular form submission - redirect back to profile page
-                return redirect(url_for("profile_view", profile_id=room.profile_id))
+                return redirect(
+                    url_for("profile_view", profile_id=new_device.room.profile_id)
+                )
 
     except Exception as e:
         app.logger.error(f"Error adding device: {str(e)}")
         return jsonify({"error": "Failed to add device"}), 500
 
 
-def fetch_shelly_power(device_url):
+def fetch_shelly_power(device_url, generation=None):
     try:
-        # Attempt Gen 2 (RPC)
-        response = requests.get(f"{device_url}/rpc/Shelly.GetStatus", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("switch:0", {}).get("apower", 0.0)
-
-        # If 404, attempt Gen 1
-        if response.status_code == 404:
-            response = requests.get(f"{device_url}/status", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("meters", [{}])[0].get("power", 0.0)
-
-        return None
+        return get_device_client().get_power(device_url, generation)
     except requests.exceptions.RequestException:
         return None
 
 
-def toggle_shelly_device(device_url, turn_on):
+def toggle_shelly_device(device_url, turn_on, generation=None):
     try:
-        # Attempt Gen 2 (RPC)
-        response = requests.post(
-            f"{device_url}/rpc/Switch.Set", json={"id": 0, "on": turn_on}, timeout=5
-        )
-        if response.status_code == 200:
-            return True
-
-        # If 404, attempt Gen 1
-        if response.status_code == 404:
-            response = requests.get(
-                f"{device_url}/relay/0?turn={'on' if turn_on else 'off'}", timeout=5
-            )
-            if response.status_code == 200:
-                return True
-
-        return False
+        return get_device_client().set_switch(device_url, turn_on, generation)
     except requests.exceptions.RequestException:
         return False
 
@@ -418,20 +684,22 @@ def toggle_device(device_id):
         return jsonify({"success": False, "error": "Invalid action"}), 400
 
     with db.get_session() as session:
-        device = session.query(Device).filter_by(device_id=device_id).first()
-        if not device:
+        # Verify the device exists and belongs to the current user
+        owner = device_owner(session, device_id)
+        if owner is None:
             return jsonify({"success": False, "error": "Device not found"}), 404
-
-        # Verify the device belongs to the current user
-        room = session.query(Room).filter_by(room_id=device.room_id).first()
-        profile = session.query(Profile).filter_by(profile_id=room.profile_id).first()
-        if profile.user_id != current_user.id:
+        if owner != current_user.id:
             return jsonify({"success": False, "error": "Access denied"}), 403
 
+        device = session.get(Device, device_id)
+
         # Try to toggle the device
-        success = toggle_shelly_device(device.device_url, action == "on")
+        success = toggle_shelly_device(
+            device.device_url, action == "on", device.api_generation
+        )
         if success:
             device.status = "ON" if action == "on" else "OFF"
+            device.api_generation = get_device_client().generation(device.device_url)
             session.commit()
             return jsonify({"success": True, "status": device.status})
         else:
@@ -446,5 +714,20 @@ def toggle_device(device_id):
             )
 
 
+def create_app(run_migrations=True):
+    """
+    Server entry point (e.g. gunicorn "main_web_app:create_app()").
+    Importing this module does not touch the database; startup work happens here.
+    """
+    logging.basicConfig(level=logging.INFO)
+    if run_migrations:
+        # Create missing tables / apply pending schema migrations
+        try:
+            migrate()
+        except Exception as e:
+            app.logger.error(f"Error migrating database schema: {e}")
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
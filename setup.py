@@ -12,4 +12,9 @@ setup(
         "flask",
         "flask-login",
     ],
+    extras_require={
+        "archive": ["pyarrow"],
+        "backfill": ["numpy"],
+        "test": ["pytest"],
+    },
 )
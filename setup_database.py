@@ -2,14 +2,23 @@ import mysql.connector
 from mysql.connector import Error
 import os
 from dotenv import load_dotenv
-from device_data_collector.db import db
-from device_data_collector.models import Base
+from device_data_collector.db import DB_BACKEND
+from device_data_collector.migrations import migrate
 
 # Load environment variables
 load_dotenv()
 
 
 def setup_database():
+    if DB_BACKEND == "sqlite":
+        # Embedded mode: the file is created on first connect
+        try:
+            print(f"Database schema is at version {migrate()}.")
+            return True
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return False
+
     # Get credentials from environment variables
     DB_USERNAME = os.getenv("DB_USERNAME", "root")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "")
@@ -29,15 +38,12 @@ def setup_database():
         if connection.is_connected():
             cursor = connection.cursor()
 
-            # Drop the database if it exists
-            cursor.execute(f"DROP DATABASE IF EXISTS {DB_NAME}")
-            print(f"Database '{DB_NAME}' dropped if it existed.")
-
-            # Create database with proper character set
+            # Create database with proper character set (existing data is kept)
             cursor.execute(
-                f"CREATE DATABASE {DB_NAME} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+                f"CREATE DATABASE IF NOT EXISTS {DB_NAME} "
+                "CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
             )
-            print(f"Database '{DB_NAME}' created successfully.")
+            print(f"Database '{DB_NAME}' is ready.")
 
             # Select the database
             cursor.execute(f"USE {DB_NAME}")
@@ -48,12 +54,10 @@ def setup_database():
             connection.close()
             print("MySQL connection closed.")
 
-            # Create tables using SQLAlchemy
-            print("\nCreating database tables...")
-
-            # Create all tables
-            Base.metadata.create_all(db.engine)
-            print("Database tables created successfully!")
+            # Create or upgrade tables through the versioned migrations
+            print("\nApplying schema migrations...")
+            version = migrate()
+            print(f"Database schema is at version {version}.")
 
             return True
 
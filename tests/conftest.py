@@ -0,0 +1,83 @@
+"""
+Shared fixtures: every test gets its own SQLite database file (the embedded
+DB_BACKEND), migrated to the latest schema, so no MySQL server is needed.
+"""
+import pytest
+from sqlalchemy import event
+
+import main_web_app
+
+from device_data_collector import auth_cache, latest_cache
+from device_data_collector.db import db
+from device_data_collector.data_processor import scheduler
+from device_data_collector.migrations import migrate
+from device_data_collector.models import User, Profile, Room, Device
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """
+    The process-wide db handler pointed at a fresh, migrated SQLite file, with
+    empty process-wide caches (the latest-reading cache in tmp_path too).
+    """
+    db.configure(f"sqlite:///{tmp_path / 'test.db'}")
+    migrate()
+    scheduler._last_boundary.clear()
+    for cache in (
+        auth_cache.device_owners,
+        auth_cache.room_owners,
+        auth_cache.profile_owners,
+        auth_cache.users,
+    ):
+        cache.clear()
+    latest_cache._cache = latest_cache.MmapLatestCache(path=str(tmp_path / "latest.bin"))
+    yield db
+    latest_cache._cache = None
+    db.dispose()
+
+
+@pytest.fixture
+def statements(sqlite_db):
+    """(sql, parameters) of every statement sent to the database, in order."""
+    sent = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        sent.append((statement, parameters))
+
+    event.listen(sqlite_db.engine, "before_cursor_execute", record)
+    yield sent
+    event.remove(sqlite_db.engine, "before_cursor_execute", record)
+
+
+def add_user(session, devices=1, email="user@example.com"):
+    """A user with one profile and room holding `devices` devices; returns them."""
+    user = User(user_name="user", email=email, password="unused")
+    session.add(user)
+    session.flush()
+    profile = Profile(name="home", user_id=user.user_id)
+    session.add(profile)
+    session.flush()
+    room = Room(name="room", profile_id=profile.profile_id)
+    session.add(room)
+    session.flush()
+    added = [
+        Device(
+            name=f"device {number}",
+            device_url=f"http://127.0.0.1/{number}",
+            type="TV",
+            room_id=room.room_id,
+        )
+        for number in range(devices)
+    ]
+    session.add_all(added)
+    session.flush()
+    return user, profile, room, added
+
+
+def login(email="user@example.com"):
+    """A web app test client logged in as the add_user() user with `email`."""
+    main_web_app.app.config["TESTING"] = True
+    client = main_web_app.app.test_client()
+    response = client.post("/login", data={"email": email, "password": "unused"})
+    assert response.status_code == 302
+    return client
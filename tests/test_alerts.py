@@ -0,0 +1,152 @@
+"""
+Alert rules and dispatch: deduplication, long runs across unreachable sweeps,
+the per-user rate limit, anomaly events, failing sinks, and a submit() that
+never waits on the dispatcher.
+"""
+import time
+from datetime import datetime, timedelta
+import pytest
+
+from device_data_collector.alerts import AlertDispatcher, EmailFileSink
+
+from conftest import add_user
+
+T0 = datetime(2026, 10, 5, 8, 0)
+
+
+class ListSink:
+    def __init__(self):
+        self.batches = []
+
+    def deliver(self, alerts):
+        self.batches.append(list(alerts))
+
+    @property
+    def alerts(self):
+        return [alert for batch in self.batches for alert in batch]
+
+
+class BrokenSink:
+    def deliver(self, alerts):
+        raise ConnectionError("relay down")
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=10)
+        return [device.device_id for device in devices]
+
+
+def sweep(dispatcher, minute, readings):
+    dispatcher.process(("sweep", T0 + timedelta(minutes=minute), readings))
+
+
+def test_repeated_over_power_alerts_once_per_window(device_ids):
+    sink = ListSink()
+    dispatcher = AlertDispatcher(sinks=[sink], dedup_seconds=3600)
+    device_id = device_ids[0]
+    for minute in range(60):
+        sweep(dispatcher, minute, {device_id: 3500.0})
+    sweep(dispatcher, 60, {device_id: 3500.0})  # a new window
+    dispatcher.flush()
+
+    assert [alert["time"] for alert in sink.alerts] == [
+        T0.isoformat(),
+        (T0 + timedelta(hours=1)).isoformat(),
+    ]
+    assert sink.alerts[0]["rule"] == "over_power"
+    assert sink.alerts[0]["email"] == "user@example.com"
+    assert dispatcher.stats["deduplicated"] == 59
+
+
+def test_long_run_survives_unreachable_sweeps(device_ids):
+    sink = ListSink()
+    dispatcher = AlertDispatcher(sinks=[sink], max_on_hours=1)
+    device_id = device_ids[0]
+    for minute in range(0, 50, 10):
+        sweep(dispatcher, minute, {device_id: 80.0})
+    sweep(dispatcher, 50, {device_id: None})
+    sweep(dispatcher, 61, {device_id: 80.0})
+    dispatcher.flush()
+    assert [alert["rule"] for alert in sink.alerts] == ["long_run"]
+
+    sweep(dispatcher, 70, {device_ids[1]: 80.0})
+    sweep(dispatcher, 71, {device_ids[1]: 0.0})  # switched off: the run ends
+    sweep(dispatcher, 140, {device_ids[1]: 80.0})
+    dispatcher.flush()
+    assert len(sink.alerts) == 1
+
+
+def test_user_rate_limit(device_ids):
+    sink = ListSink()
+    dispatcher = AlertDispatcher(
+        sinks=[sink], dedup_seconds=0, user_burst=5, user_rate=60
+    )
+    readings = {device_id: 3500.0 for device_id in device_ids}
+    sweep(dispatcher, 0, readings)
+    assert dispatcher.stats["rate_limited"] == 5
+    # one token per minute: two minutes later two more alerts get through
+    sweep(dispatcher, 2, readings)
+    dispatcher.flush()
+    assert len(sink.alerts) == 7
+    assert dispatcher.stats["rate_limited"] == 13
+
+
+def test_anomaly_events_are_alerts(device_ids):
+    sink = ListSink()
+    dispatcher = AlertDispatcher(sinks=[sink])
+    event = {
+        "device_id": device_ids[0],
+        "time": T0.isoformat(),
+        "power": 900.0,
+        "expected": 100.0,
+        "std": 5.0,
+        "kind": "high",
+        "baseline": "hour_of_week",
+    }
+    dispatcher.process(("anomalies", None, [event, dict(event)]))
+    dispatcher.flush()
+    assert len(sink.alerts) == 1
+    assert sink.alerts[0]["rule"] == "anomaly"
+    assert "unusually high" in sink.alerts[0]["message"]
+
+
+def test_failing_sink_does_not_block_the_others(device_ids):
+    sink = ListSink()
+    dispatcher = AlertDispatcher(sinks=[BrokenSink(), sink], batch_size=2)
+    sweep(dispatcher, 0, {device_id: 3500.0 for device_id in device_ids[:3]})
+    dispatcher.flush()
+    assert [len(batch) for batch in sink.batches] == [2, 1]
+    assert dispatcher.stats["failed"] == 3
+    assert dispatcher.stats["delivered"] == 3
+
+
+def test_submit_never_waits(device_ids):
+    dispatcher = AlertDispatcher(sinks=[ListSink()], queue_size=2)
+    readings = {device_id: 3500.0 for device_id in device_ids}
+    started = time.perf_counter()
+    for minute in range(5):  # the dispatcher thread is not running
+        dispatcher.submit(T0 + timedelta(minutes=minute), readings)
+    assert time.perf_counter() - started < 0.1
+    assert dispatcher.stats["dropped"] == 3
+
+
+def test_dispatcher_thread_writes_one_email_per_user(sqlite_db, tmp_path):
+    with sqlite_db.get_session() as session:
+        device_ids = [
+            device.device_id
+            for email in ("a@example.com", "b@example.com")
+            for device in add_user(session, devices=2, email=email)[3]
+        ]
+    dispatcher = AlertDispatcher(
+        sinks=[EmailFileSink(str(tmp_path / "mail"))], batch_seconds=60
+    ).start()
+    dispatcher.submit(T0, {device_id: 3500.0 for device_id in device_ids})
+    dispatcher.stop()  # delivers what is pending
+
+    messages = sorted(path.read_text() for path in (tmp_path / "mail").glob("*.eml"))
+    assert len(messages) == 2
+    assert "To: a@example.com" in messages[0]
+    assert "Subject: 2 device alerts" in messages[0]
+    assert not list((tmp_path / "mail").glob("*.tmp"))
@@ -0,0 +1,183 @@
+"""
+Synthetic-anomaly tests: devices with a daily usage pattern plus noise, and
+spikes/drop-outs injected at known times, must be found by the streaming
+detector without a flood of false positives; abnormal days must be flagged
+when their buckets close.
+"""
+import random
+from datetime import datetime, date, timedelta
+from sqlalchemy import select, insert, func
+
+from device_data_collector.anomaly import AnomalyDetector, flag_closed_buckets
+from device_data_collector.data_collector import DeviceList
+from device_data_collector.models import DeviceDailyConsumption
+
+from conftest import add_user
+
+START = datetime(2026, 9, 7)  # a Monday
+STEP = timedelta(minutes=10)
+SWEEPS_PER_WEEK = 7 * 24 * 6
+
+
+def usual_power(device_id, when, rng):
+    """Higher in the evening, device-specific level, Gaussian noise."""
+    level = 50 + 10 * device_id
+    evening = 80 if 18 <= when.hour < 23 else 0
+    return max(level + evening + rng.gauss(0, 5), 0.0)
+
+
+def run_detector(detector, devices, weeks, first=0, injected=None, seed=1):
+    """
+    Feed `weeks` of sweeps starting with sweep number `first`; injected maps
+    (device_id, sweep number) to the watts reported instead. Returns the
+    number of the next sweep.
+    """
+    rng = random.Random(seed)
+    injected = injected or {}
+    for number in range(first, first + weeks * SWEEPS_PER_WEEK):
+        when = START + number * STEP
+        detector.record(
+            when,
+            {
+                device_id: injected.get(
+                    (device_id, number), usual_power(device_id, when, rng)
+                )
+                for device_id in devices
+            },
+        )
+    return first + weeks * SWEEPS_PER_WEEK
+
+
+def test_injected_spikes_and_dropouts_are_found():
+    devices = range(1, 21)
+    detector = AnomalyDetector(min_samples=5, events_kept=10000)
+    trained = run_detector(detector, devices, weeks=2)
+    detector.events.clear()
+
+    rng = random.Random(7)
+    injected = {}
+    while len(injected) < 60:
+        number = trained + rng.randrange(SWEEPS_PER_WEEK)
+        injected[rng.choice(devices), number] = rng.choice([0.0, 1500.0])
+    run_detector(detector, devices, weeks=1, first=trained, injected=injected, seed=2)
+
+    found = {
+        (event["device_id"], datetime.fromisoformat(event["time"]))
+        for event in detector.events
+    }
+    expected = {
+        (device_id, START + number * STEP) for device_id, number in injected
+    }
+    assert len(found & expected) / len(expected) >= 0.95
+    assert len(found - expected) <= 3  # out of 20 devices x 1008 sweeps
+    kinds = {
+        event["kind"]
+        for event in detector.events
+        if (event["device_id"], datetime.fromisoformat(event["time"])) in expected
+    }
+    assert kinds == {"high", "low"}
+
+
+def test_sustained_anomaly_is_reported_once():
+    detector = AnomalyDetector(min_samples=5)
+    trained = run_detector(detector, [1], weeks=1)
+    detector.events.clear()
+    received = []
+    detector.add_listener(received.extend)
+    for number in range(6):
+        detector.record(START + (trained + number) * STEP, {1: 2000.0})
+    assert len(detector.events) == 1
+    assert received == list(detector.events)
+    assert detector.recent([1])[0]["kind"] == "high"
+
+
+def test_failing_listener_does_not_stop_detection():
+    detector = AnomalyDetector(min_samples=5)
+    trained = run_detector(detector, [1], weeks=1)
+
+    def broken(events):
+        raise RuntimeError("listener bug")
+
+    detector.add_listener(broken)
+    detector.record(START + trained * STEP, {1: 2000.0, 2: None})
+    assert detector.recent([1])
+
+
+def test_removed_devices_are_forgotten(sqlite_db):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=2)
+        kept = [device.device_id for device in devices]
+    removed = max(kept) + 1
+    detector = AnomalyDetector(min_samples=5)
+    trained = run_detector(detector, kept + [removed], weeks=1)
+
+    device_list = DeviceList(interval=300)
+    device_list.add_listener(detector.forget)
+    device_list.devices()
+    assert sorted(detector._stats) == kept
+
+    # a device id seen again starts from scratch: no baseline, no alarm yet
+    detector.events.clear()
+    detector.record(START + trained * STEP, {removed: 2000.0})
+    assert list(detector.events) == []
+
+
+def add_daily(session, values):
+    session.execute(
+        insert(DeviceDailyConsumption),
+        [
+            {
+                "device_id": device_id,
+                "date": day,
+                "daily_average": value,
+                "status": "regular",
+            }
+            for (device_id, day), value in values.items()
+        ],
+    )
+
+
+def test_abnormal_days_are_flagged_when_closed(sqlite_db):
+    rng = random.Random(3)
+    closed = date(2026, 9, 21)
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=3)
+        device_ids = [device.device_id for device in devices]
+        add_daily(
+            session,
+            {
+                (device_id, closed - timedelta(days=days)): 100 + rng.gauss(0, 4)
+                for device_id in device_ids
+                for days in range(1, 21)
+            },
+        )
+        after_id = session.scalar(select(func.max(DeviceDailyConsumption.consumption_id)))
+        add_daily(
+            session,
+            {
+                (device_ids[0], closed): 400.0,
+                (device_ids[1], closed): 5.0,
+                (device_ids[2], closed): 103.0,
+            },
+        )
+
+    with sqlite_db.get_session() as session:
+        assert flag_closed_buckets(session, "daily", after_id) == 2
+    with sqlite_db.get_session() as session:
+        statuses = dict(
+            session.execute(
+                select(DeviceDailyConsumption.device_id, DeviceDailyConsumption.status)
+                .where(DeviceDailyConsumption.date == closed)
+            ).all()
+        )
+        history = session.scalars(
+            select(DeviceDailyConsumption.status).where(
+                DeviceDailyConsumption.date < closed
+            )
+        ).all()
+    assert statuses == {
+        device_ids[0]: "high",
+        device_ids[1]: "low",
+        device_ids[2]: "regular",
+    }
+    assert set(history) == {"regular"}
@@ -0,0 +1,109 @@
+"""
+Archive tier: closed months moved to Parquet read back through read_series()
+exactly as they were in the database, and archiving again (e.g. after a late
+backfill into an archived month) merges into the files without duplicates.
+"""
+from datetime import datetime, date, timedelta
+import pytest
+from sqlalchemy import select, insert, func
+
+from device_data_collector.archive import archive_level, archive_path, read_series
+from device_data_collector.models import HourlyConsumption, DeviceDailyConsumption
+
+from conftest import add_user
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+NOW = datetime(2026, 10, 15, 12, 0)  # archives months before July
+FIRST = datetime(2026, 5, 1)
+START, END = datetime(2026, 4, 1), datetime(2026, 10, 1)
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    """Two devices with an hourly row every 6 hours and a daily row per day."""
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=2)
+        ids = [device.device_id for device in devices]
+        days = (NOW - FIRST).days
+        session.execute(
+            insert(HourlyConsumption),
+            [
+                {
+                    "device_id": device_id,
+                    "time": FIRST + timedelta(hours=hour),
+                    "power_consumption": float(device_id * 1000 + hour % 500),
+                }
+                for device_id in ids
+                for hour in range(0, days * 24, 6)
+            ],
+        )
+        session.execute(
+            insert(DeviceDailyConsumption),
+            [
+                {
+                    "device_id": device_id,
+                    "date": FIRST.date() + timedelta(days=day),
+                    "daily_average": float(device_id * 100 + day),
+                }
+                for device_id in ids
+                for day in range(days)
+            ],
+        )
+        return ids
+
+
+def series(sqlite_db, level, device_id, root):
+    with sqlite_db.get_session() as session:
+        return read_series(session, level, device_id, START, END, root)
+
+
+def db_rows(sqlite_db, model, time_col, before):
+    with sqlite_db.get_session() as session:
+        return session.scalar(
+            select(func.count()).select_from(model).where(time_col < before)
+        )
+
+
+def test_archived_series_read_back_unchanged(sqlite_db, device_ids, tmp_path):
+    root = str(tmp_path)
+    expected = {
+        (level, device_id): series(sqlite_db, level, device_id, root)
+        for level in ("hourly", "daily")
+        for device_id in device_ids
+    }
+
+    assert archive_level("hourly", NOW, root) == 2 * 2  # May and June per device
+    assert archive_level("daily", NOW, root) == 2 * 2
+    for (level, device_id), points in expected.items():
+        assert series(sqlite_db, level, device_id, root) == points
+
+    july = datetime(2026, 7, 1)
+    daily = DeviceDailyConsumption
+    assert db_rows(sqlite_db, HourlyConsumption, HourlyConsumption.time, july) == 0
+    assert db_rows(sqlite_db, daily, daily.date, july.date()) == 0
+    # July onwards is still in the database
+    assert db_rows(sqlite_db, HourlyConsumption, HourlyConsumption.time, END) > 0
+    assert archive_level("hourly", NOW, root) == 0
+
+
+def test_rearchiving_merges_without_duplicates(sqlite_db, device_ids, tmp_path):
+    root = str(tmp_path)
+    device_id = device_ids[0]
+    archive_level("daily", NOW, root)
+    path = archive_path("daily", device_id, date(2026, 6, 1), root)
+    assert pq.read_metadata(path).num_rows == 30
+
+    # a backfill rewrites an archived day and the archive step runs again
+    with sqlite_db.get_session() as session:
+        session.execute(
+            insert(DeviceDailyConsumption).values(
+                device_id=device_id, date=date(2026, 6, 10), daily_average=-1.0
+            )
+        )
+    assert archive_level("daily", NOW, root) == 1
+    assert pq.read_metadata(path).num_rows == 30
+
+    points = dict(series(sqlite_db, "daily", device_id, root))
+    assert points[date(2026, 6, 10)] == -1.0
+    assert points[date(2026, 6, 11)] == float(device_id * 100 + 41)
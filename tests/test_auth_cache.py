@@ -0,0 +1,54 @@
+"""
+Ownership/user caching of the web app: repeated requests for a device cost
+only the data query, and moving or deleting a device is seen immediately.
+"""
+import pytest
+
+from device_data_collector.models import Device
+
+from conftest import add_user, login
+
+
+@pytest.fixture
+def owned(sqlite_db):
+    """(device_id, other user's room_id); the client is logged in as the owner."""
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=2)
+        _, _, other_room, _ = add_user(session, devices=0, email="other@example.com")
+        return devices[0].device_id, other_room.room_id
+
+
+@pytest.fixture
+def client(sqlite_db, owned):
+    return login()
+
+
+def power(client, device_id):
+    return client.get(f"/api/device/{device_id}/power?time_range=hourly")
+
+
+def test_repeated_requests_only_query_the_reading(client, owned, statements):
+    device_id, _ = owned
+    assert power(client, device_id).status_code == 200  # fills the caches
+    statements.clear()
+    for _ in range(10):
+        assert power(client, device_id).status_code == 200
+    selects = [sql for sql, _ in statements if sql.lstrip().startswith("SELECT")]
+    assert len(selects) == 10, selects
+    assert all("hourly_consumptions" in sql for sql in selects), selects
+
+
+def test_reparented_device_is_not_served_from_cache(sqlite_db, client, owned):
+    device_id, other_room_id = owned
+    assert power(client, device_id).status_code == 200
+    with sqlite_db.get_session() as session:
+        session.get(Device, device_id).room_id = other_room_id
+    assert power(client, device_id).status_code == 403
+
+
+def test_deleted_device_is_not_served_from_cache(sqlite_db, client, owned):
+    device_id, _ = owned
+    assert power(client, device_id).status_code == 200
+    with sqlite_db.get_session() as session:
+        session.delete(session.get(Device, device_id))
+    assert power(client, device_id).status_code == 404
@@ -0,0 +1,99 @@
+"""
+Storage backends: the same migrations, sweep writes and rollups on embedded
+SQLite and on MySQL. SQLite always runs; MySQL runs when TEST_MYSQL_URL names
+a server (e.g. mysql+mysqlconnector://root:pw@localhost/), where a scratch
+database is created and dropped again.
+"""
+import os
+from datetime import datetime, date, timedelta
+import pytest
+from sqlalchemy import select, func, text
+
+from device_data_collector.db import db
+from device_data_collector.migrations import MIGRATIONS, migrate, current_version
+from device_data_collector.ingest import write_sweep
+from device_data_collector.data_processor import (
+    aggregate_hourly,
+    aggregate_daily,
+    aggregate_weekly,
+)
+from device_data_collector.models import (
+    SchemaVersion,
+    HourlyConsumption,
+    DeviceDailyConsumption,
+    DeviceWeeklyConsumption,
+)
+
+from benchmarks.common import scratch_database, add_devices
+
+MONDAY = datetime(2026, 9, 28)
+LATEST = MIGRATIONS[-1][0]
+
+BACKENDS = [
+    pytest.param(None, id="sqlite"),
+    pytest.param(
+        os.getenv("TEST_MYSQL_URL"),
+        id="mysql",
+        marks=pytest.mark.skipif(
+            not os.getenv("TEST_MYSQL_URL"), reason="TEST_MYSQL_URL not set"
+        ),
+    ),
+]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    """Backend name while db points at a freshly migrated scratch database."""
+    with scratch_database(request.param) as name:
+        yield name
+
+
+def test_migrate_reaches_latest_version(backend):
+    with db.engine.connect() as connection:
+        assert current_version(connection) == LATEST
+
+    assert migrate() == LATEST  # rerun: nothing left to apply
+    with db.get_session() as session:
+        versions = session.scalars(
+            select(SchemaVersion.version).order_by(SchemaVersion.version)
+        ).all()
+    assert versions == list(range(1, LATEST + 1))
+
+
+def test_sqlite_connections_are_tuned(backend):
+    if backend != "sqlite":
+        pytest.skip("SQLite pragmas")
+    with db.engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+
+def test_sweeps_roll_up_the_same_on_each_backend(backend):
+    device_ids = add_devices(3)
+    for minute in range(2 * 60):
+        when = MONDAY + timedelta(hours=8, minutes=minute)
+        rows = [
+            {"device_id": device_id, "power_consumption": 100.0 * number, "time": when}
+            for number, device_id in enumerate(device_ids, 1)
+        ]
+        with db.get_session() as session:
+            write_sweep(session, rows, {device_ids[0]: "ON"} if minute == 0 else {})
+
+    next_week = MONDAY + timedelta(weeks=1)
+    aggregate_hourly(next_week)
+    aggregate_daily(next_week)
+    aggregate_weekly(next_week)
+
+    with db.get_session() as session:
+        hourly = session.scalar(select(func.count()).select_from(HourlyConsumption))
+        daily = session.execute(
+            select(DeviceDailyConsumption.date, DeviceDailyConsumption.daily_average)
+            .order_by(DeviceDailyConsumption.device_id)
+        ).all()
+        weekly = session.execute(
+            select(DeviceWeeklyConsumption.date, DeviceWeeklyConsumption.weekly_average)
+            .order_by(DeviceWeeklyConsumption.device_id)
+        ).all()
+    assert hourly == 3 * 2
+    assert daily == [(date(2026, 9, 28), 100.0 * number) for number in (1, 2, 3)]
+    assert weekly == [(MONDAY, 100.0 * number) for number in (1, 2, 3)]
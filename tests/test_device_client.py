@@ -0,0 +1,86 @@
+"""
+Shared device client against the fake plug farm: after the first sweep every
+device costs one request per sweep (Gen 1 plugs included, their generation is
+cached or seeded from Device.api_generation), and a sweep reuses keep-alive
+connections instead of opening one per device.
+"""
+import pytest
+
+from device_data_collector import device_client
+from device_data_collector.device_client import DeviceClient, GEN1, GEN2
+from device_data_collector.data_collector import poll_devices
+from device_data_collector.fake_shelly import FakeShellyServer
+
+DEVICES = 40
+
+
+@pytest.fixture
+def farm():
+    with FakeShellyServer(num_devices=DEVICES, gen1_ratio=0.3) as server:
+        yield server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """A fresh process-wide client, as the collector uses it."""
+    fresh = DeviceClient(timeout=2)
+    monkeypatch.setattr(device_client, "_client", fresh)
+    yield fresh
+    fresh.session.close()
+
+
+def requests_made(farm):
+    return sum(farm.requests_by_path.values())
+
+
+def sweep(client, farm):
+    return {n: client.get_power(farm.device_url(n)) for n in range(DEVICES)}
+
+
+def test_one_request_per_device_once_generations_are_known(farm, client):
+    gen1 = [n for n in range(DEVICES) if farm.is_gen1(n)]
+    assert 0 < len(gen1) < DEVICES
+
+    first = sweep(client, farm)
+    assert all(power is not None for power in first.values())
+    # Gen 1 plugs answer the Gen 2 probe with a 404 once
+    assert requests_made(farm) == DEVICES + len(gen1)
+    generations = [client.generation(farm.device_url(n)) for n in range(DEVICES)]
+    assert [n for n, generation in enumerate(generations) if generation == GEN1] == gen1
+
+    for _ in range(3):
+        before = requests_made(farm)
+        sweep(client, farm)
+        assert requests_made(farm) - before == DEVICES
+
+
+def test_seeded_generation_skips_detection(farm, client):
+    for n in range(DEVICES):
+        client.remember(farm.device_url(n), GEN1 if farm.is_gen1(n) else GEN2)
+    sweep(client, farm)
+    assert requests_made(farm) == DEVICES
+    assert "/rpc/Shelly.GetStatus" in farm.requests_by_path
+    assert farm.requests_by_path["/status"] == sum(map(farm.is_gen1, range(DEVICES)))
+
+
+def test_replaced_plug_is_detected_again(farm, client):
+    gen2 = next(n for n in range(DEVICES) if not farm.is_gen1(n))
+    url = farm.device_url(gen2)
+    client.remember(url, GEN1)  # stale: the plug was swapped for a Gen 2 one
+    assert client.get_power(url) is not None
+    assert client.generation(url) == GEN2
+    assert client.get_power(url) is not None
+    assert requests_made(farm) == 3  # /status 404, Gen 2 status, Gen 2 status
+
+
+def test_sweeps_reuse_connections(farm, client):
+    sweep(client, farm)
+    sweep(client, farm)
+    assert farm.connections == 1  # one host, sequential calls: one keep-alive socket
+
+    targets = [(n, farm.device_url(n)) for n in range(DEVICES)]
+    for _ in range(3):
+        readings, stats = poll_devices(targets, max_workers=8, deadline=10)
+        assert stats.responded == DEVICES
+    # parallel sweeps open at most one connection per worker, then reuse them
+    assert farm.connections <= 1 + 8
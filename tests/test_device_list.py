@@ -0,0 +1,101 @@
+"""
+The collector's device list: sweeps read a list reloaded in the background
+on its own interval instead of querying the devices table every sweep, keep
+the statuses they store, and keep sweeping while the database is down.
+"""
+import pytest
+from sqlalchemy import update
+
+from device_data_collector.data_collector import DeviceList
+from device_data_collector.models import Device
+
+from conftest import add_user
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=4)
+        return [device.device_id for device in devices]
+
+
+def device_queries(statements):
+    return [sql for sql, _ in statements if "FROM devices" in sql]
+
+
+def settle(device_list):
+    """Wait for the reload in flight, if any."""
+    loading = device_list._loading
+    if loading is not None:
+        loading.join(5)
+
+
+def test_sweeps_reuse_the_loaded_list(sqlite_db, device_ids, statements):
+    device_list = DeviceList(interval=300)
+    assert [d.device_id for d in device_list.devices()] == device_ids
+    for _ in range(5):
+        device_list.devices()
+    assert len(device_queries(statements)) == 1
+
+    odd = device_list.devices(shards=[1], total_shards=2)
+    assert [d.device_id for d in odd] == [i for i in device_ids if i % 2 == 1]
+
+
+def test_stale_list_reloads_in_the_background(sqlite_db, device_ids):
+    seen = []
+    device_list = DeviceList(interval=0)
+    device_list.add_listener(seen.append)
+    device_list.devices()
+    with sqlite_db.get_session() as session:
+        _, _, _, added = add_user(session, devices=1, email="other@example.com")
+        added_id = added[0].device_id
+
+    # a stale list is returned at once while the reload runs
+    assert len(device_list.devices()) == 4
+    settle(device_list)
+    assert len(device_list.devices()) == 5
+    settle(device_list)
+    assert seen[-1] == device_ids + [added_id]
+
+
+def test_stored_statuses_survive_a_reload(sqlite_db, device_ids):
+    device_list = DeviceList(interval=0)
+    device_list.devices()
+    settle(device_list)
+
+    # the reload started here reads the database before the sweep stores
+    device_list.devices()
+    device_list.apply({device_ids[0]: "ON"}, {device_ids[1]: 2})
+    settle(device_list)
+    devices = {d.device_id: d for d in device_list.devices()}
+    assert devices[device_ids[0]].status == "ON"
+    assert devices[device_ids[1]].api_generation == 2
+
+    # once the database has it, a later reload reads it from there
+    with sqlite_db.get_session() as session:
+        session.execute(
+            update(Device)
+            .where(Device.device_id == device_ids[2])
+            .values(status="ON")
+        )
+    settle(device_list)
+    device_list.devices()
+    settle(device_list)
+    assert {d.device_id: d.status for d in device_list.devices()}[device_ids[2]] == "ON"
+
+
+def test_database_outage(sqlite_db, device_ids, monkeypatch):
+    device_list = DeviceList(interval=0, timeout=1)
+    device_list.devices()
+    settle(device_list)
+
+    def unreachable():
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(sqlite_db, "get_session", unreachable)
+    assert len(device_list.devices()) == 4
+    settle(device_list)
+    assert len(device_list.devices()) == 4
+
+    with pytest.raises(RuntimeError):
+        DeviceList(timeout=1).devices()
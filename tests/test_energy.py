@@ -0,0 +1,115 @@
+"""
+Energy integration: readings are held until the next one (or for one sample
+interval across a gap), split at hour boundaries and priced per hour, and
+integrating the same hours again leaves the counters and snapshots unchanged.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, insert, func
+
+from device_data_collector.energy import (
+    EnergyIntegrator,
+    integrate_energy,
+    energy_between,
+    parse_tariffs,
+)
+from device_data_collector.models import (
+    EnergyCounter,
+    EnergySnapshot,
+    MinutelyConsumption,
+)
+
+from conftest import add_user
+
+DAY = datetime(2026, 10, 12)
+PRICES = parse_tariffs("0-11:0.5,11-24:1.0")
+
+
+def at(hour, minute=0):
+    return DAY + timedelta(hours=hour, minutes=minute)
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    """
+    Device 0 draws 1000 W from 10:00 to 12:00; device 1 draws 600 W at 10:30
+    only (then switched OFF, no more readings).
+    """
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=2)
+        steady, short = (device.device_id for device in devices)
+        rows = [(steady, at(10, minute), 1000.0) for minute in range(120)]
+        rows.append((short, at(10, 30), 600.0))
+        session.execute(
+            insert(MinutelyConsumption),
+            [
+                {"device_id": device_id, "time": when, "power_consumption": power}
+                for device_id, when, power in rows
+            ],
+        )
+        return steady, short
+
+
+def counters(sqlite_db):
+    with sqlite_db.get_session() as session:
+        return session.execute(
+            select(
+                EnergyCounter.device_id,
+                EnergyCounter.total_wh,
+                EnergyCounter.total_cost,
+                EnergyCounter.accrued_until,
+            ).order_by(EnergyCounter.device_id)
+        ).all()
+
+
+def test_integration_is_idempotent(sqlite_db, device_ids):
+    steady, short = device_ids
+    integrator = EnergyIntegrator(PRICES)
+    integrate_energy(at(12, 5), integrator)
+    first = counters(sqlite_db)
+    assert [(wh, cost) for _, wh, cost, _ in first] == [
+        (pytest.approx(2000.0), pytest.approx(0.5 + 1.0)),
+        (pytest.approx(10.0), pytest.approx(0.005)),  # one interval at 600 W
+    ]
+
+    # the same hour again, and an hour without readings: nothing is added
+    integrate_energy(at(12, 5), integrator)
+    integrate_energy(at(12, 40), integrator)
+    integrate_energy(at(13, 5), integrator)
+    assert [row[:3] for row in counters(sqlite_db)] == [row[:3] for row in first]
+    with sqlite_db.get_session() as session:
+        snapshots = session.scalar(select(func.count()).select_from(EnergySnapshot))
+    assert snapshots == 3  # 11:00 and 12:00 for one device, 11:00 for the other
+
+
+def test_hold_carries_over_to_the_next_run(sqlite_db, device_ids):
+    steady, _ = device_ids
+    with sqlite_db.get_session() as session:
+        session.execute(
+            insert(MinutelyConsumption),
+            [
+                {"device_id": steady, "time": at(12, m), "power_consumption": 500.0}
+                for m in range(30)
+            ],
+        )
+    integrator = EnergyIntegrator(PRICES)
+    # the 12:00 reading is scanned by the 12:05 run but counts from 12:00 on
+    integrate_energy(at(12, 5), integrator)
+    assert counters(sqlite_db)[0][1] == pytest.approx(2000.0)
+    integrate_energy(at(13, 5), integrator)
+    assert counters(sqlite_db)[0][1] == pytest.approx(2000.0 + 250.0)
+
+
+def test_energy_between_snapshots(sqlite_db, device_ids):
+    steady, short = device_ids
+    integrate_energy(at(12, 5), EnergyIntegrator(PRICES))
+    with sqlite_db.get_session() as session:
+        both = energy_between(session, list(device_ids), at(10), at(12))
+        eleven = energy_between(session, list(device_ids), at(11, 20), at(12, 59))
+        before = energy_between(session, list(device_ids), at(8), at(10))
+    assert both[steady] == (pytest.approx(2.0), pytest.approx(1.5))
+    assert both[short] == (pytest.approx(0.01), pytest.approx(0.005))
+    # rounded down to 11:00-12:00
+    assert eleven[steady] == (pytest.approx(1.0), pytest.approx(1.0))
+    assert eleven[short] == (0.0, 0.0)
+    assert before == {steady: (0.0, 0.0), short: (0.0, 0.0)}
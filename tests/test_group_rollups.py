@@ -0,0 +1,115 @@
+"""
+Group rollups: each closed hourly/daily/weekly bucket gets one row per room,
+profile and user summing its devices, written alongside the device rollups,
+and recomputing a bucket replaces its rows instead of adding to them.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, insert
+
+from device_data_collector.data_processor import aggregate_hourly, aggregate_daily
+from device_data_collector.group_rollups import refresh_group_rollups
+from device_data_collector.models import (
+    Room,
+    Device,
+    Profile,
+    GroupConsumption,
+    MinutelyConsumption,
+)
+
+from conftest import add_user
+
+MONDAY = datetime(2026, 9, 28)
+
+
+@pytest.fixture
+def home(sqlite_db):
+    """
+    One user: profile "home" with a room of two devices (100 W, 200 W) and a
+    room of one (300 W), profile "office" with a room of one (400 W).
+    """
+    with sqlite_db.get_session() as session:
+        user, home, living, devices = add_user(session, devices=2)
+        kitchen = Room(name="kitchen", profile_id=home.profile_id)
+        office = Profile(name="office", user_id=user.user_id)
+        session.add_all([kitchen, office])
+        session.flush()
+        desk = Room(name="desk", profile_id=office.profile_id)
+        session.add(desk)
+        session.flush()
+        for room in (kitchen, desk):
+            device = Device(
+                name=room.name,
+                device_url="http://127.0.0.1/",
+                type="TV",
+                room_id=room.room_id,
+            )
+            session.add(device)
+            devices.append(device)
+        session.flush()
+        session.execute(
+            insert(MinutelyConsumption),
+            [
+                {
+                    "device_id": device.device_id,
+                    "power_consumption": 100.0 * number,
+                    "time": MONDAY + timedelta(hours=10, minutes=minute),
+                }
+                for number, device in enumerate(devices, 1)
+                for minute in range(120)
+            ],
+        )
+        return {
+            ("user", user.user_id): (1000.0, 4),
+            ("profile", home.profile_id): (600.0, 3),
+            ("profile", office.profile_id): (400.0, 1),
+            ("room", living.room_id): (300.0, 2),
+            ("room", kitchen.room_id): (300.0, 1),
+            ("room", desk.room_id): (400.0, 1),
+        }
+
+
+def group_rows(sqlite_db, level):
+    with sqlite_db.get_session() as session:
+        rows = session.execute(
+            select(
+                GroupConsumption.scope,
+                GroupConsumption.scope_id,
+                GroupConsumption.bucket,
+                GroupConsumption.power_consumption,
+                GroupConsumption.energy_wh,
+                GroupConsumption.device_count,
+            ).where(GroupConsumption.level == level)
+        ).all()
+    return sorted(rows)
+
+
+def test_hourly_groups_sum_their_devices(sqlite_db, home):
+    aggregate_hourly(MONDAY + timedelta(hours=12, minutes=5))
+
+    rows = group_rows(sqlite_db, "hourly")
+    assert rows == sorted(
+        (scope, scope_id, MONDAY + timedelta(hours=hour), watts, watts, count)
+        for (scope, scope_id), (watts, count) in home.items()
+        for hour in (10, 11)
+    )
+
+    # recomputing the same buckets replaces the rows
+    with sqlite_db.get_session() as session:
+        written = refresh_group_rollups(
+            session, "hourly", [MONDAY + timedelta(hours=10)]
+        )
+    assert written == len(home)
+    assert group_rows(sqlite_db, "hourly") == rows
+
+
+def test_daily_groups_follow_the_hourly_ones(sqlite_db, home):
+    next_day = MONDAY + timedelta(days=1, minutes=5)
+    aggregate_hourly(next_day)
+    aggregate_daily(next_day)
+    aggregate_daily(next_day)  # nothing new: no second set of rows
+
+    assert group_rows(sqlite_db, "daily") == sorted(
+        (scope, scope_id, MONDAY, watts, None, count)
+        for (scope, scope_id), (watts, count) in home.items()
+    )
@@ -0,0 +1,97 @@
+"""
+Bulk sweep writes: readings, status transitions and API generations of a
+whole sweep go to the database in one transaction with a number of statements
+that depends on the flush size, not on the number of devices.
+"""
+from datetime import datetime
+import pytest
+from sqlalchemy import event, select, func
+
+from device_data_collector import ingest
+from device_data_collector.ingest import write_sweep
+from device_data_collector.models import Device, MinutelyConsumption
+
+from conftest import add_user
+
+T0 = datetime(2026, 10, 1, 10, 0)
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=500)
+        return [device.device_id for device in devices]
+
+
+@pytest.fixture
+def commits(sqlite_db):
+    """Connections committed on, one entry per COMMIT."""
+    counted = []
+
+    def record(connection):
+        counted.append(connection)
+
+    event.listen(sqlite_db.engine, "commit", record)
+    yield counted
+    event.remove(sqlite_db.engine, "commit", record)
+
+
+def sweep(device_ids):
+    rows = [
+        {"device_id": device_id, "power_consumption": 100.0, "time": T0}
+        for device_id in device_ids
+    ]
+    changes = {device_id: "ON" for device_id in device_ids[::2]}
+    generations = {device_id: 2 for device_id in device_ids[:3]}
+    return rows, changes, generations
+
+
+def stored(sqlite_db):
+    with sqlite_db.get_session() as session:
+        readings = session.scalar(select(func.count()).select_from(MinutelyConsumption))
+        statuses = dict(
+            session.execute(
+                select(Device.status, func.count()).group_by(Device.status)
+            ).all()
+        )
+        generations = session.scalar(
+            select(func.count()).where(Device.api_generation == 2)
+        )
+    return readings, statuses, generations
+
+
+def test_sweep_is_written_in_one_transaction(sqlite_db, device_ids, commits, statements):
+    with sqlite_db.get_session() as session:
+        write_sweep(session, *sweep(device_ids))
+
+    assert len(commits) == 1
+    # one INSERT (executemany), one status UPDATE, one generation UPDATE
+    assert [sql.split()[0] for sql, _ in statements] == ["INSERT", "UPDATE", "UPDATE"]
+    assert stored(sqlite_db) == (500, {"ON": 250, "OFF": 250}, 3)
+
+
+def test_statements_do_not_grow_with_devices(sqlite_db, device_ids, statements):
+    counts = []
+    for count in (10, 500):
+        statements.clear()
+        with sqlite_db.get_session() as session:
+            write_sweep(session, *sweep(device_ids[:count]))
+        counts.append(len(statements))
+    assert counts == [3, 3]
+
+    statements.clear()
+    with sqlite_db.get_session() as session:
+        write_sweep(session, *sweep(device_ids), flush_size=200)
+    # ceil(500 / 200) inserts, ceil(250 / 200) status updates, one generation update
+    assert len(statements) == 3 + 2 + 1
+
+
+def test_failed_sweep_leaves_nothing_behind(sqlite_db, device_ids, monkeypatch):
+    def database_gone(*args, **kwargs):
+        raise ConnectionError("lost connection")
+
+    monkeypatch.setattr(ingest, "update_generations", database_gone)
+    with pytest.raises(ConnectionError):
+        with sqlite_db.get_session() as session:
+            write_sweep(session, *sweep(device_ids))
+    assert stored(sqlite_db) == (0, {"OFF": 500}, 0)
@@ -0,0 +1,85 @@
+"""
+Latest-reading cache: what the collector publishes is read back by another
+cache instance (as a web worker would) over the mmap file and over the local
+socket, entries older than the TTL are left to the database, and a missing
+collector reads as an empty cache.
+"""
+from datetime import datetime, timedelta
+import pytest
+
+from device_data_collector import latest_cache, local_ipc
+from device_data_collector.latest_cache import (
+    MmapLatestCache,
+    SocketLatestCache,
+    publish_sweep,
+)
+
+SWEEP = datetime(2026, 10, 15, 12, 0)
+TTL = 180
+
+
+def stamp(when):
+    return when.timestamp()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = str(tmp_path / "latest.sock")
+    yield path
+    server = local_ipc._servers.pop(path, None)
+    if server is not None:
+        server.stop()
+
+
+def test_mmap_round_trip(tmp_path):
+    path = str(tmp_path / "latest.bin")
+    writer = MmapLatestCache(path, slots=64, ttl=TTL)
+    reader = MmapLatestCache(path, slots=64, ttl=TTL)
+    assert not reader.available()
+    assert reader.get_many([1, 2]) == {}
+
+    writer.publish({1: 120.5, 2: 0.0, 99: 5.0}, SWEEP)  # 99 has no slot
+    assert reader.available() and reader.sequence() == 1
+    assert reader.get_many([1, 2, 3, 99], now=stamp(SWEEP)) == {
+        1: (120.5, SWEEP),
+        2: (0.0, SWEEP),
+    }
+
+    later = SWEEP + timedelta(minutes=1)
+    writer.publish({1: 80.0}, later)
+    assert reader.sequence() == 2
+    now = stamp(SWEEP + timedelta(seconds=TTL + 30))
+    # device 2 was not published again: older than the TTL
+    assert reader.get_many([1, 2], now=now) == {1: (80.0, later)}
+
+
+def test_mmap_rejects_a_foreign_file(tmp_path):
+    path = str(tmp_path / "latest.bin")
+    MmapLatestCache(path, slots=64).publish({1: 10.0}, SWEEP)
+    assert MmapLatestCache(path, slots=128).get_many([1]) == {}
+
+
+def test_socket_round_trip(socket_path):
+    reader = SocketLatestCache(socket_path, ttl=TTL)
+    assert not reader.available()
+    assert reader.get_many([1]) == {}  # no collector serving
+
+    writer = SocketLatestCache(socket_path, ttl=TTL).serve()
+    writer.publish({1: 120.5, 2: 0.0}, SWEEP)
+    assert reader.available()
+    assert reader.get_many([1, 2, 3], now=stamp(SWEEP)) == {
+        1: (120.5, SWEEP),
+        2: (0.0, SWEEP),
+    }
+    now = stamp(SWEEP + timedelta(seconds=TTL + 1))
+    assert reader.get_many([1, 2], now=now) == {}
+
+
+def test_publish_sweep_stores_off_devices_as_zero(tmp_path, monkeypatch):
+    cache = MmapLatestCache(str(tmp_path / "latest.bin"), slots=64, ttl=TTL)
+    monkeypatch.setattr(latest_cache, "_cache", cache)
+    publish_sweep(SWEEP, {1: 120.5, 2: 0.4, 3: None})
+    assert cache.get_many([1, 2, 3], now=stamp(SWEEP)) == {
+        1: (120.5, SWEEP),
+        2: (0.0, SWEEP),
+    }
@@ -0,0 +1,93 @@
+"""
+Shard leases of the sharded collector: workers split the shards fairly, a
+worker that stops heartbeating loses its shards to the others once its leases
+expire, and no shard is ever held by two workers.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+
+from device_data_collector.sharded_collector import ShardLeases
+from device_data_collector.models import CollectorLease
+
+SHARDS = 8
+TTL = 90
+T0 = datetime(2026, 10, 15, 12, 0)
+
+
+def at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def workers(sqlite_db):
+    return [ShardLeases(f"worker-{n}", SHARDS, ttl=TTL) for n in range(3)]
+
+
+def owners(sqlite_db):
+    with sqlite_db.get_session() as session:
+        return dict(
+            session.execute(select(CollectorLease.shard, CollectorLease.owner)).all()
+        )
+
+
+def assert_disjoint(*leases):
+    held = [shard for lease in leases for shard in lease.held]
+    assert len(held) == len(set(held))
+
+
+def test_single_worker_takes_every_shard(sqlite_db, workers):
+    a = workers[0]
+    assert a.heartbeat(at(0)) == set(range(SHARDS))
+    assert set(owners(sqlite_db).values()) == {"worker-0"}
+    assert a.active(at(TTL - 1)) == set(range(SHARDS))
+
+
+def test_shards_split_when_workers_join(sqlite_db, workers):
+    a, b, c = workers
+    a.heartbeat(at(0))
+    assert b.heartbeat(at(1)) == set()  # everything is leased to a
+    a.heartbeat(at(20))  # two live workers: a gives back its surplus
+    assert len(a.held) == 4
+    assert len(b.heartbeat(at(21))) == 4
+    assert_disjoint(a, b)
+
+    c.heartbeat(at(40))
+    a.heartbeat(at(41))
+    b.heartbeat(at(42))
+    c.heartbeat(at(43))
+    assert sorted(len(lease.held) for lease in workers) == [2, 3, 3]
+    assert_disjoint(a, b, c)
+    assert set().union(a.held, b.held, c.held) == set(range(SHARDS))
+    assert owners(sqlite_db) == {
+        shard: lease.owner for lease in workers for shard in lease.held
+    }
+
+
+def test_takeover_after_a_worker_stops(sqlite_db, workers):
+    a, b, _ = workers
+    a.heartbeat(at(0))
+    b.heartbeat(at(1))
+    a.heartbeat(at(20))
+    b.heartbeat(at(21))
+    a_shards = set(a.held)
+
+    # a stops heartbeating; until its leases expire nobody takes them
+    assert b.heartbeat(at(60)) == set(range(SHARDS)) - a_shards
+    # once they have, a must stop sweeping and b picks its shards up
+    assert a.active(at(20 + TTL)) == set()
+    assert b.heartbeat(at(20 + TTL + 1)) == set(range(SHARDS))
+
+    # a comes back: it cannot renew what b now holds
+    assert a.heartbeat(at(20 + TTL + 2)) == set()
+    b.heartbeat(at(20 + TTL + 3))  # b gives back its surplus to the live a
+    assert len(a.heartbeat(at(20 + TTL + 4))) == 4
+    assert_disjoint(a, b)
+
+
+def test_release_all_frees_the_shards(sqlite_db, workers):
+    a, b, _ = workers
+    a.heartbeat(at(0))
+    a.release_all()
+    assert set(owners(sqlite_db).values()) == {None}
+    assert b.heartbeat(at(1)) == set(range(SHARDS))
@@ -0,0 +1,103 @@
+"""
+Live readings fan-out: every connected client gets every sweep for its own
+devices, room totals follow devices that switch off or stop answering, and the
+stream is refused when there is no latest-reading cache to follow.
+"""
+import time
+from datetime import datetime
+import pytest
+
+from device_data_collector import latest_cache
+from device_data_collector.latest_cache import MmapLatestCache, NullLatestCache
+from device_data_collector.live_stream import PowerBroadcaster
+
+from benchmarks import bench_live_stream
+from conftest import add_user, login
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return MmapLatestCache(path=str(tmp_path / "latest.bin"), ttl=0.5)
+
+
+def publish(cache, readings):
+    """What latest_cache.publish_sweep does, against this cache."""
+    cache.publish(
+        {
+            device_id: power if power > latest_cache.ON_THRESHOLD_W else 0.0
+            for device_id, power in readings.items()
+            if power is not None
+        },
+        datetime.now(),
+    )
+
+
+def next_event(subscription):
+    return subscription.queue.get(timeout=2)
+
+
+def settled(subscription):
+    """The newest event once the broadcaster caught up with the cache."""
+    time.sleep(0.1)
+    event = subscription.queue.get_nowait()
+    while not subscription.queue.empty():
+        event = subscription.queue.get_nowait()
+    return event
+
+
+def test_every_client_receives_every_sweep():
+    connections, per_connection, _, delays, expected = bench_live_stream.run(
+        clients=20,
+        devices=200,
+        per_client=5,
+        sweeps=3,
+        interval=0.3,
+        poll_interval=0.02,
+    )
+    assert connections == 20
+    assert len(delays) == expected == 60
+    assert 0 < per_connection < 50_000
+
+
+def test_room_total_falls_back_when_a_device_switches_off(cache):
+    publish(cache, {1: 100.0, 2: 50.0})
+    broadcaster = PowerBroadcaster(cache=cache, poll_interval=0.01)
+    subscription = broadcaster.subscribe({1: 10, 2: 10, 3: 20})
+    assert settled(subscription)["rooms"] == {10: 150.0, 20: 0.0}
+
+    publish(cache, {1: 0.3, 2: 50.0, 3: None})  # 1 switched off, 3 unreachable
+    event = next_event(subscription)
+    assert event["devices"][1]["power"] == 0.0
+    assert event["rooms"] == {10: 50.0, 20: 0.0}
+
+
+def test_expired_devices_leave_the_room_totals(cache):
+    publish(cache, {1: 100.0, 2: 50.0})
+    broadcaster = PowerBroadcaster(cache=cache, poll_interval=0.01)
+    subscription = broadcaster.subscribe({1: 10, 2: 10})
+    assert settled(subscription)["rooms"] == {10: 150.0}
+
+    time.sleep(0.6)  # longer than the TTL without an answer from device 1
+    publish(cache, {1: None, 2: 60.0})
+    event = next_event(subscription)
+    assert event["devices"][1] == {"power": None, "last_updated": None}
+    assert event["rooms"] == {10: 60.0}
+    assert 1 not in subscription.values
+
+
+def test_stream_is_refused_without_a_cache(sqlite_db, tmp_path, monkeypatch):
+    with sqlite_db.get_session() as session:
+        _, profile, _, _ = add_user(session, devices=2)
+        profile_id = profile.profile_id
+    client = login()
+    # the collector runs on another host: no cache file here
+    monkeypatch.setattr(
+        latest_cache, "_cache", MmapLatestCache(path=str(tmp_path / "missing.bin"))
+    )
+    assert client.get(f"/api/profile/{profile_id}/stream").status_code == 503
+    monkeypatch.setattr(latest_cache, "_cache", NullLatestCache())
+    assert client.get(f"/api/profile/{profile_id}/stream").status_code == 503
+    # the minutely endpoint the page polls instead still answers
+    response = client.get(f"/api/profile/{profile_id}/power")
+    assert response.status_code == 200
+    assert len(response.get_json()["devices"]) == 2
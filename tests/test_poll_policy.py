@@ -0,0 +1,98 @@
+"""
+Adaptive polling: a failing device backs off exponentially, its circuit opens
+after POLL_BREAKER_FAILURES failures (short probes only) and closes on the
+first answer; a device reading OFF for long is polled slowly until it turns on.
+"""
+from datetime import datetime, timedelta
+
+from device_data_collector.poll_policy import (
+    PollPolicy,
+    HEALTHY,
+    BACKOFF,
+    OPEN,
+    IDLE,
+)
+
+T0 = datetime(2026, 10, 15, 12, 0)
+INTERVAL = 60
+
+
+def policy(**options):
+    settings = dict(
+        backoff_max=600,
+        breaker_failures=5,
+        probe_interval=1800,
+        probe_timeout=1,
+        idle_after=3600,
+        idle_interval=300,
+    )
+    settings.update(options)
+    return PollPolicy(INTERVAL, 5, **settings)
+
+
+def run(policy, ticks, answer, device_id=1, first=0, switched_on=lambda tick: False):
+    """
+    Plan and record `ticks` sweeps; answer(tick) gives the watts read (None:
+    no answer). Returns {tick: request timeout} of the ticks the device was polled.
+    """
+    polled = {}
+    for tick in range(first, first + ticks):
+        now = T0 + timedelta(seconds=tick * INTERVAL)
+        timeout = policy.plan(device_id, now, switched_on=switched_on(tick))
+        if timeout is not None:
+            polled[tick] = timeout
+            policy.record(device_id, now, answer(tick))
+    return polled
+
+
+def mode(policy, tick, device_id=1):
+    now = T0 + timedelta(seconds=tick * INTERVAL)
+    return policy.snapshot(now)[device_id]["mode"]
+
+
+def test_backoff_then_open_circuit_then_recovery():
+    dead = policy()
+    polled = run(dead, 60, lambda tick: None)
+    # retried after 1, 2, 4, 8 intervals, then the circuit opens: probes only
+    assert list(polled)[:5] == [0, 1, 3, 7, 15]
+    assert [polled[tick] for tick in (0, 1, 3, 7, 15)] == [5] * 5
+    assert list(polled)[5:] == [45]  # 15 + 1800 s
+    assert polled[45] == 1  # short probe timeout
+    assert mode(dead, 59) == OPEN
+
+    polled = run(dead, 5, lambda tick: 100.0, first=75)
+    assert polled == {75: 1, 76: 5, 77: 5, 78: 5, 79: 5}
+    assert mode(dead, 79) == HEALTHY
+
+
+def test_backoff_is_capped():
+    flaky = policy(breaker_failures=100, backoff_max=300)
+    polled = list(run(flaky, 60, lambda tick: None))
+    gaps = [later - earlier for earlier, later in zip(polled, polled[1:])]
+    assert gaps[:4] == [1, 2, 4, 5] and set(gaps[3:]) == {5}
+    assert mode(flaky, 59) == BACKOFF
+
+
+def test_idle_devices_are_polled_slowly():
+    off = policy()
+    polled = list(run(off, 120, lambda tick: 0.0))
+    assert polled[:61] == list(range(61))  # every tick for the first hour
+    assert polled[61:] == [65, 70, 75, 80, 85, 90, 95, 100, 105, 110, 115]
+    assert mode(off, 119) == IDLE
+
+    # switched on from the web app: polled on the very next tick again
+    polled = run(off, 3, lambda tick: 40.0, first=121, switched_on=lambda t: t == 121)
+    assert list(polled) == [121, 122, 123]
+    assert mode(off, 123) == HEALTHY
+
+
+def test_summary_and_forget():
+    mixed = policy()
+    run(mixed, 80, lambda tick: None, device_id=1)
+    run(mixed, 80, lambda tick: 0.0, device_id=2)
+    run(mixed, 80, lambda tick: 50.0, device_id=3)
+    now = T0 + timedelta(seconds=79 * INTERVAL)
+    assert mixed.summary(now) == {HEALTHY: 1, BACKOFF: 0, OPEN: 1, IDLE: 1}
+
+    mixed.forget(keep_ids=[3])  # 1 and 2 were removed
+    assert list(mixed.snapshot(now)) == [3]
@@ -0,0 +1,92 @@
+"""
+Concurrent polling against the fake plug farm: a sweep over slow and hung
+plugs ends inside sweep_deadline(), and hung requests end at their (deadline
+capped) timeout instead of holding pool threads into the next sweep.
+"""
+import time
+import pytest
+from sqlalchemy import select, func
+
+from device_data_collector import data_collector, device_client
+from device_data_collector.data_collector import (
+    collect_data,
+    poll_devices,
+    sweep_deadline,
+)
+from device_data_collector.device_client import DeviceClient
+from device_data_collector.poll_policy import PollPolicy
+from device_data_collector.fake_shelly import FakeShellyServer
+from device_data_collector.ingest import SAMPLE_INTERVAL
+from device_data_collector.models import Device, MinutelyConsumption
+
+from conftest import add_user
+
+DEVICES = 200
+HUNG = range(10)
+
+
+@pytest.fixture
+def farm():
+    """Plugs answering in 0.05-0.25 s; the first ten accept and never reply."""
+    with FakeShellyServer(
+        num_devices=DEVICES, latency=0.05, jitter=0.2, unreachable=HUNG, hang=30
+    ) as server:
+        yield server
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    """Fresh client and pool, a 1.5 s sweep deadline and 5 s request timeouts."""
+    client = DeviceClient()
+    monkeypatch.setattr(device_client, "_client", client)
+    monkeypatch.setattr(data_collector, "SWEEP_DEADLINE", 1.5)
+    monkeypatch.setattr(data_collector, "poll_policy", PollPolicy(SAMPLE_INTERVAL, 5))
+    monkeypatch.setattr(data_collector, "_device_list", None)
+    yield
+    if data_collector._executor is not None:
+        data_collector._executor.shutdown(wait=False, cancel_futures=True)
+    monkeypatch.setattr(data_collector, "_executor", None)
+    client.session.close()
+
+
+def test_sweep_ends_inside_the_deadline(sqlite_db, farm, collector):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=DEVICES)
+        for number, device in enumerate(devices):
+            device.device_url = farm.device_url(number)
+
+    started = time.monotonic()
+    collect_data()
+    elapsed = time.monotonic() - started
+
+    assert sweep_deadline() == 1.5
+    assert elapsed < sweep_deadline() + 0.5  # + the bulk write
+    with sqlite_db.get_session() as session:
+        stored = session.scalar(select(func.count()).select_from(MinutelyConsumption))
+        on = session.scalar(select(func.count()).where(Device.status == "ON"))
+    assert stored == on == DEVICES - len(HUNG)
+
+
+def test_hung_requests_end_at_the_capped_timeout(farm, collector):
+    targets = [(number, farm.device_url(number)) for number in range(DEVICES)]
+    # more hung plugs than pool threads: were they left running past the
+    # deadline, the next sweep would find every thread busy
+    started = time.monotonic()
+    readings, stats = poll_devices(targets, max_workers=8, deadline=1.0, timeout=5)
+    assert time.monotonic() - started < 1.5
+    assert readings[0] is None
+
+    healthy = targets[len(HUNG):][:8]
+    started = time.monotonic()
+    readings, stats = poll_devices(healthy, max_workers=8, deadline=1.0, timeout=5)
+    assert stats.responded == len(healthy)
+    assert time.monotonic() - started < 1.0
+
+
+def test_timeouts_are_reported(farm, collector):
+    targets = [(number, farm.device_url(number)) for number in range(40)]
+    readings, stats = poll_devices(targets, max_workers=64, deadline=1.0, timeout=0.5)
+    assert stats.timeouts == len(HUNG)
+    assert stats.responded == 40 - len(HUNG)
+    assert stats.missed_deadline == 0
+    assert stats.duration < 1.0
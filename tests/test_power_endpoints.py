@@ -0,0 +1,147 @@
+"""
+Dashboard power endpoints: the profile endpoint answers for every device of
+a profile with a fixed number of queries, where polling each device costs at
+least one query per device; minutely readings of devices that answered the
+last sweep, ON or OFF, come from the latest-reading cache.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+
+from device_data_collector.latest_cache import publish_sweep
+from device_data_collector.models import Room, HourlyConsumption, MinutelyConsumption
+
+from conftest import add_user, login
+
+HOUR = datetime(2026, 10, 1, 10)
+
+
+def add_profile(session, devices, email):
+    """A profile with `devices` devices over two rooms, each with two hourly rows."""
+    _, profile, room, added = add_user(session, devices=devices, email=email)
+    other = Room(name="other room", profile_id=profile.profile_id)
+    session.add(other)
+    session.flush()
+    for device in added[::2]:
+        device.room_id = other.room_id
+    session.execute(
+        insert(HourlyConsumption),
+        [
+            {
+                "device_id": device.device_id,
+                "time": HOUR + timedelta(hours=hours),
+                "power_consumption": 100.0 + hours,
+                "energy_wh": 100.0 + hours,
+            }
+            for device in added
+            for hours in range(2)
+        ],
+    )
+    return profile.profile_id, [device.device_id for device in added]
+
+
+@pytest.fixture
+def profiles(sqlite_db):
+    """{device count: (profile_id, device_ids, logged-in client)}."""
+    with sqlite_db.get_session() as session:
+        created = {
+            count: add_profile(session, count, f"user{count}@example.com")
+            for count in (5, 50)
+        }
+    return {
+        count: (profile_id, device_ids, login(f"user{count}@example.com"))
+        for count, (profile_id, device_ids) in created.items()
+    }
+
+
+def selects(statements):
+    return [sql for sql, _ in statements if sql.lstrip().startswith("SELECT")]
+
+
+def test_profile_power_query_count_does_not_grow_with_devices(profiles, statements):
+    counts = {}
+    for count, (profile_id, device_ids, client) in profiles.items():
+        client.get(f"/api/profile/{profile_id}/power?time_range=hourly")  # warm-up
+        statements.clear()
+        response = client.get(f"/api/profile/{profile_id}/power?time_range=hourly")
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body["devices"]) == count
+        assert {reading["hourly_average"] for reading in body["devices"].values()} == {
+            101.0
+        }
+        counts[count] = len(selects(statements))
+    # the joined device/reading query plus the group rollup totals
+    assert counts == {5: 2, 50: 2}
+
+
+def test_per_device_polling_costs_a_query_per_device(profiles, statements):
+    profile_id, device_ids, client = profiles[50]
+    for device_id in device_ids:  # warm the ownership cache, like a long-open tab
+        client.get(f"/api/device/{device_id}/power?time_range=hourly")
+    statements.clear()
+    for device_id in device_ids:
+        response = client.get(f"/api/device/{device_id}/power?time_range=hourly")
+        assert response.get_json()["hourly_average"] == 101.0
+    per_device = len(selects(statements))
+
+    statements.clear()
+    client.get(f"/api/profile/{profile_id}/power?time_range=hourly")
+    assert per_device == len(device_ids) == 50
+    assert len(selects(statements)) == 2
+
+
+def test_profile_of_another_user_is_not_found(profiles):
+    profile_id, _, _ = profiles[5]
+    _, _, client = profiles[50]
+    response = client.get(f"/api/profile/{profile_id}/power?time_range=hourly")
+    assert response.status_code == 404
+
+
+def test_minutely_readings_of_on_and_off_devices_come_from_the_cache(
+    profiles, statements
+):
+    profile_id, device_ids, client = profiles[5]
+    now = datetime.now().replace(microsecond=0)
+    publish_sweep(now, {device_ids[0]: 0.4, **dict.fromkeys(device_ids[1:], 250.0)})
+    client.get(f"/api/profile/{profile_id}/power")  # warm-up
+    statements.clear()
+
+    body = client.get(f"/api/profile/{profile_id}/power").get_json()
+    assert body["devices"][str(device_ids[0])] == {
+        "power": 0.0,
+        "last_updated": now.isoformat(),
+    }
+    assert body["total"] == 4 * 250.0
+    assert all("minutely_consumptions" not in sql for sql in selects(statements))
+
+    client.get(f"/api/device/{device_ids[0]}/power")  # caches the owner
+    statements.clear()
+    assert client.get(f"/api/device/{device_ids[0]}/power").get_json()["power"] == 0.0
+    assert selects(statements) == []
+
+
+def test_only_devices_missing_from_the_cache_are_queried(
+    sqlite_db, profiles, statements
+):
+    profile_id, device_ids, client = profiles[5]
+    now = datetime.now().replace(microsecond=0)
+    publish_sweep(now, {**dict.fromkeys(device_ids[1:], 250.0), device_ids[0]: None})
+    with sqlite_db.get_session() as session:
+        session.add(
+            MinutelyConsumption(
+                device_id=device_ids[0],
+                power_consumption=80.0,
+                time=now - timedelta(hours=1),
+            )
+        )
+    client.get(f"/api/profile/{profile_id}/power")  # warm-up
+    statements.clear()
+
+    body = client.get(f"/api/profile/{profile_id}/power").get_json()
+    assert body["devices"][str(device_ids[0])]["power"] == 80.0
+    assert body["total"] == 80.0 + 4 * 250.0
+    minutely = [
+        params for sql, params in statements if "minutely_consumptions" in sql
+    ]
+    assert [list(params) for params in minutely] == [[device_ids[0]]]
@@ -0,0 +1,108 @@
+"""
+Query-plan regression tests: the hot queries must be served by the
+consumption indexes (models.py, migrations 2/3/7), not by full table scans.
+The statements are captured from the code that issues them and run through
+SQLite's EXPLAIN QUERY PLAN.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select
+
+import main_web_app
+from device_data_collector.models import MinutelyConsumption, RollupWatermark
+from device_data_collector.partitions import apply_retention
+from device_data_collector.series import fetch_level
+from device_data_collector.group_rollups import refresh_group_rollups
+
+from conftest import add_user
+
+NOW = datetime(2026, 9, 30, 12, 0)
+
+
+def plan(sqlite_db, statement, parameters=()):
+    with sqlite_db.engine.connect() as connection:
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).all()
+    return " / ".join(row[-1] for row in rows)
+
+
+def captured_plans(sqlite_db, statements, table, verb="SELECT"):
+    return [
+        plan(sqlite_db, statement, parameters)
+        for statement, parameters in statements
+        if statement.lstrip().upper().startswith(verb) and table in statement
+    ]
+
+
+def test_latest_reading_lookups_use_device_time_indexes(sqlite_db):
+    indexes = {
+        "minutely": "ix_minutely_device_time",
+        "hourly": "ix_hourly_device_time",
+        "daily": "ix_daily_device_date",
+        "weekly": "ix_weekly_device_date",
+    }
+    with sqlite_db.get_session() as session:
+        for level, (model, time_col, value_col, _) in main_web_app.POWER_LEVELS.items():
+            query = (
+                select(value_col, time_col)
+                .where(model.device_id == 1)
+                .order_by(time_col.desc())
+                .limit(1)
+            )
+            compiled = query.compile(session.get_bind())
+            detail = plan(
+                sqlite_db,
+                str(compiled),
+                tuple(compiled.params[name] for name in compiled.positiontup),
+            )
+            assert f"USING COVERING INDEX {indexes[level]}" in detail, detail
+            assert "TEMP B-TREE" not in detail, detail
+
+
+def test_series_range_reads_use_device_time_indexes(sqlite_db, statements):
+    indexes = {
+        "minutely": ("minutely_consumptions", "ix_minutely_device_time"),
+        "hourly": ("hourly_consumptions", "ix_hourly_device_time"),
+        "daily": ("device_daily_consumptions", "ix_daily_device_date"),
+        "weekly": ("weekly_consumptions", "ix_weekly_device_date"),
+    }
+    with sqlite_db.get_session() as session:
+        for level in indexes:
+            fetch_level(session, level, 1, NOW - timedelta(days=7), NOW)
+    for level, (table, index) in indexes.items():
+        plans = captured_plans(sqlite_db, statements, table)
+        assert plans, f"no {level} range query captured"
+        for detail in plans:
+            assert f"USING COVERING INDEX {index}" in detail, detail
+            assert "TEMP B-TREE" not in detail, detail
+
+
+def test_retention_delete_uses_time_index(sqlite_db, statements):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session)
+        session.add(
+            RollupWatermark(
+                device_id=devices[0].device_id, level="hourly", closed_through=NOW
+            )
+        )
+        session.add(
+            MinutelyConsumption(
+                device_id=devices[0].device_id,
+                power_consumption=50.0,
+                time=NOW - timedelta(days=30),
+            )
+        )
+    apply_retention(NOW)
+    plans = captured_plans(sqlite_db, statements, "minutely_consumptions", "DELETE")
+    assert plans
+    for detail in plans:
+        assert "ix_minutely_time" in detail, detail
+
+
+def test_group_rollup_refresh_reads_buckets_by_time(sqlite_db, statements):
+    with sqlite_db.get_session() as session:
+        refresh_group_rollups(session, "hourly", [NOW - timedelta(hours=1)])
+    plans = captured_plans(sqlite_db, statements, "hourly_consumptions", "INSERT")
+    assert len(plans) == 3  # room, profile and user
+    for detail in plans:
+        assert "ix_hourly_time" in detail, detail
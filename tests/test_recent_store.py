@@ -0,0 +1,82 @@
+"""
+Recent readings ring buffers: a ring holds exactly the last `size` ticks,
+wraps around in place, clears ticks nobody answered, and rings of devices
+removed from the device list are dropped.
+"""
+import math
+from datetime import datetime, timedelta
+
+from device_data_collector.recent_store import RecentStore, DeviceRing
+from device_data_collector.data_collector import DeviceList
+
+from conftest import add_user
+
+T0 = datetime(2026, 10, 1, 12, 0)
+MINUTE = timedelta(minutes=1)
+
+
+def store_of(minutes):
+    return RecentStore(interval=60, hours=minutes / 60)
+
+
+def values(store, device_id, start, end):
+    return store.window([device_id], start, end)[1].get(device_id)
+
+
+def test_ring_wraps_around():
+    store = store_of(3)
+    for minute in range(5):
+        store.record(T0 + minute * MINUTE, {1: float(minute)})
+
+    assert store.size == 3
+    assert values(store, 1, T0, T0 + 5 * MINUTE) == [None, None, 2.0, 3.0, 4.0]
+    ring = store._rings[1]
+    assert len(ring.values) == 3  # overwritten in place, never grown
+    assert store.nbytes() == 3 * 4
+
+
+def test_gaps_and_late_answers():
+    ring = DeviceRing(4)
+    ring.append(10, 1.0)
+    ring.append(12, 3.0)  # tick 11 was missed
+    assert ring.window(10, 12)[::2] == [1.0, 3.0]
+    assert math.isnan(ring.window(11, 11)[0])
+
+    ring.append(11, 2.0)  # late answer for a tick still held
+    ring.append(8, 9.0)  # too old: already out of the ring
+    assert ring.window(9, 12)[1:] == [1.0, 2.0, 3.0]
+
+    ring.append(20, 5.0)  # a gap longer than the ring clears it
+    window = ring.window(17, 20)
+    assert window[-1] == 5.0
+    assert all(math.isnan(value) for value in window[:-1])
+
+
+def test_unanswered_devices_read_none():
+    store = store_of(10)
+    store.record(T0, {1: 100.0, 2: None})
+    store.record(T0 + MINUTE, {1: None, 2: 0.0})
+    assert values(store, 1, T0, T0 + 2 * MINUTE) == [100.0, None]
+    assert values(store, 2, T0, T0 + 2 * MINUTE) == [None, 0.0]
+
+
+def test_forget_drops_removed_devices():
+    store = store_of(10)
+    store.record(T0, {1: 1.0, 2: 2.0, 3: 3.0})
+    store.forget([1, 3])
+    assert sorted(store._rings) == [1, 3]
+    assert store.window([1, 2, 3], T0, T0 + MINUTE)[1] == {1: [1.0], 3: [3.0]}
+    assert store.nbytes() == 2 * 10 * 4
+
+
+def test_device_list_reload_forgets_deleted_devices(sqlite_db):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=3)
+        device_ids = [device.device_id for device in devices]
+    store = store_of(10)
+    store.record(T0, {device_id: 1.0 for device_id in device_ids + [999]})
+
+    device_list = DeviceList(interval=300)
+    device_list.add_listener(store.forget)
+    device_list.devices()
+    assert sorted(store._rings) == device_ids
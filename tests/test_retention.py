@@ -0,0 +1,89 @@
+"""
+Raw-data retention on SQLite (the unpartitioned range-DELETE path): readings
+older than RAW_RETENTION_DAYS go, but never past the oldest hourly watermark,
+so minutes not rolled up yet survive a lagging or brand-new device.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, insert, update, func
+
+from device_data_collector.partitions import (
+    RAW_RETENTION_DAYS,
+    apply_retention,
+    maintain_partitions,
+    retention_cutoff,
+)
+from device_data_collector.watermarks import advance_watermarks
+from device_data_collector.models import MinutelyConsumption, RollupWatermark
+
+from conftest import add_user
+
+NOW = datetime(2026, 10, 15, 3, 0)
+CUTOFF = datetime(2026, 10, 15) - timedelta(days=RAW_RETENTION_DAYS)
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    """Two devices with one reading every 6 hours over the last 20 days."""
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=2)
+        device_ids = [device.device_id for device in devices]
+        session.execute(
+            insert(MinutelyConsumption),
+            [
+                {
+                    "device_id": device_id,
+                    "power_consumption": 100.0,
+                    "time": NOW - timedelta(hours=6 * step),
+                }
+                for device_id in device_ids
+                for step in range(4 * 20)
+            ],
+        )
+    return device_ids
+
+
+def oldest_kept(sqlite_db):
+    with sqlite_db.get_session() as session:
+        return session.execute(
+            select(MinutelyConsumption.device_id, func.min(MinutelyConsumption.time))
+            .group_by(MinutelyConsumption.device_id)
+            .order_by(MinutelyConsumption.device_id)
+        ).all()
+
+
+def set_watermarks(sqlite_db, boundary, device_ids=None):
+    with sqlite_db.get_session() as session:
+        advance_watermarks(session, "hourly", boundary, device_ids)
+
+
+def test_drops_readings_past_the_retention_window(sqlite_db, device_ids):
+    set_watermarks(sqlite_db, NOW.replace(minute=0))
+    apply_retention(NOW)
+    first_kept = CUTOFF + timedelta(hours=3)  # readings fall at 03/09/15/21h
+    assert oldest_kept(sqlite_db) == [(device_id, first_kept) for device_id in device_ids]
+
+
+def test_keeps_readings_a_lagging_device_has_not_rolled_up(sqlite_db, device_ids):
+    lagging = datetime(2026, 10, 2, 14, 0)  # 12+ days behind
+    set_watermarks(sqlite_db, NOW.replace(minute=0))
+    with sqlite_db.get_session() as session:
+        session.execute(
+            update(RollupWatermark)
+            .where(RollupWatermark.device_id == device_ids[1])
+            .values(closed_through=lagging)
+        )
+        # the whole day the floor falls in is kept, for every device
+        assert retention_cutoff(session, NOW) == datetime(2026, 10, 2)
+
+    apply_retention(NOW)
+    first_kept = datetime(2026, 10, 2, 3, 0)
+    assert oldest_kept(sqlite_db) == [(device_id, first_kept) for device_id in device_ids]
+
+
+def test_nothing_is_dropped_before_every_device_has_a_watermark(sqlite_db, device_ids):
+    set_watermarks(sqlite_db, NOW.replace(minute=0), device_ids[:1])
+    apply_retention(NOW)
+    maintain_partitions(NOW)  # no partitions on SQLite: a no-op
+    first = NOW - timedelta(hours=6 * (4 * 20 - 1))
+    assert oldest_kept(sqlite_db) == [(device_id, first) for device_id in device_ids]
@@ -0,0 +1,147 @@
+"""
+Set-based rollups: hourly/daily/weekly buckets are computed once per closed
+bucket, the per-device watermarks advance to the boundary, and rows already
+rolled up are neither read again nor counted twice.
+"""
+from datetime import datetime, date, timedelta
+import pytest
+from sqlalchemy import select, insert, update
+
+from device_data_collector.data_processor import (
+    aggregate_hourly,
+    aggregate_daily,
+    aggregate_weekly,
+)
+from device_data_collector.models import (
+    MinutelyConsumption,
+    HourlyConsumption,
+    DeviceDailyConsumption,
+    DeviceWeeklyConsumption,
+    RollupWatermark,
+)
+
+from conftest import add_user
+
+MONDAY = datetime(2026, 9, 28)
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=3)
+        return [device.device_id for device in devices]
+
+
+def add_minutes(sqlite_db, device_ids, start, minutes, power=None):
+    """One reading per device and minute; by default device n draws 100 * n W."""
+    with sqlite_db.get_session() as session:
+        session.execute(
+            insert(MinutelyConsumption),
+            [
+                {
+                    "device_id": device_id,
+                    "power_consumption": power or 100.0 * number,
+                    "time": start + timedelta(minutes=minute),
+                }
+                for number, device_id in enumerate(device_ids, 1)
+                for minute in range(minutes)
+            ],
+        )
+
+
+def watermarks(sqlite_db, level):
+    with sqlite_db.get_session() as session:
+        return set(
+            session.scalars(
+                select(RollupWatermark.closed_through).where(
+                    RollupWatermark.level == level
+                )
+            )
+        )
+
+
+def test_hourly_rollup_of_closed_hours(sqlite_db, device_ids):
+    add_minutes(sqlite_db, device_ids, MONDAY + timedelta(hours=10), 150)
+    aggregate_hourly(MONDAY + timedelta(hours=12, minutes=5))
+
+    with sqlite_db.get_session() as session:
+        hours = session.execute(
+            select(
+                HourlyConsumption.device_id,
+                HourlyConsumption.time,
+                HourlyConsumption.power_consumption,
+                HourlyConsumption.energy_wh,
+            ).order_by(HourlyConsumption.device_id, HourlyConsumption.time)
+        ).all()
+    assert hours == [
+        (device_id, MONDAY + timedelta(hours=hour), 100.0 * number, 100.0 * number)
+        for number, device_id in enumerate(device_ids, 1)
+        for hour in (10, 11)
+    ]  # 12:00-12:29 is still open
+    assert watermarks(sqlite_db, "hourly") == {MONDAY + timedelta(hours=12)}
+
+
+def test_rolled_up_rows_are_not_read_again(sqlite_db, device_ids, statements):
+    add_minutes(sqlite_db, device_ids, MONDAY + timedelta(hours=10), 120)
+    aggregate_hourly(MONDAY + timedelta(hours=12))
+    aggregate_hourly(MONDAY + timedelta(hours=12, minutes=30))  # nothing closed
+
+    # rows behind the watermark change (e.g. a late correction): not re-rolled
+    with sqlite_db.get_session() as session:
+        session.execute(update(MinutelyConsumption).values(power_consumption=5000.0))
+    add_minutes(sqlite_db, device_ids, MONDAY + timedelta(hours=12), 60, power=50.0)
+    statements.clear()
+    aggregate_hourly(MONDAY + timedelta(hours=13))
+
+    with sqlite_db.get_session() as session:
+        rows = session.execute(
+            select(HourlyConsumption.time, HourlyConsumption.power_consumption)
+        ).all()
+    assert len(rows) == 3 * 3
+    assert {power for when, power in rows if when.hour == 12} == {50.0}
+    assert 5000.0 not in {power for _, power in rows}
+    # the source scan is bounded below by the oldest watermark (12:00)
+    rollup = next(
+        params for sql, params in statements if sql.startswith("INSERT INTO hourly")
+    )
+    assert "2026-09-28 12:00:00.000000" in rollup
+    assert watermarks(sqlite_db, "hourly") == {MONDAY + timedelta(hours=13)}
+
+
+def test_daily_and_weekly_rollups(sqlite_db, device_ids):
+    # two days of one week, then the rollups run on the next Monday
+    for day in (0, 1):
+        add_minutes(sqlite_db, device_ids, MONDAY + timedelta(days=day, hours=8), 120)
+    next_week = MONDAY + timedelta(weeks=1, minutes=5)
+    aggregate_hourly(next_week)
+    aggregate_daily(next_week)
+    aggregate_weekly(next_week)
+    aggregate_daily(next_week)
+    aggregate_weekly(next_week)
+
+    with sqlite_db.get_session() as session:
+        days = session.execute(
+            select(
+                DeviceDailyConsumption.device_id,
+                DeviceDailyConsumption.date,
+                DeviceDailyConsumption.daily_average,
+            ).order_by(DeviceDailyConsumption.device_id, DeviceDailyConsumption.date)
+        ).all()
+        weeks = session.execute(
+            select(
+                DeviceWeeklyConsumption.device_id,
+                DeviceWeeklyConsumption.date,
+                DeviceWeeklyConsumption.weekly_average,
+            ).order_by(DeviceWeeklyConsumption.device_id)
+        ).all()
+    assert days == [
+        (device_id, date(2026, 9, 28 + day), 100.0 * number)
+        for number, device_id in enumerate(device_ids, 1)
+        for day in (0, 1)
+    ]
+    assert weeks == [
+        (device_id, MONDAY, 100.0 * number)
+        for number, device_id in enumerate(device_ids, 1)
+    ]
+    assert watermarks(sqlite_db, "daily") == {MONDAY + timedelta(weeks=1)}
+    assert watermarks(sqlite_db, "weekly") == {MONDAY + timedelta(weeks=1)}
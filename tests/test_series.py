@@ -0,0 +1,90 @@
+"""
+Chart series: the level read for a range is the coarsest one still finer than
+the requested resolution, rows are bucketed into at most `points`
+mean/min/max points, and empty coarse levels fall back to finer ones.
+"""
+from datetime import datetime, date, timedelta
+from sqlalchemy import insert
+
+from device_data_collector import series
+from device_data_collector.series import (
+    LEVEL_STEPS,
+    choose_level,
+    downsample,
+    device_series,
+)
+from device_data_collector.ingest import SAMPLE_INTERVAL
+from device_data_collector.models import HourlyConsumption, DeviceDailyConsumption
+
+from conftest import add_user
+
+NOW = datetime(2026, 10, 15, 12, 0)
+
+
+def test_minutely_step_is_the_sample_interval():
+    assert LEVEL_STEPS[0] == ("minutely", SAMPLE_INTERVAL)
+    assert [step for _, step in LEVEL_STEPS] == sorted(step for _, step in LEVEL_STEPS)
+
+
+def test_choose_level():
+    day = timedelta(days=1)
+    cases = [
+        (NOW - timedelta(hours=2), 500, "minutely"),
+        (NOW - 30 * day, 720, "hourly"),
+        (NOW - 365 * day, 365, "daily"),
+        (NOW - 365 * day, 52, "weekly"),
+        # raw readings past the retention window are gone: never minutely
+        (NOW - 30 * day, 100000, "hourly"),
+    ]
+    for start, points, level in cases:
+        assert choose_level(start, NOW, points, now=NOW) == level, (start, points)
+
+
+def test_downsample_buckets_mean_min_max():
+    start = datetime(2026, 10, 1, 10, 0)
+    minutes = [m for m in range(120) if not 60 <= m < 90]
+    rows = [(start + timedelta(minutes=m), float(m)) for m in minutes]
+    points = downsample(rows, start, start + timedelta(hours=2), 4)
+    assert points == [
+        {"time": "2026-10-01T10:00:00", "mean": 14.5, "min": 0.0, "max": 29.0},
+        {"time": "2026-10-01T10:30:00", "mean": 44.5, "min": 30.0, "max": 59.0},
+        # 11:00-11:29 had no readings: no point
+        {"time": "2026-10-01T11:30:00", "mean": 104.5, "min": 90.0, "max": 119.0},
+    ]
+    assert downsample([], start, start + timedelta(hours=2), 4) == []
+    assert len(downsample(rows, start, start + timedelta(hours=2), 7)) <= 7
+
+
+def test_empty_coarse_levels_fall_back(sqlite_db, monkeypatch):
+    monkeypatch.setattr(series, "fetch_recent", lambda *args: None)
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=1)
+        device_id = devices[0].device_id
+        session.execute(
+            insert(HourlyConsumption),
+            [
+                {
+                    "device_id": device_id,
+                    "power_consumption": 100.0 + hour % 24,
+                    "time": datetime(2026, 10, 12) + timedelta(hours=hour),
+                }
+                for hour in range(72)
+            ],
+        )
+
+    start, end = datetime(2025, 10, 15), datetime(2026, 10, 15)
+    with sqlite_db.get_session() as session:
+        # a year at 52 points wants weekly rows; the device has only hours
+        level, points = device_series(session, device_id, start, end, 52)
+        assert level == "hourly"
+        assert len(points) == 1  # three days fall in one weekly-wide bucket
+        assert points[0]["min"] == 100.0 and points[0]["max"] == 123.0
+
+        session.execute(
+            insert(DeviceDailyConsumption).values(
+                device_id=device_id, daily_average=111.5, date=date(2026, 10, 12)
+            )
+        )
+        level, points = device_series(session, device_id, start, end, 52)
+        assert level == "daily"
+        assert points[0]["mean"] == 111.5
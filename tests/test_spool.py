@@ -0,0 +1,138 @@
+"""
+Spool crash/replay: torn tails, a checkpoint older than the database, a
+database outage across a restart, and rollups held back until the spooled
+sweeps are flushed.
+"""
+import os
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select, func
+
+from device_data_collector import spool as spool_module
+from device_data_collector.spool import Spool
+from device_data_collector.data_collector import process_tick
+from device_data_collector.models import (
+    MinutelyConsumption,
+    HourlyConsumption,
+    EnergyCounter,
+)
+
+from conftest import add_user
+
+T0 = datetime(2026, 10, 1, 10, 0)
+
+
+@pytest.fixture
+def device_ids(sqlite_db):
+    with sqlite_db.get_session() as session:
+        _, _, _, devices = add_user(session, devices=3)
+        return [device.device_id for device in devices]
+
+
+def append_sweeps(spool, device_ids, count, start=T0, power=100.0):
+    for minute in range(count):
+        when = start + timedelta(minutes=minute)
+        spool.append(
+            when,
+            [
+                {"device_id": device_id, "power_consumption": power, "time": when}
+                for device_id in device_ids
+            ],
+            {},
+        )
+
+
+def flush_all(spool, dedupe=False):
+    written = 0
+    while (batch := spool.flush_once(dedupe=dedupe)) is not None:
+        written += batch
+    return written
+
+
+def stored(sqlite_db):
+    """(readings stored, distinct (device_id, time) pairs among them)."""
+    pairs = select(MinutelyConsumption.device_id, MinutelyConsumption.time)
+    with sqlite_db.get_session() as session:
+        return (
+            session.scalar(select(func.count()).select_from(pairs.subquery())),
+            session.scalar(
+                select(func.count()).select_from(pairs.distinct().subquery())
+            ),
+        )
+
+
+def test_torn_tail_is_truncated_on_open(sqlite_db, device_ids, tmp_path):
+    spool = Spool(tmp_path / "spool", fsync=False)
+    append_sweeps(spool, device_ids, 3)
+    spool.close()
+    segment = sorted((tmp_path / "spool").glob("*.log"))[-1]
+    intact = segment.stat().st_size
+    with open(segment, "ab") as file:
+        file.write(b"\x40\x00\x00\x00\x01\x02\x03\x04{\"time\": ")  # crash mid-write
+
+    spool = Spool(tmp_path / "spool", fsync=False)
+    assert segment.stat().st_size == intact
+    assert spool.oldest_pending() == T0
+    append_sweeps(spool, device_ids, 1, start=T0 + timedelta(minutes=3))
+    assert flush_all(spool) == 4 * len(device_ids)
+    assert stored(sqlite_db) == (12, 12)
+    spool.close()
+
+
+def test_rewound_checkpoint_replays_without_duplicates(
+    sqlite_db, device_ids, tmp_path
+):
+    spool = Spool(tmp_path / "spool", fsync=False)
+    append_sweeps(spool, device_ids, 5)
+    flush_all(spool)
+    spool.close()
+    # crash between the database commit and the checkpoint write
+    os.unlink(tmp_path / "spool" / "checkpoint.json")
+
+    spool = Spool(tmp_path / "spool", fsync=False)
+    assert spool.backlog() > 0
+    assert flush_all(spool, dedupe=True) == 0
+    assert stored(sqlite_db) == (15, 15)
+    assert spool.oldest_pending() is None
+    spool.close()
+
+
+def test_outage_and_restart_lose_nothing(
+    sqlite_db, device_ids, tmp_path, monkeypatch
+):
+    def database_down(*args, **kwargs):
+        raise ConnectionError("database unreachable")
+
+    spool = Spool(tmp_path / "spool", fsync=False)
+    append_sweeps(spool, device_ids, 10)
+    monkeypatch.setattr(spool_module, "insert_readings", database_down)
+    with pytest.raises(ConnectionError):
+        spool.flush_once()
+    append_sweeps(spool, device_ids, 10, start=T0 + timedelta(minutes=10))
+    spool.close()  # collector restarted during the outage
+
+    spool = Spool(tmp_path / "spool", fsync=False)
+    assert spool.oldest_pending() == T0
+    monkeypatch.undo()
+    assert flush_all(spool, dedupe=True) == 20 * len(device_ids)
+    assert stored(sqlite_db) == (60, 60)
+    assert spool.backlog() == 0
+    spool.close()
+
+
+def test_rollups_wait_for_spooled_hours(sqlite_db, device_ids, tmp_path):
+    spool = Spool(tmp_path / "spool", fsync=False)
+    append_sweeps(spool, device_ids, 60)  # 10:00 .. 10:59, database down
+
+    process_tick(datetime(2026, 10, 1, 11, 1), spool.oldest_pending())
+    flush_all(spool)
+    process_tick(datetime(2026, 10, 1, 11, 2), spool.oldest_pending())
+
+    with sqlite_db.get_session() as session:
+        hourly = session.execute(
+            select(HourlyConsumption.time, HourlyConsumption.energy_wh)
+        ).all()
+        energy = session.scalars(select(EnergyCounter.total_wh)).all()
+    assert hourly == [(T0, pytest.approx(100.0))] * len(device_ids)
+    assert energy == [pytest.approx(100.0)] * len(device_ids)
+    spool.close()
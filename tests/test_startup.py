@@ -0,0 +1,56 @@
+"""
+Cold start: importing the web app or the collector opens no database
+connection and does not migrate; create_app() is where startup work happens.
+Each check runs in a fresh interpreter so earlier imports cannot hide a
+connection made at import time.
+"""
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import json, sys
+import main_web_app
+import device_data_collector.data_collector
+from device_data_collector.db import db
+if sys.argv[1] == "create_app":
+    main_web_app.create_app()
+print(json.dumps({"engine": db._engine is not None, "pyarrow": "pyarrow" in sys.modules}))
+"""
+
+
+def probe(tmp_path, step="import", backend="sqlite"):
+    env = dict(
+        os.environ,
+        DB_BACKEND=backend,
+        SQLITE_PATH=str(tmp_path / "startup.db"),
+        DB_HOST="db.invalid",  # a MySQL connection attempt would fail
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, step],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_opens_no_connection(tmp_path):
+    assert probe(tmp_path) == {"engine": False, "pyarrow": False}
+    assert not (tmp_path / "startup.db").exists()
+
+
+def test_import_works_while_mysql_is_unreachable(tmp_path):
+    assert probe(tmp_path, backend="mysql") == {"engine": False, "pyarrow": False}
+
+
+def test_create_app_migrates(tmp_path):
+    assert probe(tmp_path, step="create_app")["engine"] is True
+    assert (tmp_path / "startup.db").exists()
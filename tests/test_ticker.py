@@ -0,0 +1,68 @@
+"""
+Tick scheduler: tick times sit on the wall-clock grid of the interval and
+stay there however long the callback takes; slots that passed entirely are
+skipped and counted rather than run late.
+"""
+import time
+
+from device_data_collector.ticker import TickScheduler
+
+INTERVAL = 0.1
+
+
+def run_ticks(scheduler, ticks, work=0.0, fail=False):
+    """Run until `ticks` callbacks; returns their tick times and start times."""
+    seen = []
+
+    def callback(tick_time):
+        seen.append((tick_time, time.time()))
+        if len(seen) >= ticks:
+            scheduler.stop()
+        time.sleep(work)
+        if fail:
+            raise RuntimeError("sweep failed")
+
+    scheduler.run(callback)
+    return seen
+
+
+def on_grid(tick_time):
+    offset = tick_time.timestamp() / INTERVAL
+    return abs(offset - round(offset)) < 1e-3  # timestamps are whole microseconds
+
+
+def test_ticks_are_aligned_and_do_not_drift():
+    scheduler = TickScheduler(INTERVAL)
+    seen = run_ticks(scheduler, 10, work=0.03)
+    ticks = [tick.timestamp() for tick, _ in seen]
+    assert all(on_grid(tick) for tick, _ in seen)
+    steps = [later - earlier for earlier, later in zip(ticks, ticks[1:])]
+    assert all(abs(step - INTERVAL) < 1e-5 for step in steps)
+    # each callback starts shortly after its own tick, not later and later
+    assert all(started - tick < INTERVAL / 2 for (_, started), tick in zip(seen, ticks))
+    assert (scheduler.ticks, scheduler.overruns, scheduler.missed) == (10, 0, 0)
+
+
+def test_overruns_skip_passed_slots():
+    scheduler = TickScheduler(INTERVAL)
+    seen = run_ticks(scheduler, 4, work=2.5 * INTERVAL)
+    ticks = [tick.timestamp() for tick, _ in seen]
+    assert all(on_grid(tick) for tick, _ in seen)
+    steps = [
+        round((later - earlier) / INTERVAL) for earlier, later in zip(ticks, ticks[1:])
+    ]
+    # a 0.25 s run spans two or three slots: the ones that passed are skipped,
+    # the one still open runs late inside its own slot, never in a burst
+    assert all(step in (2, 3) for step in steps)
+    assert all(started - tick < INTERVAL for (_, started), tick in zip(seen, ticks))
+    assert scheduler.overruns == 4
+    assert scheduler.missed == sum(step - 1 for step in steps)
+
+
+def test_failing_callback_keeps_the_cadence():
+    scheduler = TickScheduler(INTERVAL)
+    seen = run_ticks(scheduler, 3, fail=True)
+    assert len(seen) == scheduler.ticks == 3
+    ticks = [tick.timestamp() for tick, _ in seen]
+    steps = [later - earlier for earlier, later in zip(ticks, ticks[1:])]
+    assert all(abs(step - INTERVAL) < 1e-5 for step in steps)